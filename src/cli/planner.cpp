@@ -10,6 +10,7 @@
 #include <exception>
 #include <chrono>
 #include <memory>
+#include <cstdint>
 
 #include <boost/program_options.hpp>
 
@@ -136,6 +137,99 @@ void runSteppers(Planner &p, ostream &os){
 
 }
 
+/*
+ * Server mode. Requests and responses are frames: a 4 byte little-endian
+ * length, then that many bytes of JSON. Each request has the joints and the
+ * moves, and gets a response with the dump of a planner that ran the moves,
+ * so one process can serve any number of plans.
+ *
+ *   {"id": 1, "op": "plan", "joints": [[v_max, a_max], ...], "moves": [[x, ...], ...]}
+ *   {"id": 2, "op": "ping"}
+ *   {"id": 3, "op": "quit"}
+ */
+
+bool readFrame(istream &is, string &payload){
+    unsigned char hdr[4];
+
+    if (!is.read(reinterpret_cast<char*>(hdr), 4)){
+        return false;
+    }
+
+    uint32_t len = hdr[0] | (hdr[1] << 8) | (hdr[2] << 16) | ((uint32_t)hdr[3] << 24);
+
+    payload.resize(len);
+    return (bool)is.read(&payload[0], len);
+}
+
+void writeFrame(ostream &os, const string &payload){
+    uint32_t len = payload.size();
+    unsigned char hdr[4] = {(unsigned char)(len & 0xff), (unsigned char)((len >> 8) & 0xff),
+                            (unsigned char)((len >> 16) & 0xff), (unsigned char)((len >> 24) & 0xff)};
+
+    os.write(reinterpret_cast<char*>(hdr), 4);
+    os.write(payload.data(), len);
+    os.flush();
+}
+
+json handleRequest(const json &req, bool &quit){
+
+    json resp;
+    resp["id"] = req.value("id", 0);
+
+    string op = req.value("op", "plan");
+
+    if (op == "ping"){
+        resp["ok"] = true;
+    } else if (op == "quit"){
+        resp["ok"] = true;
+        quit = true;
+    } else if (op == "plan"){
+        vector<Joint> joints;
+        int i = 0;
+        for (const json &jd : req.at("joints")){
+            joints.emplace_back(i++, jd.at(0).get<float>(), jd.at(1).get<float>());
+        }
+
+        Moves moves;
+        for (const json &md : req.at("moves")){
+            moves.push_back(md.get<Ints>());
+        }
+
+        auto start = chrono::steady_clock::now();
+        unique_ptr<Planner> planner(makePlanner(joints, moves));
+        auto end = chrono::steady_clock::now();
+
+        resp["ok"] = true;
+        resp["planner"] = planner->dump();
+        resp["_time"] = chrono::duration_cast<chrono::microseconds>(end - start).count();
+    } else {
+        resp["ok"] = false;
+        resp["error"] = "Unknown op: " + op;
+    }
+
+    return resp;
+}
+
+int runServer(istream &is, ostream &os){
+
+    string payload;
+    bool quit = false;
+
+    while (!quit && readFrame(is, payload)) {
+        json resp;
+        try {
+            resp = handleRequest(json::parse(payload), quit);
+        } catch (std::exception &e) {
+            resp["ok"] = false;
+            resp["error"] = e.what();
+        }
+
+        writeFrame(os, resp.dump());
+    }
+
+    return 0;
+}
+
 int main(int ac, char **av) {
 
     vector<Joint> joints;
@@ -147,6 +241,7 @@ int main(int ac, char **av) {
             ("planner,p",  "Load moves into the planner and print it. ")
             ("stepper,s",  "Load moves into the planner run steppers ")
             ("json,j",  "Output JSON ")
+            ("server,S",  "Serve framed JSON plan requests on stdin/stdout until EOF ")
             ;
 
     po::variables_map vm;
@@ -158,6 +253,11 @@ int main(int ac, char **av) {
         return 1;
     }
 
+    if (vm.count("server")) {
+        std::ios::sync_with_stdio(false);
+        return runServer(std::cin, std::cout);
+    }
+
     loadData(joints, moves);
 
     auto start = chrono::steady_clock::now();
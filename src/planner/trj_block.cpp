@@ -404,6 +404,21 @@ trj_float_t Block::getV1() const {
     return v_1;
 }
 
+void Block::getParams(trj_float_t *out) const {
+    out[0] = x;
+    out[1] = d;
+    out[2] = t;
+    out[3] = t_a;
+    out[4] = t_c;
+    out[5] = t_d;
+    out[6] = x_a;
+    out[7] = x_c;
+    out[8] = x_d;
+    out[9] = v_0;
+    out[10] = v_c;
+    out[11] = v_1;
+}
+
 json Block::dump(std::string tag) const {
 
     json m;
@@ -84,6 +84,10 @@ public:
 
     json dump(std::string tag="") const;
 
+    // Copy x, d, t, t_a, t_c, t_d, x_a, x_c, x_d, v_0, v_c, v_1 into out, the same order as dump()
+    static constexpr int N_PARAMS = 12;
+    void getParams(trj_float_t *out) const;
+
     array<StepperPhase,3> getStepperPhases() const;
 
     static bool bent(Block& prior, Block &current);
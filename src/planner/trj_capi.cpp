@@ -0,0 +1,93 @@
+#include <vector>
+
+#include "trj_capi.h"
+#include "trj_planner.h"
+#include "trj_segstepper.h"
+
+static Planner *planner(trj_planner_h p){
+    return static_cast<Planner*>(p);
+}
+
+int trj_n_params(){
+    return Block::N_PARAMS;
+}
+
+trj_planner_h trj_planner_new(int n_joints, const double *v_max, const double *a_max){
+    std::vector<Joint> joints;
+
+    for (int i = 0; i < n_joints; i++){
+        joints.emplace_back(i, v_max[i], a_max[i]);
+    }
+
+    return new Planner(joints);
+}
+
+void trj_planner_free(trj_planner_h p){
+    delete planner(p);
+}
+
+int trj_planner_n_joints(trj_planner_h p){
+    return (int)planner(p)->getJoints().size();
+}
+
+size_t trj_planner_n_segments(trj_planner_h p){
+    return planner(p)->getNSegments();
+}
+
+void trj_planner_move(trj_planner_h p, const int32_t *moves, size_t n_moves){
+    size_t n_joints = planner(p)->getJoints().size();
+
+    for (size_t i = 0; i < n_moves; i++){
+        const int32_t *m = moves + i * n_joints;
+        planner(p)->move(MoveArray(m, m + n_joints));
+    }
+}
+
+size_t trj_planner_blocks(trj_planner_h p, size_t start, size_t max_segments, double *out){
+    const std::deque<Segment> &segments = planner(p)->getSegments();
+
+    size_t n = 0;
+    for (size_t i = start; i < segments.size() && n < max_segments; i++, n++){
+        for (const Block &b: segments[i].getBlocks()){
+            b.getParams(out);
+            out += Block::N_PARAMS;
+        }
+    }
+
+    return n;
+}
+
+double trj_planner_queue_time(trj_planner_h p){
+    double t = 0;
+
+    for (const Segment &s: planner(p)->getSegments()){
+        const std::vector<Block> &blocks = s.getBlocks();
+        if (!blocks.empty()){
+            t += blocks.front().getT();
+        }
+    }
+
+    return t;
+}
+
+void trj_planner_position(trj_planner_h p, int32_t *out){
+    for (int32_t x: planner(p)->getPosition()){
+        *out++ = x;
+    }
+}
+
+int trj_planner_pop(trj_planner_h p){
+    return planner(p)->popSegment() ? 1 : 0;
+}
+
+trj_stepper_h trj_stepper_new(trj_planner_h p){
+    return new SegmentStepper(*planner(p));
+}
+
+void trj_stepper_free(trj_stepper_h s){
+    delete static_cast<SegmentStepper*>(s);
+}
+
+int trj_stepper_next(trj_stepper_h s, double dtime){
+    return static_cast<SegmentStepper*>(s)->next(dtime);
+}
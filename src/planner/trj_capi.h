@@ -0,0 +1,53 @@
+#pragma once
+
+/*
+ * C interface to the planner, for loading libtrjplanner as a shared library
+ * from Python with ctypes. Handles are opaque pointers; arrays are flat and
+ * owned by the caller.
+ *
+ * Block parameters are written 12 per block, in the order of Block::getParams(),
+ * segment major, then joint:  out[(seg * n_joints + joint) * 12 + param]
+ */
+
+#include <cstddef>
+#include <cstdint>
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+typedef void *trj_planner_h;
+typedef void *trj_stepper_h;
+
+int trj_n_params();
+
+trj_planner_h trj_planner_new(int n_joints, const double *v_max, const double *a_max);
+void trj_planner_free(trj_planner_h p);
+
+int trj_planner_n_joints(trj_planner_h p);
+size_t trj_planner_n_segments(trj_planner_h p);
+
+// Add n_moves moves, each with n_joints int32 distances, planning after each one
+void trj_planner_move(trj_planner_h p, const int32_t *moves, size_t n_moves);
+
+// Copy the parameters of up to max_segments segments, starting at start. Returns the number copied
+size_t trj_planner_blocks(trj_planner_h p, size_t start, size_t max_segments, double *out);
+
+// Sum of the segment times, in seconds
+double trj_planner_queue_time(trj_planner_h p);
+
+// Copy the planner position into out, n_joints values
+void trj_planner_position(trj_planner_h p, int32_t *out);
+
+// Remove the oldest segment. Returns 0 if the planner was empty
+int trj_planner_pop(trj_planner_h p);
+
+trj_stepper_h trj_stepper_new(trj_planner_h p);
+void trj_stepper_free(trj_stepper_h s);
+
+// Advance the stepper by dtime seconds. Returns the number of axes that are still moving
+int trj_stepper_next(trj_stepper_h s, double dtime);
+
+#ifdef __cplusplus
+}
+#endif
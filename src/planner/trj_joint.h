@@ -34,7 +34,7 @@ public:
     trj_float_t max_discontinuity;
     trj_float_t max_at;
 
-    friend std::__1::ostream &operator<<(std::__1::ostream &output, const Joint &j );
+    friend std::ostream &operator<<(std::ostream &output, const Joint &j );
 
     json dump() const;
 
@@ -26,15 +26,14 @@ void Planner::setJoints(std::vector<Joint> joints_){
 
     joints.erase (joints.begin(),joints.end());
 
-    plannerPosition.resize(joints.size());
-    plannerPosition = {0};
-
     int i = 0;
     for (Joint &j: joints_) {
         j.n = i++;
         joints.push_back(j);
     }
 
+    plannerPosition.assign(joints.size(), 0);
+
 
 }
 
@@ -75,6 +74,16 @@ void Planner::move(const MoveArray &move) {
     queue_size = segments.size();
 }
 
+bool Planner::popSegment(){
+    if (segments.empty()){
+        return false;
+    }
+
+    segments.pop_front();
+    queue_size = segments.size();
+    return true;
+}
+
 trj_float_t vLimit(int p_iter, trj_float_t v_max){
     if (p_iter < 2){
         return v_max;
@@ -72,6 +72,11 @@ public:
     VelocityVector V_NAN = {NAN, NAN, NAN, NAN, NAN, NAN, NAN, NAN};
 
     unsigned long getNSegments(){  return segments.size();}
+
+    const std::deque<Segment>& getSegments() const { return segments; }
+
+    // Remove the oldest segment, the one the stepper is running or would run next
+    bool popSegment();
     bool empty(){  return segments.empty();}
 
     uint32_t getQueueTime() const{ return queue_time;  }
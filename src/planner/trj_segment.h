@@ -56,6 +56,8 @@ public:
 
     const MoveArray& getMoves() const {return moves;}
 
+    const vector<Block>& getBlocks() const {return blocks;}
+
     VelocityVector getV0();
     VelocityVector getV1();
 
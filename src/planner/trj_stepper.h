@@ -2,6 +2,7 @@
 #include <utility>
 #include <vector>
 #include <array>
+#include <memory>
 #include "trj_util.h"
 
 using namespace std;
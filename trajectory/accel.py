@@ -0,0 +1,414 @@
+"""Compiled kernels for the inner loops of the planner and the step generators.
+
+The planner's velocity search and the step generators are short loops of
+float and integer arithmetic, which numba compiles well. When numba is
+installed, the kernels here are compiled on first use; otherwise they are
+plain Python functions, with the same results. Set TRJ_NUMBA=0 to turn the
+compiled kernels off.
+
+* search_v_c: the binary search for v_c in Block.plan, with gsolver.accel_acd
+  inlined, so the search doesn't call back into Python
+* stepper_run: stepper.Stepper.next(), on a state array, up to the next step.
+  Every kernel that runs a Stepper calls it, so there is one copy of its logic
+* stepper_steps: runs stepper.Stepper over many blocks, and returns the steps
+* clocked_steps: the same for one axis, run the way SegmentList.step runs it,
+  with the Stepper state carried in and out
+* period_ticks: the step ticks of SimSegment.iter_period, for many phases
+
+python(kernel) is the Python version of a kernel, for checking and
+benchmarking. Its loop runs in Python, but it calls the compiled helpers,
+such as stepper_run.
+"""
+
+import os
+from math import nan
+from time import perf_counter
+
+import numpy as np
+
+from .stepper import TIMEBASE, DEFAULT_PERIOD
+
+try:
+    import numba
+
+    HAVE_NUMBA = os.environ.get('TRJ_NUMBA', '1') != '0'
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    jit = numba.njit(cache=True, nogil=True)
+else:
+    def jit(f):
+        return f
+
+
+def python(kernel):
+    """The pure Python version of a kernel"""
+    return getattr(kernel, 'py_func', kernel)
+
+
+@jit
+def search_v_c(x, t, v_0, v_1, v_max, a_max):
+    """The v_c for a block that covers x in time t, with boundary velocities v_0
+    and v_1. The same as gsolver.binary_search over the error function in
+    Block.plan. Returns nan if the search doesn't converge. """
+
+    v_min = 0.0
+    v_guess = x / t
+
+    for i in range(20):
+
+        # accel_acd(v_0, v_guess, v_1, a_max)
+        x_a = t_a = x_d = t_d = 0.0
+
+        if v_guess != v_0:
+            a = -a_max if v_guess < v_0 else a_max
+            t_a = (v_guess - v_0) / a
+            x_a = (v_0 + v_guess) / 2 * t_a
+
+        if v_1 != v_guess:
+            a = -a_max if v_1 < v_guess else a_max
+            t_d = (v_1 - v_guess) / a
+            x_d = (v_guess + v_1) / 2 * t_d
+
+        x_ad = x_a + x_d
+        t_ad = t_a + t_d
+
+        t_c = max(t - t_ad, 0.0)
+        x_c = max(v_guess, 0.0) * t_c
+
+        err = round(x - (x_ad + x_c))
+
+        if err > 0:
+            v_guess, v_min = (v_max + v_guess) / 2, v_guess
+
+        elif err < 0:
+            v_guess, v_max = (v_min + v_guess) / 2, v_guess
+
+        else:
+            return v_guess
+
+        if abs(v_min - v_max) < .05:
+            return v_guess
+
+    return nan
+
+
+stepper_state = ('delay_counter', 'steps_left', 'periods_left', 'steps_stepped', 'direction',
+                 'vi', 'a', 'delay', 'phase_t')
+
+
+@jit
+def stepper_run(ph, phase, st, delay_inc, max_ticks):
+    """Call Stepper.next() until it makes a step, finishes its block, or has been
+    called max_ticks times. ph holds the (x, vi, vf) rows of the three phases of
+    the block, phase is Stepper.phase, and st is the Stepper state, in the order
+    of stepper_state, which is updated in place.
+
+    Returns the direction of the step, or 0 if it didn't step, the new phase, and
+    the number of calls. The loop runs here, rather than a call per tick, because
+    numba compiles a per tick call into much slower code.
+    """
+
+    delay_counter, steps_left, periods_left, steps_stepped = st[0], int(st[1]), int(st[2]), int(st[3])
+    direction, vi, a, delay, phase_t = int(st[4]), st[5], st[6], st[7], st[8]
+
+    n = 0
+    r = 0
+
+    while n < max_ticks:
+        # Stepper.next()
+        if steps_left <= 0 or periods_left <= 0:
+            if phase == 3:
+                break  # Done
+
+            # Stepper.init_next_phase()
+            x = ph[phase, 0]
+            vi = ph[phase, 1]
+            vf = ph[phase, 2]
+
+            direction = 0 if x == 0 else (1 if x > 0 else -1)
+            x = abs(x)
+
+            t_f = abs((2. * x) / (vi + vf)) if (vi + vf) != 0 else 0.0
+            a = (vf - vi) / t_f if t_f != 0 else 0.0
+
+            steps_left = int(round(x))
+            steps_stepped = 0
+            phase_t = 0.0
+
+            v = a * delay_inc + vi
+            delay = abs(1 / v) if v else 0.0
+            delay_counter += delay_inc
+
+            periods_left = int(round(t_f / delay_inc))
+
+            phase += 1
+
+        if delay_counter > delay:
+            delay_counter -= delay
+            steps_left -= 1
+            steps_stepped += 1
+            r = direction
+        else:
+            r = 0
+
+        periods_left -= 1
+
+        v = vi + a * phase_t
+
+        delay = abs(1 / v) if v else 1.0
+        delay_counter += delay_inc
+
+        phase_t += delay_inc
+
+        calc_x = abs((a * phase_t ** 2) / 2 + vi * phase_t)
+        x_err = steps_stepped - calc_x
+
+        if abs(x_err) > .5 and phase == 1:
+            s = x_err / abs(x_err)
+            delay_counter += -s * delay_inc * .1
+
+        n += 1
+
+        if r != 0:
+            break
+
+    st[0], st[1], st[2], st[3] = delay_counter, steps_left, periods_left, steps_stepped
+    st[4], st[5], st[6], st[7], st[8] = direction, vi, a, delay, phase_t
+
+    return r, phase, n
+
+
+@jit
+def stepper_steps(phases, period, carry, delay_counter=0.0):
+    """Run stepper.Stepper over blocks of three phases.
+
+    phases is a float array of (x, vi, vf) rows, three per block, as from
+    Block.stepper_blocks(). If carry is false, each block gets a new Stepper;
+    otherwise one Stepper runs all of them, with load_phases() for each block,
+    so the delay counter carries from one block to the next, starting from
+    delay_counter.
+
+    Returns (phase, tick, phase_t, direction) for each step, where phase is the
+    row of the step's phase, tick counts calls to Stepper.next() from the
+    start, and phase_t is Stepper.phase_t just after the step. Then the ticks
+    of each block, and the delay counter at the end.
+    """
+
+    n_blocks = phases.shape[0] // 3
+
+    n_max = n_blocks * 3
+    for i in range(phases.shape[0]):
+        n_max += int(abs(phases[i, 0])) + 1
+
+    out_phase = np.empty(n_max, dtype=np.int64)
+    out_tick = np.empty(n_max, dtype=np.int64)
+    out_t = np.empty(n_max, dtype=np.float64)
+    out_dir = np.empty(n_max, dtype=np.int64)
+
+    delay_inc = period / TIMEBASE
+
+    block_ticks = np.zeros(n_blocks, dtype=np.int64)
+    n_max_ticks = 1 << 62
+
+    st = np.zeros(len(stepper_state))
+    st[0] = delay_counter
+
+    k = 0
+    tick = 0
+
+    for b in range(n_blocks):
+
+        if not carry:
+            st[0] = 0.0
+
+        st[1:] = 0.0
+        phase = 0
+        ph = phases[b * 3:b * 3 + 3]
+
+        while True:
+            r, phase, n = stepper_run(ph, phase, st, delay_inc, n_max_ticks)
+
+            tick += n
+            block_ticks[b] += n
+
+            if r == 0:
+                break  # Done
+
+            out_phase[k] = b * 3 + phase - 1
+            out_tick[k] = tick
+            out_t[k] = st[8]
+            out_dir[k] = r
+            k += 1
+
+    return out_phase[:k], out_tick[:k], out_t[:k], out_dir[:k], block_ticks, st[0]
+
+
+@jit
+def clocked_steps(phases, period, seg_ticks, state):
+    """Run one axis's Stepper the way SegmentList.step() does: load_phases() for
+    each block, then exactly seg_ticks[b] calls to Stepper.next(), whether or not
+    the stepper finishes its block in that time.
+
+    state is the Stepper state carried in from the previous block, with the
+    fields in stepper_state; zeros for a new Stepper.
+
+    Returns (seg, call, phase, direction) for each step, where call counts calls
+    to next() from the start of the segment and phase is Stepper.phase - 1, which
+    is -1 for the rest of a phase carried over from the previous segment. Then
+    the state after the last call.
+    """
+
+    n_max = int(state[1]) + 1
+    for i in range(phases.shape[0]):
+        n_max += int(abs(phases[i, 0])) + 1
+
+    out_seg = np.empty(n_max, dtype=np.int64)
+    out_call = np.empty(n_max, dtype=np.int64)
+    out_phase = np.empty(n_max, dtype=np.int64)
+    out_dir = np.empty(n_max, dtype=np.int64)
+
+    delay_inc = period / TIMEBASE
+
+    st = state.astype(np.float64)
+
+    k = 0
+
+    for b in range(len(seg_ticks)):
+        # Stepper.load_phases()
+        phase = 0
+        ph = phases[b * 3:b * 3 + 3]
+
+        j = 0
+        while j < seg_ticks[b]:
+            r, phase, n = stepper_run(ph, phase, st, delay_inc, seg_ticks[b] - j)
+            j += n
+
+            if r == 0:
+                break  # Done, or out of ticks
+
+            out_seg[k] = b
+            out_call[k] = j - 1
+            out_phase[k] = phase - 1
+            out_dir[k] = r
+            k += 1
+
+    return out_seg[:k], out_call[:k], out_phase[:k], out_dir[:k], st
+
+
+@jit
+def period_ticks(steps, n, ca, const_v, period, fp_bits, offsets, ticks):
+    """Fill ticks[offsets[i]:offsets[i+1]] with the 1-based tick numbers of the
+    steps of phase i, as SimSegment.iter_period would produce them. steps, n, ca
+    and const_v are from emulator.phase_params. Phases with no steps or no delay
+    are skipped. """
+
+    P = period << fp_bits
+
+    for i in range(len(steps)):
+        if steps[i] == 0 or ca[i] == 0:
+            continue
+
+        c = ca[i]
+        n_ = n[i]
+        r = 0
+        tick = 0
+
+        for j in range(offsets[i], offsets[i] + steps[i]):
+            # Ticks until the accumulator passes ca
+            k = (c - r) // P + 1
+            if k < 1:
+                k = 1
+
+            tick += k
+            r += k * P - c
+            ticks[j] = tick
+
+            if not const_v[i]:
+                n_ += 1
+                ca1 = int((2 * c) / (4 * n_ + 1))
+                c = abs(c - ca1)
+
+    return ticks
+
+
+def benchmark(joints, programs, period: int = DEFAULT_PERIOD):
+    """Seconds for the Python and compiled versions of each kernel, over the
+    programs, an iterable of (name, moves). The compiled times are taken after
+    a warm up run, so they don't include compiling. """
+
+    from .emulator import phase_params, stepper_phases
+    from .planner import SegmentList
+    from .sim import SimSegment
+    from . import gsolver
+
+    rows = []
+
+    for name, moves in programs:
+        row = {'program': name, 'moves': len(moves)}
+
+        sl = SegmentList(joints)
+        blocks = []
+
+        for m in moves:
+            sl.move(list(m))
+        for s in sl.segments:
+            blocks.extend(s.blocks)
+
+        args = [(float(b.x), float(b.t), float(b.v_0), float(b.v_1), float(b.joint.v_max),
+                 float(b.joint.a_max)) for b in blocks if b.x and b.t]
+
+        phases = stepper_phases(sl).reshape(-1, 3)
+        fphases = phases.astype(np.float64)
+        steps, n, ca, const_v = phase_params(phases[:, 0], phases[:, 1], phases[:, 2])
+        offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+        np.cumsum(steps, out=offsets[1:])
+
+        def timed(f):
+            f()  # Warm up, and compile
+            t = perf_counter()
+            f()
+            return perf_counter() - t
+
+        def run_search(k):
+            return lambda: [k(*a) for a in args]
+
+        def run_stepper(k):
+            return lambda: k(fphases, period, False, 0.0)
+
+        def run_ticks(k):
+            return lambda: k(steps, n, ca, const_v, period, SimSegment.fp_bits, offsets,
+                             np.zeros(offsets[-1], dtype=np.int64))
+
+        def run_plan(enabled):
+            def f():
+                old = gsolver.accel.search_v_c
+                gsolver.accel.search_v_c = search_v_c if enabled else python(search_v_c)
+                try:
+                    sl = SegmentList(joints)
+                    for m in moves:
+                        sl.move(list(m))
+                finally:
+                    gsolver.accel.search_v_c = old
+            return f
+
+        for kname, run, k in (('search_v_c', run_search, search_v_c),
+                              ('stepper_steps', run_stepper, stepper_steps),
+                              ('period_ticks', run_ticks, period_ticks)):
+            row[kname + '_py'] = timed(run(python(k)))
+            row[kname + '_jit'] = timed(run(k)) if HAVE_NUMBA else np.nan
+
+        row['plan_py'] = timed(run_plan(False))
+        row['plan_jit'] = timed(run_plan(True)) if HAVE_NUMBA else np.nan
+
+        rows.append(row)
+
+    import pandas as pd
+
+    df = pd.DataFrame(rows).set_index('program')
+    for k in ('search_v_c', 'stepper_steps', 'period_ticks', 'plan'):
+        df[k + '_speedup'] = df[k + '_py'] / df[k + '_jit']
+
+    return df
@@ -0,0 +1,288 @@
+"""Checkpoints of the live planner and protocol state.
+
+A Checkpoint is a memory-mapped file with two slots. Each snapshot is written
+to the slot that isn't current, then the header is switched to it, so a crash
+in the middle of a write leaves the previous snapshot intact. A snapshot holds:
+
+* the queued segments and queue state of the SegmentList, in the serialize
+  binary format, plus step_position and the number of segments handed to the
+  consumer ( committed )
+* SyncProto's seq, last_ack, last_done and the last CurrentState
+
+Snapshots are cheap enough to take every few hundred milliseconds, and
+maybe_snapshot() skips them when nothing has changed.
+
+After a crash, restore() loads the last snapshot and reconciles it with the
+position the device reports, so planning can continue without re-homing, and
+segments that were taken but never reached the device are sent again.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from time import time
+
+from . import serialize
+from .planner import SegmentList
+
+MAGIC = b'TRJC'
+VERSION = 1
+
+_header_fmt = '<4sHHQ'  # magic, version, current slot, generation
+_slot_fmt = '<QII'  # generation, payload length, crc32
+
+_header_size = struct.calcsize(_header_fmt)
+_slot_header_size = struct.calcsize(_slot_fmt)
+
+
+def proto_state(proto):
+    """The parts of a SyncProto needed to resume the conversation with the device"""
+    if proto is None:
+        return None
+
+    cs = proto.current_state
+
+    return {
+        'seq': proto.seq,
+        'last_ack': proto.last_ack,
+        'last_done': proto.last_done,
+        'current_state': {
+            'queue_length': cs.queue_length,
+            'queue_time': cs.queue_time,
+            'positions': list(cs.positions),
+            'planner_positions': list(cs.planner_positions),
+        }
+    }
+
+
+class Snapshot(object):
+    """A loaded checkpoint"""
+
+    def __init__(self, sl: SegmentList, meta: dict):
+        self.segment_list = sl
+        self.meta = meta
+
+        self.time = meta['time']
+        self.generation = meta['generation']
+        self.step_position = meta['step_position']
+        self.committed = meta['committed']
+        self.proto = meta['proto']
+
+    def __repr__(self):
+        return f"<Snapshot gen={self.generation} segs={len(self.segment_list)} committed={self.committed}>"
+
+
+class Checkpoint(object):
+    """Double buffered snapshots in a memory-mapped file"""
+
+    def __init__(self, path, slot_size: int = 4 * 1024 * 1024):
+        self.path = Path(path)
+        self.slot_size = slot_size
+        size = _header_size + 2 * (_slot_header_size + slot_size)
+
+        exists = self.path.exists() and self.path.stat().st_size >= _header_size
+
+        self._f = open(self.path, 'r+b' if exists else 'w+b')
+
+        if exists:
+            magic, version, self.slot, self.generation = struct.unpack_from(_header_fmt,
+                                                                            self._f.read(_header_size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{self.path} is not a checkpoint file')
+
+            self._f.seek(0, os.SEEK_END)
+            self.slot_size = (self._f.tell() - _header_size) // 2 - _slot_header_size
+        else:
+            self._f.truncate(size)
+            self.slot, self.generation = 0, 0
+
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+
+        if not exists:
+            self._write_header()
+
+        self._last_key = None
+        self._last_time = 0
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write_header(self):
+        struct.pack_into(_header_fmt, self._mm, 0, MAGIC, VERSION, self.slot, self.generation)
+
+    def _slot_offset(self, slot):
+        return _header_size + slot * (_slot_header_size + self.slot_size)
+
+    @staticmethod
+    def _state_key(sl: SegmentList, proto=None):
+        return (sl.table.version, sl.seg_num, len(sl.segments), sl.committed,
+                proto.seq if proto else None, proto.last_done if proto else None)
+
+    def snapshot(self, sl: SegmentList, proto=None, flush: bool = False):
+        """Write a snapshot of the segment list and the protocol state"""
+
+        with sl.lock:
+            self._last_key = self._state_key(sl, proto)
+            self._last_time = time()
+            data = serialize.dumps(sl)
+            meta = {
+                'time': time(),
+                'generation': self.generation + 1,
+                'step_position': [int(e) for e in sl.step_position],
+                'committed': sl.committed,
+                'proto': proto_state(proto),
+            }
+
+        meta = json.dumps(meta).encode('utf8')
+        payload = struct.pack('<I', len(meta)) + meta + data
+
+        if len(payload) > self.slot_size:
+            raise ValueError(f'Snapshot of {len(payload)} bytes is larger than the slot size {self.slot_size}')
+
+        slot = 1 - self.slot
+        off = self._slot_offset(slot)
+
+        self._mm[off + _slot_header_size:off + _slot_header_size + len(payload)] = payload
+        struct.pack_into(_slot_fmt, self._mm, off, self.generation + 1, len(payload), zlib.crc32(payload))
+
+        # Switching the current slot is the commit
+        self.slot = slot
+        self.generation += 1
+        self._write_header()
+
+        if flush:
+            self._mm.flush()
+
+        return self.generation
+
+    def maybe_snapshot(self, sl: SegmentList, proto=None, interval: float = .25):
+        """Snapshot if at least interval seconds have passed and the state has changed"""
+
+        if time() - self._last_time < interval or self._state_key(sl, proto) == self._last_key:
+            return None
+
+        return self.snapshot(sl, proto)
+
+    def load(self) -> Snapshot:
+        """Return the current snapshot, falling back to the other slot if the current one is damaged"""
+
+        for slot in (self.slot, 1 - self.slot):
+            off = self._slot_offset(slot)
+            gen, length, crc = struct.unpack_from(_slot_fmt, self._mm, off)
+
+            if gen == 0 or length > self.slot_size:
+                continue
+
+            payload = bytes(self._mm[off + _slot_header_size:off + _slot_header_size + length])
+            if zlib.crc32(payload) != crc:
+                continue
+
+            mlen, = struct.unpack_from('<I', payload)
+            meta = json.loads(payload[4:4 + mlen])
+
+            return Snapshot(serialize.loads(payload[4 + mlen:]), meta)
+
+        raise ValueError(f'No valid snapshot in {self.path}')
+
+
+class Recovery(object):
+    """Result of restoring a snapshot"""
+
+    def __init__(self, segment_list, snapshot, consistent, offset, dropped, requeued=0):
+        self.segment_list = segment_list
+        self.snapshot = snapshot
+        self.consistent = consistent  # Device was at the end of one of the snapshot's segments
+        self.offset = offset  # Device planner position minus the expected position, per axis
+        self.dropped = dropped  # Segments discarded in recovery, because the device has them, or can't
+        self.requeued = requeued  # Segments taken, but not sent, before the crash, and queued again
+
+    def __repr__(self):
+        return (f"<Recovery consistent={self.consistent} offset={self.offset} dropped={self.dropped} "
+                f"requeued={self.requeued}>")
+
+
+def restore(snapshot: Snapshot, proto=None, device_state=None) -> Recovery:
+    """Rebuild the segment list from a snapshot, reconciled with the device.
+
+    Taken segments stay in the SegmentList, and in its snapshots, until they are
+    popped, which FlowController does when proto.send() returns with the ack, so
+    a crash after take() can leave segments that the device never got. The
+    device's planner position is matched against the position at the end of
+    each of the snapshot's segments, from the last taken one back to the start
+    of the queue. Segments up to the match are on the device, so they are
+    dropped, and the rest are queued again, including any taken ones. If there
+    is no match, every segment is discarded and the planner position is reset
+    to the device's. If the device's queue is empty, the first kept segment is
+    replanned to start at rest.
+
+    device_state is a CurrentState, or taken from proto. If there is neither,
+    the snapshot is trusted, and the taken segments are dropped. If proto is
+    given, its sequence numbers are restored so the conversation with the device
+    continues where it left off. """
+
+    sl = snapshot.segment_list
+    n = len(sl.joints)
+
+    if device_state is None and proto is not None and proto.current_state.positions:
+        device_state = proto.current_state
+
+    committed = min(snapshot.committed, len(sl.segments))
+
+    # Planner position at the end of each segment, after the start of the queue
+    ends = [[p - sum(s.move[i] for s in sl.segments) for i, p in enumerate(sl.planner_position)]]
+    for s in sl.segments:
+        ends.append([e + x for e, x in zip(ends[-1], s.move)])
+
+    sl.committed = 0
+    for s in sl.segments:
+        s.frozen = False
+
+    if device_state is None:
+        for i in range(committed):
+            sl.pop()
+        sl.step_position[:] = snapshot.step_position
+        return Recovery(sl, snapshot, True, [0] * n, committed)
+
+    device_pp = list(device_state.planner_positions)[:n]
+    offset = [d - e for d, e in zip(device_pp, ends[committed])]
+
+    match = next((k for k in range(committed, -1, -1) if ends[k] == device_pp), None)
+
+    if match is None:
+        dropped = len(sl.segments)
+        while len(sl.segments):
+            sl.pop()
+        sl.planner_position = device_pp
+        sl.queue_time = 0
+    else:
+        dropped = match
+        for i in range(match):
+            sl.pop()
+
+    sl.step_position[:] = list(device_state.positions)[:n]
+
+    if len(sl.segments) and device_state.queue_length == 0 and any(b.v_0 for b in sl.segments[0].blocks):
+        sl.segments[0].plan(v_0=0)
+        sl.plan_safe(1)
+        sl._replanned(sl.segments[0])
+
+    if proto is not None and snapshot.proto is not None:
+        proto.seq = max(proto.seq, snapshot.proto['seq'])
+        proto.last_ack = max(proto.last_ack, snapshot.proto['last_ack'])
+        proto.last_done = max(proto.last_done, snapshot.proto['last_done'])
+
+    return Recovery(sl, snapshot, match is not None, offset, dropped,
+                    committed - match if match is not None else 0)
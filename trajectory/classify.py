@@ -1,4 +1,20 @@
+"""Profile shape classes of planned blocks.
+
+classify() labels one Block. classify_array() labels every block of a
+block_params array, shaped (segment, axis, field), with the same rules, in
+a few array operations, and shape_histogram() counts the shapes in each of
+a set of programs, as a guide to how long they take to plan and to run.
+
+    codes = classify_segments(sl)       # (segment, axis) array of JSClass values
+    shape_histogram(joints, [('job', moves)])
+"""
+
 from enum import Enum
+from time import perf_counter
+
+import numpy as np
+
+from .table import block_fields
 
 
 class JSClass(Enum):
@@ -79,9 +95,12 @@ kind_icon_map = {
 def classify(p):
     """Assign a class type to a planner block"""
     from operator import attrgetter
-    ag = attrgetter(*'x v_0 v_c t_c v_1 v_max a_max'.split())
+    ag = attrgetter(*'x v_0 v_c t_c v_1'.split())
+
+    x, v_0, v_c, t_c, v_1 = ag(p)
 
-    x, v_0, v_c, t_c, v_1, v_max, a_max = ag(p)
+    # The limits are on the block's joint
+    v_max = p.joint.v_max if getattr(p, 'joint', None) is not None else p.v_max
 
     if x == 0:
         return JSClass.ZERO
@@ -119,4 +138,81 @@ def classify(p):
 
 
     else:
-        return JSClass.UNK
\ No newline at end of file
+        return JSClass.UNK
+
+
+_f = {f: i for i, f in enumerate(block_fields)}
+
+
+def classify_array(p, v_max):
+    """JSClass values for a block_params array shaped (segment, axis, field), with
+    v_max for each axis. The conditions are those of classify(), in the same order"""
+
+    p = np.asarray(p, dtype=np.float64)
+    x, v_0, v_c, t_c, v_1 = (p[..., _f[n]] for n in ('x', 'v_0', 'v_c', 't_c', 'v_1'))
+    v_max = np.asarray(v_max, dtype=np.float64)
+
+    J = JSClass
+
+    bounded = ((v_0 != 0) | (v_1 != 0)) & (v_0 < v_max) & (v_1 < v_max)
+
+    cases = [
+        (x == 0, J.ZERO),
+        ((v_c == v_1) & (v_1 == v_0), J.CONSTANT),
+        ((v_0 == 0) & (v_1 == 0) & (t_c == 0), J.TRIANGLE),
+        ((v_0 == 0) & (v_1 == 0), J.TRAPZEZOID),
+        ((v_0 != 0) & (v_1 == 0) & (v_c == 0), J.DECEL),
+        ((v_0 == v_c) & (v_1 > v_0), J.RAMP),
+        ((v_0 == v_c) & (v_1 < v_0), J.CLIFF),
+        ((v_1 == v_c) & (v_0 > v_1), J.RAMP),
+        ((v_1 == v_c) & (v_0 < v_1), J.ACEL),
+        (bounded & (t_c == 0), J.PENTAGON),
+        (bounded & (v_c > np.maximum(v_0, v_1)), J.HEXAGON),
+        (bounded & (v_c < np.minimum(v_0, v_1)), J.TROUGH),
+        (bounded, J.UNK),
+        ((v_c < v_0) & (v_c < v_1), J.TROUGH),
+    ]
+
+    return np.select([c for c, _ in cases], [k.value for _, k in cases], J.UNK.value)
+
+
+def classify_segments(sl):
+    """JSClass values of the blocks of a SegmentList, shaped (segment, axis)"""
+    return classify_array(sl.block_params, [j.v_max for j in sl.joints])
+
+
+def shape_histogram(joints, programs, normalize: bool = False):
+    """Count the block shapes of each program, an iterable of (name, moves), with
+    a row per program and a column per JSClass, plus the number of moves and
+    blocks, the time the program takes to run and the seconds it took to plan.
+    With normalize, the counts are fractions of the blocks of each program"""
+    import pandas as pd
+
+    from .planner import SegmentList
+
+    rows = []
+
+    for name, moves in programs:
+        t = perf_counter()
+        sl = SegmentList(joints)
+        for m in moves:
+            sl.move(list(m))
+        plan_time = perf_counter() - t
+
+        codes, counts = np.unique(classify_segments(sl), return_counts=True)
+
+        row = {'program': name, 'moves': len(moves), 'blocks': int(counts.sum()),
+               'time': sl.time, 'plan_time': plan_time}
+        row.update({k.name: 0 for k in JSClass})
+        row.update({JSClass(c).name: int(n) for c, n in zip(codes, counts)})
+
+        rows.append(row)
+
+    df = pd.DataFrame(rows, columns=['program', 'moves', 'blocks', 'time', 'plan_time'] +
+                                    [k.name for k in JSClass]).set_index('program')
+
+    if normalize:
+        shapes = [k.name for k in JSClass]
+        df[shapes] = df[shapes].div(df.blocks.where(df.blocks > 0, 1), axis=0)
+
+    return df
@@ -0,0 +1,245 @@
+"""Bresenham step generation, timing only the dominant axis.
+
+SegmentList.step() runs a Stepper, with its own floating point delay timer,
+for every axis, every tick. The DDA generator runs one Stepper per segment,
+for the dominant axis, the one with the most steps, through its three
+stepper_blocks() phases. Every step of the dominant axis advances an integer
+Bresenham error term for each of the other axes, which step when the error
+passes half of the dominant axis's steps, so an axis with n of the dominant
+axis's N steps makes exactly n evenly spaced steps.
+
+The other axes follow the velocity profile of the dominant axis instead of
+their own. The planner gives each axis its own accel and decel times, so this
+costs some timing accuracy, which compare() measures against the current
+generator. If the dominant Stepper runs out of periods before it makes all
+of its steps, the missing steps of every axis are made one per tick at the
+end of the segment, so positions at the ends of segments are always exact.
+
+    st = simulate(sl)
+    compare(sl).summary
+"""
+
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from .accel import jit, stepper_run, stepper_state
+from .emulator import stepper_phases
+from .parsim import SimResult, simulate as simulate_steppers
+from .planner import SegmentList
+from .stepper import DEFAULT_PERIOD, TIMEBASE
+from .timing import ideal_times
+
+
+@jit
+def dda_steps(phases, period, delay_counter):
+    """Steps of the DDA generator for phases shaped (segment, axis, phase, 3).
+
+    Returns (seg, tick, phase, axis, direction) for each step, in time order,
+    the ticks of each segment, the dominant axis of each segment, the number of
+    steps made after the dominant Stepper finished, and the delay counter at the end.
+    """
+
+    n_seg, n_axes = phases.shape[0], phases.shape[1]
+
+    n_max = 0
+    for s in range(n_seg):
+        for a in range(n_axes):
+            n_max += int(abs(phases[s, a, 0, 0] + phases[s, a, 1, 0] + phases[s, a, 2, 0]))
+
+    out_seg = np.empty(n_max, dtype=np.int64)
+    out_tick = np.empty(n_max, dtype=np.int64)
+    out_phase = np.empty(n_max, dtype=np.int64)
+    out_axis = np.empty(n_max, dtype=np.int64)
+    out_dir = np.empty(n_max, dtype=np.int64)
+
+    seg_ticks = np.zeros(n_seg, dtype=np.int64)
+    dominant = np.zeros(n_seg, dtype=np.int64)
+    flushed = np.zeros(n_seg, dtype=np.int64)
+
+    n = np.zeros(n_axes, dtype=np.int64)
+    sgn = np.zeros(n_axes, dtype=np.int64)
+    err = np.zeros(n_axes, dtype=np.int64)
+    made = np.zeros(n_axes, dtype=np.int64)
+
+    delay_inc = period / TIMEBASE
+    n_max_ticks = 1 << 62
+
+    st = np.zeros(len(stepper_state))
+    st[0] = delay_counter
+
+    k = 0
+    tick0 = 0
+
+    for s in range(n_seg):
+
+        d = 0
+        for a in range(n_axes):
+            x = phases[s, a, 0, 0] + phases[s, a, 1, 0] + phases[s, a, 2, 0]
+            n[a] = int(abs(x))
+            sgn[a] = 0 if x == 0 else (1 if x > 0 else -1)
+            err[a] = 0
+            made[a] = 0
+            if n[a] > n[d]:
+                d = a
+
+        dominant[s] = d
+
+        # Stepper, for the dominant axis
+        st[1:] = 0.0
+        phase = 0
+        j = 0
+
+        while True:
+            r, phase, calls = stepper_run(phases[s, d], phase, st, delay_inc, n_max_ticks)
+            j += calls
+
+            if r == 0:
+                break  # Done
+
+            if made[d] < n[d]:
+                # Bresenham for the other axes
+                for a in range(n_axes):
+                    if a == d:
+                        stepped = True
+                    else:
+                        err[a] += n[a]
+                        stepped = 2 * err[a] >= n[d]
+                        if stepped:
+                            err[a] -= n[d]
+
+                    if stepped and made[a] < n[a]:
+                        out_seg[k] = s
+                        out_tick[k] = tick0 + j - 1
+                        out_phase[k] = phase - 1
+                        out_axis[k] = a
+                        out_dir[k] = sgn[a]
+                        made[a] += 1
+                        k += 1
+
+        # Steps the dominant Stepper didn't get to, one per tick for each axis, from
+        # the call that finds the stepper done, the last tick in SegmentList.step()
+        rem = 0
+        for a in range(n_axes):
+            rem = max(rem, n[a] - made[a])
+
+        for i in range(rem):
+            for a in range(n_axes):
+                if made[a] < n[a]:
+                    out_seg[k] = s
+                    out_tick[k] = tick0 + j + i
+                    out_phase[k] = 2
+                    out_axis[k] = a
+                    out_dir[k] = sgn[a]
+                    made[a] += 1
+                    flushed[s] += 1
+                    k += 1
+
+        seg_ticks[s] = j + max(rem, 1)
+        tick0 += j + max(rem, 1)
+
+    return (out_seg[:k], out_tick[:k], out_phase[:k], out_axis[:k], out_dir[:k],
+            seg_ticks, dominant, flushed, st[0])
+
+
+def simulate(sl: SegmentList, period: int = DEFAULT_PERIOD) -> SimResult:
+    """Step a SegmentList with the DDA generator. The result has the same form
+    as parsim.simulate()'s; stats has the dominant axis of each segment and the
+    number of steps made after the dominant Stepper finished its segment"""
+
+    ph = stepper_phases(sl).astype(np.float64)
+    n_axes = ph.shape[1]
+
+    seg, tick, phase, axis, direction, seg_ticks, dominant, flushed, dc = dda_steps(ph, period, 0.0)
+
+    state = np.zeros((n_axes, len(stepper_state)))
+    state[:, 0] = dc  # One delay counter, shared by all axes
+
+    return SimResult(axis, seg, phase, tick, direction, seg_ticks, state, period,
+                     {'dominant': dominant, 'flushed': int(flushed.sum())})
+
+
+def step_errors(sl: SegmentList, st: SimResult):
+    """Time of each step, from the start of its segment, less the time the
+    planned profile of its axis reaches that step"""
+
+    ph = stepper_phases(sl).astype(np.float64)  # (segment, axis, phase, 3)
+    x, vi, vf = np.abs(ph[..., 0]), np.abs(ph[..., 1]), np.abs(ph[..., 2])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_f = np.where(vi + vf > 0, 2 * x / (vi + vf), 0)
+
+    phase_start = np.cumsum(t_f, axis=2) - t_f
+    steps_before = np.cumsum(x, axis=2) - x
+
+    # Number each axis's steps within its segment, 1-based
+    key = st.seg * len(ph[0]) + st.axis
+    order = np.argsort(key, kind='stable')
+    k = key[order]
+    j = np.empty(len(k), dtype=np.int64)
+    j[order] = np.arange(len(k)) - np.searchsorted(k, k, side='left') + 1
+
+    s, a = st.seg, st.axis
+    total = x[s, a].sum(axis=1)
+    j = np.minimum(j, np.maximum(total, 1)).astype(float)
+
+    p = (j[:, None] > steps_before[s, a] + x[s, a]).sum(axis=1).clip(0, 2)  # Phase of step j
+
+    jp = j - steps_before[s, a, p]
+    t_ideal = phase_start[s, a, p] + ideal_times(x[s, a, p], vi[s, a, p], vf[s, a, p], jp)
+
+    t = (st.tick - st.seg_start[s]) * (st.period / TIMEBASE)
+
+    return t - t_ideal
+
+
+class Comparison(object):
+    """Cost and accuracy of the DDA generator against per axis Steppers"""
+
+    def __init__(self, results, run_time, errors):
+        self.results = results  # name -> SimResult
+        self.run_time = run_time  # name -> seconds
+        self.errors = errors  # name -> step time errors
+
+    @property
+    def summary(self):
+        rows = []
+        for name, st in self.results.items():
+            e = np.abs(self.errors[name])
+            e = e[np.isfinite(e)]
+            rows.append({
+                'generator': name,
+                'steps': len(st),
+                'ticks': st.n_ticks,
+                'run_time': self.run_time[name],
+                'timer_updates': self.timer_updates(name),
+                'err_mean': e.mean() if len(e) else 0,
+                'err_p99': np.percentile(e, 99) if len(e) else 0,
+                'err_max': e.max() if len(e) else 0,
+                'flushed': st.stats.get('flushed', 0),
+            })
+
+        return pd.DataFrame(rows).set_index('generator')
+
+    def timer_updates(self, name):
+        """Floating point delay timer updates: one per axis per tick for the
+        steppers, one per tick for DDA"""
+        st = self.results[name]
+        return st.n_ticks * (1 if name == 'dda' else len(st.final_state))
+
+
+def compare(sl: SegmentList, period: int = DEFAULT_PERIOD) -> Comparison:
+    """Run both generators over a SegmentList"""
+
+    results, run_time, errors = {}, {}, {}
+
+    for name, f in (('stepper', lambda: simulate_steppers(sl, workers=1, period=period)),
+                    ('dda', lambda: simulate(sl, period))):
+        f()  # Warm up
+        t = perf_counter()
+        results[name] = f()
+        run_time[name] = perf_counter() - t
+        errors[name] = step_errors(sl, results[name])
+
+    return Comparison(results, run_time, errors)
@@ -0,0 +1,198 @@
+"""Batch emulation of the firmware step generator.
+
+SimSegment.iter_period runs the Austin algorithm one timer tick at a time,
+with the step delay ca held in fixed point with SimSegment.fp_bits fraction
+bits. This module computes the same step ticks for many phases at once with
+NumPy int64 arrays, and gives exactly the same results.
+
+iter_period adds period << fp_bits to an accumulator every tick, and steps
+when it exceeds ca. So the number of ticks from one step to the next is
+
+    k = max(1, (ca - r) // P + 1)      P = period << fp_bits
+
+where r is what is left in the accumulator after the last step. When the
+velocity is constant, ca never changes, and step j falls on tick j * ca // P + 1.
+Otherwise ca is updated after every step,
+
+    ca = abs(ca - int(2 * ca / (4 * n + 1)))
+
+which has to be done one step at a time. But it can be done for every
+accelerating phase of a job together, so the number of NumPy operations
+depends on the length of the longest acceleration, not on the number of steps.
+
+If numba is installed, the compiled accel.period_ticks kernel runs the phases
+one step at a time instead, which is faster still.
+"""
+
+import numpy as np
+
+from . import accel
+from .sim import SimSegment, DEFAULT_PERIOD, TIMEBASE
+
+
+def phase_params(x, v0, v1):
+    """Initial step count, steps and fixed point delay for each phase, from
+    SimSegment.initial_params, so the starting values match bit for bit"""
+
+    n = len(x)
+    steps = np.zeros(n, dtype=np.int64)
+    n0 = np.zeros(n, dtype=np.int64)
+    ca = np.zeros(n, dtype=np.int64)
+    const_v = np.zeros(n, dtype=bool)
+
+    for i, (x_, v0_, v1_) in enumerate(zip(x, v0, v1)):
+        if x_ == 0:
+            continue  # No steps and no delay, like SimSegment for x == 0
+
+        ss = SimSegment(int(x_), int(v0_), int(v1_))
+        n0[i], _, ca[i] = ss.initial_params()
+        steps[i] = ss.x
+        const_v[i] = ss.constV
+
+    return steps, n0, ca, const_v
+
+
+def emulate_phases(x, v0, v1, period: int = DEFAULT_PERIOD):
+    """Step ticks for many independent phases, each the same as running
+    SimSegment(x, v0, v1).iter_period(period).
+
+    Returns (offsets, ticks, phase_ticks):
+
+    * ticks[offsets[i]:offsets[i+1]] are the 1-based tick numbers of the steps of phase i
+    * phase_ticks[i] is the number of ticks the phase runs for, which is the tick of its last step
+    """
+
+    steps, n, ca, const_v = phase_params(x, v0, v1)
+
+    P = np.int64(period) << SimSegment.fp_bits
+
+    # iter_period runs one empty tick for a phase with a delay but no steps. A delay
+    # shorter than a tick could never finish, because it would step past zero.
+    empty = (steps == 0) & (ca != 0)
+    if np.any(empty & (ca < P)):
+        raise ValueError('Phase with no steps and a delay shorter than one period')
+
+    offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+    np.cumsum(steps, out=offsets[1:])
+
+    ticks = np.zeros(offsets[-1], dtype=np.int64)
+
+    if accel.HAVE_NUMBA:
+        accel.period_ticks(steps, n, ca, const_v, int(period), SimSegment.fp_bits, offsets, ticks)
+        return offsets, ticks, _phase_ticks(steps, offsets, ticks, empty)
+
+    # Constant velocity, with at most one step per tick: closed form
+    closed = const_v & (ca >= P) & (steps > 0)
+    if np.any(closed):
+        ci = np.nonzero(closed)[0]
+        cs = steps[ci]
+        phase = np.repeat(np.arange(len(ci)), cs)
+        j = np.arange(cs.sum()) - np.repeat(np.cumsum(cs) - cs, cs) + 1  # 1-based step number
+        ticks[np.repeat(offsets[ci], cs) + j - 1] = (j * ca[ci][phase]) // P + 1
+
+    # Everything else, one step at a time, for all phases together
+    idx = np.nonzero(~closed & (steps > 0) & (ca != 0))[0]
+
+    r = np.zeros(len(idx), dtype=np.int64)
+    tick = np.zeros(len(idx), dtype=np.int64)
+    ca_ = ca[idx].copy()
+    n_ = n[idx].copy()
+    cv = const_v[idx]
+    left = steps[idx].copy()
+    pos = offsets[idx].copy()
+
+    while len(idx):
+        k = np.maximum((ca_ - r) // P + 1, 1)
+        tick += k
+        r += k * P - ca_
+        ticks[pos] = tick
+
+        upd = ~cv
+        n_[upd] += 1
+        ca1 = np.trunc((2 * ca_[upd]).astype(np.float64) / (4 * n_[upd] + 1).astype(np.float64))
+        ca_[upd] = np.abs(ca_[upd] - ca1.astype(np.int64))
+
+        pos += 1
+        left -= 1
+
+        keep = left > 0
+        if not np.all(keep):
+            idx, r, tick, ca_, n_, cv, left, pos = (a[keep] for a in (idx, r, tick, ca_, n_, cv, left, pos))
+
+    return offsets, ticks, _phase_ticks(steps, offsets, ticks, empty)
+
+
+def _phase_ticks(steps, offsets, ticks, empty):
+    phase_ticks = np.where(steps > 0, ticks[np.maximum(offsets[1:] - 1, 0)], 0) if len(ticks) \
+        else np.zeros(len(steps), dtype=np.int64)
+    phase_ticks[empty] = 1
+    return phase_ticks
+
+
+class StepTrain(object):
+    """Emulated steps for all axes of a planned job"""
+
+    def __init__(self, axis, seg, phase, tick, direction, phase_ticks, period):
+        self.axis = axis  # Axis of each step
+        self.seg = seg  # Segment index of each step
+        self.phase = phase  # Phase of the block, 0, 1 or 2
+        self.tick = tick  # Tick of the step, counted from the start of the job on its axis
+        self.direction = direction  # -1 or 1
+        self.phase_ticks = phase_ticks  # Ticks for each phase, shaped (segment, axis, phase)
+        self.period = period
+
+    def __len__(self):
+        return len(self.tick)
+
+    @property
+    def t(self):
+        """Step times in seconds"""
+        return self.tick * (self.period / TIMEBASE)
+
+    def axis_steps(self, axis):
+        """Ticks and positions of the steps of one axis"""
+        m = self.axis == axis
+        return self.tick[m], np.cumsum(self.direction[m])
+
+    @property
+    def dataframe(self):
+        import pandas as pd
+        df = pd.DataFrame({'axis': self.axis, 'seg': self.seg, 'phase': self.phase,
+                           'tick': self.tick, 't': self.t, 'dir': self.direction})
+        df['x'] = df.groupby('axis').dir.cumsum()
+        return df
+
+
+def stepper_phases(sl):
+    """Phases of the stepper blocks of a SegmentList, shaped (segment, axis, phase, 3),
+    with the last dimension (x, v0, v1)"""
+    return np.array([[b.stepper_blocks() for b in s.blocks] for s in sl.segments], dtype=np.int64)
+
+
+def emulate(sl, period: int = DEFAULT_PERIOD):
+    """Emulate the firmware stepping all of the segments of a SegmentList, with
+    the phases of each axis run back to back"""
+
+    ph = stepper_phases(sl)
+    n_seg, n_axes = ph.shape[:2]
+
+    # Order phases by axis, then segment and phase, so each axis runs in sequence
+    flat = ph.transpose(1, 0, 2, 3).reshape(-1, 3)
+    offsets, ticks, phase_ticks = emulate_phases(flat[:, 0], flat[:, 1], flat[:, 2], period)
+
+    counts = np.diff(offsets)
+
+    # Start tick of each phase, running on within each axis
+    pt = phase_ticks.reshape(n_axes, -1)
+    start = (np.cumsum(pt, axis=1) - pt).ravel()
+
+    pi = np.repeat(np.arange(len(flat)), counts)
+
+    axis = pi // (n_seg * 3)
+    seg = (pi // 3) % n_seg
+    phase = pi % 3
+
+    direction = np.sign(flat[:, 0])[pi]
+
+    return StepTrain(axis, seg, phase, ticks + start[pi], direction,
+                     phase_ticks.reshape(n_axes, n_seg, 3).transpose(1, 0, 2), period)
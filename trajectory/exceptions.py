@@ -3,7 +3,19 @@ class SegmentError(Exception):
 
 
 class ConvergenceError(SegmentError):
-    pass
+    """Planning gave up before all segment boundaries were consistent"""
+
+    def __init__(self, msg, diagnostics=None, *args: object) -> None:
+        super().__init__(msg, *args)
+        self.diagnostics = diagnostics
+
+
+class ConvergenceWarning(UserWarning):
+    """Planning gave up, and fell back to a slower, but continuous, plan"""
+
+    def __init__(self, msg, diagnostics=None, *args: object) -> None:
+        super().__init__(msg, *args)
+        self.diagnostics = diagnostics
 
 
 class BoundaryError(SegmentError):
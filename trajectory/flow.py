@@ -0,0 +1,137 @@
+"""Flow control between the planner and the device.
+
+The device reports the length and time of its segment queue in each
+CurrentState. FlowController keeps that queue time between a low and a high
+watermark: when the device's queue drops below low_water seconds, it takes
+segments from the SegmentList and sends them until the queue reaches
+high_water. Segments stay in the planner, where they can still be replanned,
+until the moment they are needed.
+
+    fc = FlowController(sl, proto, low_water=.2, high_water=.5)
+    while running:
+        plan_some_moves()
+        fc.service()
+"""
+
+from time import time
+
+from .planner import SegmentList
+
+
+class FlowController(object):
+    """Keep the device queue between watermarks of time"""
+
+    def __init__(self, sl: SegmentList, proto=None, low_water: float = .2, high_water: float = .5,
+                 send=None, clock=time):
+        """
+        :param sl: Planner to take segments from
+        :param proto: SyncProto, or anything with update(timeout) and current_state
+        :param low_water: Refill when the device queue has less than this many seconds
+        :param high_water: Stop refilling when the device queue has at least this many seconds
+        :param send: Called with each segment to send it; defaults to
+            proto.rmove(segment.move, expected_time=segment.t)
+        :param clock: Time source, in seconds
+        """
+        assert low_water <= high_water
+
+        self.sl = sl
+        self.proto = proto
+        self.low_water = low_water
+        self.high_water = high_water
+        self.send = send or (lambda s: self.proto.rmove(s.move, expected_time=s.t))
+        self.clock = clock
+
+        self.sent_segments = 0
+        self.sent_time = 0  # Total time of segments sent
+
+        self.underruns = 0  # Device queue ran dry while segments were waiting
+        self.starved = 0  # Refills that found no segments to send
+        self.refills = 0
+
+        self._report = None  # The last CurrentState
+        self._report_time = None
+        self._sent_since_report = 0
+        self._was_empty = True
+
+    @property
+    def device_queue_time(self):
+        """Estimated time left in the device queue, in seconds. This is the proto's
+        queue model if it has one; otherwise the last report, plus segments sent
+        since then, less the time since the report"""
+
+        if getattr(self.proto, 'queue_model', None) is not None:
+            return self.proto.queue_model.estimate()
+
+        cs = self.proto.current_state if self.proto is not None else None
+
+        if cs is not self._report:
+            self._report = cs
+            self._report_time = self.clock()
+            self._sent_since_report = 0
+
+        reported = cs.queue_time / 1e6 if cs is not None else 0
+        elapsed = self.clock() - self._report_time if self._report_time is not None else 0
+
+        return max(0, reported - elapsed) + self._sent_since_report
+
+    def _send(self, s):
+        self.send(s)
+        self.sl.pop()
+
+        self.sent_segments += 1
+        self.sent_time += s.t
+        self._sent_since_report += s.t
+
+    def service(self, timeout: float = 0):
+        """Read device messages, then refill the device queue if it is below the low
+        watermark. Returns the number of segments sent"""
+
+        if self.proto is not None:
+            self.proto.update(timeout)
+
+        qt = self.device_queue_time
+
+        if qt > self.low_water:
+            self._was_empty = False
+            return 0
+
+        waiting = len(self.sl) > self.sl.committed
+
+        if qt == 0 and waiting and not self._was_empty:
+            self.underruns += 1
+
+        self._was_empty = qt == 0
+
+        self.refills += 1
+        n = 0
+        while self.device_queue_time < self.high_water:
+            s = self.sl.take()
+            if s is None:
+                break
+            self._send(s)
+            n += 1
+
+        if n == 0:
+            self.starved += 1
+        else:
+            self._was_empty = False
+
+        return n
+
+    def run(self, timeout: float = .01, until=None):
+        """Service the queue until the planner has nothing left to send, or until
+        until() returns True. """
+
+        while (until is None and len(self.sl)) or (until is not None and not until()):
+            self.service(timeout)
+
+    @property
+    def stats(self):
+        return {
+            'sent_segments': self.sent_segments,
+            'sent_time': self.sent_time,
+            'refills': self.refills,
+            'underruns': self.underruns,
+            'starved': self.starved,
+            'device_queue_time': self.device_queue_time,
+        }
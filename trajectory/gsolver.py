@@ -1,11 +1,17 @@
+import os
 from dataclasses import dataclass, asdict, replace
-from math import sqrt
+from math import isnan, sqrt
 
 import pandas as pd
 
+from . import accel
 from .exceptions import TrapMathError
 from .stepper import DEFAULT_PERIOD, Stepper
 
+# Consistency asserts in Block.plan(), Block.reductions() and SegmentList.plan(). Turn them off, or set TRJ_CHECKS=0, to save
+# their cost in production, and check whole plans with validate.validate() instead
+CHECKS = os.environ.get('TRJ_CHECKS', '1') != '0'
+
 
 def binary_search(f, v_min, v_guess, v_max):
     for i in range(20):
@@ -54,7 +60,8 @@ def accel_acd(v_0, v_c, v_1, a):
     x_a, t_a = accel_xt(v_0, v_c, a)
     x_d, t_d = accel_xt(v_c, v_1, a)
 
-    assert round((x_a+x_d)-(x_ad),2) == 0, (x_a+x_d, x_ad)
+    if CHECKS:
+        assert round((x_a+x_d)-(x_ad),2) == 0, (x_a+x_d, x_ad)
 
     return x_a+x_d, t_a+t_d
 
@@ -203,7 +210,7 @@ class Block:
         if t == None:
             t = self.min_time()
 
-        if self.segment is not None:
+        if CHECKS and self.segment is not None:
             assert not ((prior is None) ^ (self.segment.prior is None))
 
         self.set_bv(v_0=v_0, v_1=v_1, prior=prior, next_=next_)
@@ -219,19 +226,14 @@ class Block:
             return self
 
         # Find v_c with a binary search, then patch it up if the
-        # selection changes the segment time.
-
-        def err(v_c):
-            x_ad, t_ad = accel_acd(self.v_0, v_c, self.v_1, self.joint.a_max)
-
-            t_c = max(self.t - t_ad, 0)
-            x_c = max(v_c, 0) * t_c
+        # selection changes the segment time. The search is
+        # binary_search() over x - (x_ad + x_c), compiled if numba is installed.
 
-            err = self.x - (x_ad + x_c)
+        v_c = accel.search_v_c(float(self.x), float(self.t), float(self.v_0), float(self.v_1),
+                               float(self.joint.v_max), float(self.joint.a_max))
 
-            return err
-
-        v_c = binary_search(err, 0, self.x / self.t, self.joint.v_max)
+        if isnan(v_c):
+            raise TrapMathError(f'No v_c found for x={self.x} t={self.t} v_0={self.v_0} v_1={self.v_1}')
 
         self.v_c = min(v_c, self.v_c_max)
 
@@ -250,6 +252,13 @@ class Block:
 
         self.t = self.t_a + self.t_c + self.t_d
 
+        if CHECKS:
+            self.check()
+
+        return self
+
+    def check(self):
+        """Assert that a planned block is consistent"""
         assert self.t > 0
         assert self.v_c <= self.joint.v_max
         assert self.v_c >= 0, self.v_c
@@ -259,8 +268,6 @@ class Block:
         assert self.v_c <= self.joint.v_max
         assert self.v_1 <= self.joint.v_max
 
-        return self
-
     def set_bv(self, v_0=None, v_1=None, prior=None, next_=None):
 
         if v_0 == 'prior' and prior is not None:
@@ -271,7 +278,7 @@ class Block:
         if v_1 == 'next' and next_ is not None:
             self.v_1 = next_.v_0
         elif v_1 == 'v_max':
-            self.v_1 = self.joint.v_max
+            self.v_1 = self.v_c_max
         elif v_1 is not None:
             self.v_1 = v_1
 
@@ -324,8 +331,9 @@ class Block:
 
     def reductions(self, t):
         def has_error(b, t):
-            assert round(b.x_c) >= 0
-            assert not (b.x > 25 and abs(round(b.area) - b.x) > 1)
+            if CHECKS:
+                assert round(b.x_c) >= 0
+                assert not (b.x > 25 and abs(round(b.area) - b.x) > 1)
             return round(t, 3) != round(b.t, 3)
 
         if not has_error(self, t):
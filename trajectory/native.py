@@ -0,0 +1,225 @@
+"""In-process binding to the C++ planner.
+
+The C++ planner in src/planner builds a shared library, libtrjplanner, with a
+small C interface ( trj_capi.h ). This module loads it with ctypes and wraps
+it in NativeSegmentList, which has the parts of the SegmentList interface used
+by senders and steppers: move(), the queue counters, segments, pop() and
+dataframe. Moves go in and block parameters come out through NumPy buffers.
+
+The native planner is optional. The library is found through the
+TRJ_PLANNER_LIB environment variable or in the usual build directories, and
+available() reports whether it could be loaded. The Python planner stays the
+reference implementation.
+"""
+
+import ctypes
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from .gsolver import Block, Joint
+from .planner import Segment
+from .table import block_fields, blocks_dataframe
+
+_lib = None
+
+_lib_names = ('libtrjplanner.so', 'libtrjplanner.dylib', 'trjplanner.dll')
+
+_src_dir = Path(__file__).parent.parent.joinpath('src')
+
+
+def _candidates():
+    if os.environ.get('TRJ_PLANNER_LIB'):
+        yield Path(os.environ['TRJ_PLANNER_LIB'])
+
+    for d in (_src_dir.joinpath('planner'), _src_dir.joinpath('build', 'planner'),
+              _src_dir.joinpath('cmake-build-debug', 'planner'), _src_dir.joinpath('build')):
+        for n in _lib_names:
+            yield d.joinpath(n)
+
+
+def load_library(path=None):
+    """Load the planner shared library, from path or from the first place it is found"""
+    global _lib
+
+    if _lib is not None and path is None:
+        return _lib
+
+    paths = [Path(path)] if path else [p for p in _candidates() if p.exists()]
+
+    if not paths:
+        raise OSError("Can't find libtrjplanner; build the trjplanner target in src/planner "
+                      "or set TRJ_PLANNER_LIB")
+
+    lib = ctypes.CDLL(str(paths[0]))
+
+    c_double_p = ctypes.POINTER(ctypes.c_double)
+    c_int32_p = ctypes.POINTER(ctypes.c_int32)
+
+    def sig(name, restype, *argtypes):
+        f = getattr(lib, name)
+        f.restype = restype
+        f.argtypes = argtypes
+
+    sig('trj_n_params', ctypes.c_int)
+    sig('trj_planner_new', ctypes.c_void_p, ctypes.c_int, c_double_p, c_double_p)
+    sig('trj_planner_free', None, ctypes.c_void_p)
+    sig('trj_planner_n_joints', ctypes.c_int, ctypes.c_void_p)
+    sig('trj_planner_n_segments', ctypes.c_size_t, ctypes.c_void_p)
+    sig('trj_planner_move', None, ctypes.c_void_p, c_int32_p, ctypes.c_size_t)
+    sig('trj_planner_blocks', ctypes.c_size_t, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t,
+        c_double_p)
+    sig('trj_planner_queue_time', ctypes.c_double, ctypes.c_void_p)
+    sig('trj_planner_position', None, ctypes.c_void_p, c_int32_p)
+    sig('trj_planner_pop', ctypes.c_int, ctypes.c_void_p)
+    sig('trj_stepper_new', ctypes.c_void_p, ctypes.c_void_p)
+    sig('trj_stepper_free', None, ctypes.c_void_p)
+    sig('trj_stepper_next', ctypes.c_int, ctypes.c_void_p, ctypes.c_double)
+
+    if lib.trj_n_params() != len(block_fields):
+        raise OSError(f"libtrjplanner has {lib.trj_n_params()} block parameters, expected {len(block_fields)}")
+
+    _lib = lib
+
+    return lib
+
+
+def available():
+    """True if the native planner library can be loaded"""
+    try:
+        load_library()
+        return True
+    except OSError:
+        return False
+
+
+def _ptr(a, ctype):
+    return a.ctypes.data_as(ctypes.POINTER(ctype))
+
+
+class NativeSegmentList(object):
+    """A SegmentList backed by the C++ planner"""
+
+    def __init__(self, joints: List[Joint], lib=None):
+        self.lib = lib or load_library()
+
+        self.joints = [Joint(j.v_max, j.a_max, i) for i, j in enumerate(joints)]
+
+        v_max = np.array([j.v_max for j in self.joints], dtype=np.float64)
+        a_max = np.array([j.a_max for j in self.joints], dtype=np.float64)
+
+        self._h = self.lib.trj_planner_new(len(self.joints), _ptr(v_max, ctypes.c_double),
+                                           _ptr(a_max, ctypes.c_double))
+        self._stepper = None
+
+        self.seg_num = 0  # Segment number of the next move
+        self.popped = 0  # Number of segments removed from the front
+
+    def close(self):
+        if getattr(self, '_h', None):
+            if self._stepper:
+                self.lib.trj_stepper_free(self._stepper)
+                self._stepper = None
+            self.lib.trj_planner_free(self._h)
+            self._h = None
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def move(self, x: List[int]):
+        """Add a new segment"""
+        self.moves([x])
+
+    def moves(self, x):
+        """Add many segments at once, from an array shaped (n_moves, n_joints)"""
+        x = np.ascontiguousarray(x, dtype=np.int32).reshape(-1, len(self.joints))
+
+        self.lib.trj_planner_move(self._h, _ptr(x, ctypes.c_int32), len(x))
+        self.seg_num += len(x)
+
+    @property
+    def queue_length(self):
+        return int(self.lib.trj_planner_n_segments(self._h))
+
+    @property
+    def queue_time(self):
+        return self.lib.trj_planner_queue_time(self._h)
+
+    @property
+    def planner_position(self):
+        out = np.zeros(len(self.joints), dtype=np.int32)
+        self.lib.trj_planner_position(self._h, _ptr(out, ctypes.c_int32))
+        return out.tolist()
+
+    def __len__(self):
+        return self.queue_length
+
+    def block_params(self, start: int = 0, n: int = None):
+        """Array of block parameters shaped (segment, axis, field), with the
+        fields in the order of table.block_fields"""
+        n_seg = self.queue_length - start
+        if n is not None:
+            n_seg = min(n, n_seg)
+
+        out = np.zeros((max(n_seg, 0), len(self.joints), len(block_fields)), dtype=np.float64)
+
+        if n_seg > 0:
+            self.lib.trj_planner_blocks(self._h, start, n_seg, _ptr(out, ctypes.c_double))
+
+        return out
+
+    def _segment(self, n, params):
+        blocks = [Block(**dict(zip(block_fields, bp.tolist())), joint=j)
+                  for j, bp in zip(self.joints, params)]
+        return Segment(n, self.joints, blocks)
+
+    @property
+    def segments(self):
+        """Copies of the queued segments, as Python Segment objects"""
+        return [self._segment(self.popped + i, p) for i, p in enumerate(self.block_params())]
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += self.queue_length
+        p = self.block_params(item, 1)
+        if len(p) == 0:
+            raise IndexError('segment index out of range')
+        return self._segment(self.popped + item, p[0])
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def pop(self):
+        """Remove the front segment and return a copy of it"""
+        p = self.block_params(0, 1)
+        if len(p) == 0:
+            raise IndexError('pop from an empty planner')
+
+        s = self._segment(self.popped, p[0])
+        self.lib.trj_planner_pop(self._h)
+        self.popped += 1
+        return s
+
+    def step(self, dtime: float):
+        """Run the C++ segment stepper for one period of dtime seconds, consuming
+        segments as they finish. Returns the number of axes still moving"""
+        if self._stepper is None:
+            self._stepper = self.lib.trj_stepper_new(self._h)
+
+        n = self.queue_length
+        active = self.lib.trj_stepper_next(self._stepper, dtime)
+        self.popped += n - self.queue_length
+
+        return active
+
+    @property
+    def dataframe(self):
+        return blocks_dataframe(self.block_params())
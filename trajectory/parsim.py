@@ -0,0 +1,299 @@
+"""Parallel step simulation of a planned SegmentList.
+
+SegmentList.step() runs one Stepper per axis, one timer tick at a time. Each
+segment lasts until the stepper for axis 0 finishes its block, so
+
+1. The segment lengths depend only on axis 0. Its Stepper carries nothing but
+   its delay counter from one block to the next.
+2. Given the segment lengths, each axis steps independently of the others,
+   carrying its Stepper state from one segment to the next.
+
+simulate() computes the segment lengths, then runs every axis in a separate
+process with accel.clocked_steps, and merges the steps in time order. This
+is exactly the result of SegmentList.step(), and it scales with the number
+of axes.
+
+To use more processes than there are axes, each axis can also be split into
+shards of segments. A shard has to start from the state its predecessor ends
+with, which isn't known until the predecessor has run, so every shard starts
+from a guess, made by running the few segments before it, and shards are
+re-run, in rounds, with the state their predecessors ended with, until none
+of the states change. Differences in the carried delay counter don't die out,
+so when tol is 0 there is a round for each shard, and it is faster not to
+shard. With tol set, a carried state that is within tol seconds of the one a
+shard started with is accepted, which settles in a few rounds. Every step is
+still there, but step times can move by a few ticks from those of
+SegmentList.step().
+
+    st = simulate(sl)              # exact, one process per axis
+    st = simulate(sl, shards=8, tol=1e-6)
+
+iter_batches() runs the same computation in one process, a batch of segments
+at a time, for streaming the steps of long jobs to a trace file.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from .accel import clocked_steps, stepper_state, stepper_steps
+from .emulator import StepTrain, stepper_phases
+from .planner import SegmentList
+from .stepper import DEFAULT_PERIOD
+
+_n_state = len(stepper_state)
+
+
+class SimResult(StepTrain):
+    """Steps of a parallel simulation, in time order, with the segment timing"""
+
+    def __init__(self, axis, seg, phase, tick, direction, seg_ticks, final_state, period, stats):
+        super().__init__(axis, seg, phase, tick, direction, None, period)
+
+        self.seg_ticks = seg_ticks  # Ticks in each segment
+        self.seg_start = np.cumsum(seg_ticks) - seg_ticks  # First tick of each segment
+        self.final_state = final_state  # Stepper state of each axis at the end, fields in accel.stepper_state
+        self.stats = stats
+
+    @property
+    def n_ticks(self):
+        return int(self.seg_ticks.sum())
+
+    @property
+    def position(self):
+        """Step position of each axis at the end"""
+        return np.bincount(self.axis, weights=self.direction, minlength=len(self.final_state)).astype(np.int64)
+
+    def dense(self, start=0, stop=None):
+        """Steps as (tick, axis) array of -1, 0 and 1 for ticks start to stop, one row
+        per row of SegmentList.step()"""
+        stop = self.n_ticks if stop is None else stop
+        a = np.zeros((stop - start, len(self.final_state)), dtype=np.int8)
+
+        lo, hi = np.searchsorted(self.tick, [start, stop])
+        a[self.tick[lo:hi] - start, self.axis[lo:hi]] = self.direction[lo:hi]
+
+        return a
+
+
+def _run_lengths(phases, period, delay_counter):
+    """Stage 1 shard: ticks of each segment, from axis 0"""
+    _, _, _, _, block_ticks, dc = stepper_steps(phases, period, True, float(delay_counter[0]))
+    return block_ticks + 1, np.array([dc])  # +1 for the call that finds axis 0 done
+
+
+def _run_axis(phases, period, seg_ticks, state):
+    """Stage 2 shard: the steps of one axis"""
+    seg, call, phase, direction, state = clocked_steps(phases, period, seg_ticks, state)
+    return (seg, call, phase, direction), state
+
+
+def _clean(s):
+    """True if the next call to Stepper.next() will start a new phase, so only
+    the delay counter carries over"""
+    return s[1] <= 0 or s[2] <= 0
+
+
+def state_close(s, t, tol=0.0):
+    """True if a shard that started from state t would have started from s,
+    to within tol seconds on the float fields"""
+
+    if len(s) == 1:
+        return abs(s[0] - t[0]) <= tol
+
+    if _clean(s) and _clean(t):
+        return abs(s[0] - t[0]) <= tol
+
+    return (np.array_equal(s[1:5], t[1:5]) and
+            bool(np.all(np.abs(s[[0, 5, 6, 7, 8]] - t[[0, 5, 6, 7, 8]]) <= tol)))
+
+
+class _Serial(object):
+    """Runs submitted work in this process, for workers=1"""
+
+    class _Done(object):
+        def __init__(self, r):
+            self._r = r
+
+        def result(self):
+            return self._r
+
+    def submit(self, f, *args):
+        return self._Done(f(*args))
+
+
+def _run_shard(f, args, warm, state):
+    """Run a shard from state, after first running the warm up args from state,
+    if there are any. Returns the result, the end state, and the state the shard
+    itself started from"""
+    if warm is not None:
+        state = f(*warm, state)[1]
+
+    r, end = f(*args, state)
+    return r, end, state
+
+
+def settle(pool, chains, initial, guess, tol=0.0):
+    """Run chains of shards, each shard starting from the state its predecessor
+    ends with, re-running speculative shards until the states agree.
+
+    chains is a list of lists of (function, args, warm) shards; each function
+    takes its args and a start state, and returns (result, end state). The
+    first shard of chain i starts from initial[i]. The others start from guess,
+    run through warm, the args for the segments just before the shard, if it
+    isn't None. Re-runs start from the predecessor's end state.
+
+    Returns the results for each chain, the end state of each chain, and a dict
+    of statistics.
+    """
+
+    inputs = [[initial[c]] + [guess] * (len(ch) - 1) for c, ch in enumerate(chains)]
+    warm = [[None] + [s[2] for s in ch[1:]] for ch in chains]
+    results = [[None] * len(ch) for ch in chains]
+
+    todo = [(c, i) for c, ch in enumerate(chains) for i in range(len(ch))]
+    rounds = runs = 0
+
+    while todo:
+        futures = [(c, i, pool.submit(_run_shard, chains[c][i][0], chains[c][i][1], warm[c][i], inputs[c][i]))
+                   for c, i in todo]
+
+        for c, i, f in futures:
+            results[c][i] = f.result()
+            inputs[c][i] = results[c][i][2]
+            warm[c][i] = None
+
+        rounds += 1
+        runs += len(todo)
+
+        todo = []
+        for c, ch in enumerate(chains):
+            for i in range(1, len(ch)):
+                end = results[c][i - 1][1]
+                if not state_close(end, inputs[c][i], tol):
+                    inputs[c][i] = end
+                    todo.append((c, i))
+
+    stats = {'rounds': rounds, 'runs': runs, 'shards': sum(len(ch) for ch in chains)}
+
+    return [[r[0] for r in rs] for rs in results], [rs[-1][1] for rs in results], stats
+
+
+def _shards(n, shards):
+    """Boundaries of up to shards contiguous ranges of n segments"""
+    b = np.linspace(0, n, min(max(shards, 1), max(n, 1)) + 1).round().astype(int)
+    return list(zip(b[:-1], b[1:]))
+
+
+def simulate(sl: SegmentList, workers: int = None, shards: int = 1, tol: float = 0.0,
+             overlap: int = 2, period: int = DEFAULT_PERIOD) -> SimResult:
+    """Step all of the segments of a SegmentList, as SegmentList.step() does, in
+    parallel. workers is the number of processes, 1 to run in this process,
+    and shards the number of shards for each axis. Each shard first guesses its
+    state by running the overlap segments before it.
+    """
+
+    ph = stepper_phases(sl).astype(np.float64)  # (segment, axis, phase, 3)
+    n_seg, n_axes = ph.shape[:2]
+
+    axis_phases = [np.ascontiguousarray(ph[:, a].reshape(-1, 3)) for a in range(n_axes)]
+
+    workers = workers or min(os.cpu_count() or 1, n_axes * shards)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else _Serial()
+
+    try:
+        bounds = _shards(n_seg, shards)
+
+        def warm(lo):
+            return max(lo - overlap, 0), lo
+
+        # Stage 1: segment lengths from axis 0
+        def lengths_args(lo, hi):
+            return axis_phases[0][lo * 3:hi * 3], period
+
+        chain = [(_run_lengths, lengths_args(lo, hi), lengths_args(*warm(lo)) if overlap else None)
+                 for lo, hi in bounds]
+        lengths, _, stats1 = settle(pool, [chain], [np.zeros(1)], np.zeros(1), tol)
+        seg_ticks = np.concatenate(lengths[0]) if n_seg else np.zeros(0, dtype=np.int64)
+
+        # Stage 2: the steps of each axis
+        def axis_args(a, lo, hi):
+            return axis_phases[a][lo * 3:hi * 3], period, seg_ticks[lo:hi]
+
+        chains = [[(_run_axis, axis_args(a, lo, hi), axis_args(a, *warm(lo)) if overlap else None)
+                   for lo, hi in bounds]
+                  for a in range(n_axes)]
+        results, final_state, stats2 = settle(pool, chains, [np.zeros(_n_state)] * n_axes,
+                                              np.zeros(_n_state), tol)
+    finally:
+        if isinstance(pool, ProcessPoolExecutor):
+            pool.shutdown()
+
+    seg_start = np.cumsum(seg_ticks) - seg_ticks
+
+    parts = []
+    for a, rs in enumerate(results):
+        for (lo, hi), (seg, call, phase, direction) in zip(bounds, rs):
+            seg = seg + lo
+            parts.append((np.full(len(seg), a), seg, phase, seg_start[seg] + call, direction))
+
+    axis, seg, phase, tick, direction = (np.concatenate([p[i] for p in parts]).astype(np.int64)
+                                         if parts else np.zeros(0, dtype=np.int64) for i in range(5))
+
+    order = np.lexsort((axis, tick))
+
+    stats = {'workers': workers, 'shards': shards, 'tol': tol,
+             'rounds': stats1['rounds'] + stats2['rounds'],
+             'runs': stats1['runs'] + stats2['runs'],
+             'wasted_runs': stats1['runs'] + stats2['runs'] - stats1['shards'] - stats2['shards']}
+
+    return SimResult(axis[order], seg[order], phase[order], tick[order], direction[order],
+                     seg_ticks, np.array(final_state), period, stats)
+
+
+StepBatch = namedtuple('StepBatch', 'first_seg first_tick seg_ticks axis seg phase tick direction')
+
+
+def iter_batches(sl: SegmentList, batch: int = 64, period: int = DEFAULT_PERIOD):
+    """Step the segments of a SegmentList in this process, batch segments at a
+    time, carrying the stepper states from one batch to the next. Yields a
+    StepBatch for each batch, with the steps in time order and seg and tick
+    counted from the start of the job. The steps are the same as simulate()'s,
+    but only one batch is in memory at a time. """
+
+    n_axes = len(sl.joints)
+
+    dc = np.zeros(1)
+    states = [np.zeros(_n_state)] * n_axes
+    first_seg = first_tick = 0
+
+    segments = iter(sl.segments)
+
+    while True:
+        segs = list(islice(segments, batch))
+        if not segs:
+            break
+
+        ph = np.array([[b.stepper_blocks() for b in s.blocks] for s in segs], dtype=np.float64)
+
+        seg_ticks, dc = _run_lengths(np.ascontiguousarray(ph[:, 0].reshape(-1, 3)), period, dc)
+        seg_start = first_tick + np.cumsum(seg_ticks) - seg_ticks
+
+        parts = []
+        for a in range(n_axes):
+            (seg, call, phase, direction), states[a] = _run_axis(np.ascontiguousarray(ph[:, a].reshape(-1, 3)),
+                                                                 period, seg_ticks, states[a])
+            parts.append((np.full(len(seg), a), seg + first_seg, phase, seg_start[seg] + call, direction))
+
+        axis, seg, phase, tick, direction = (np.concatenate([p[i] for p in parts]).astype(np.int64)
+                                             for i in range(5))
+        order = np.lexsort((axis, tick))
+
+        yield StepBatch(first_seg, first_tick, seg_ticks, axis[order], seg[order], phase[order], tick[order],
+                        direction[order])
+
+        first_seg += len(segs)
+        first_tick += int(seg_ticks.sum())
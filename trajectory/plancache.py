@@ -0,0 +1,195 @@
+"""On-disk cache of planned move programs.
+
+Plans are stored in the binary form from serialize.py, in files named by a
+SHA-256 hash of planner.PLANNER_VERSION, the planner settings, the joint
+configuration and the move sequence. Besides the
+whole program, the cache keeps checkpoints of prefixes of the program at
+doubling lengths ( chunk, 2*chunk, 4*chunk ... moves ), so a program that
+extends a cached one only plans the new moves. The checkpoints take at most
+about as much space as the full plan.
+
+Files are written atomically, so several processes can share a cache
+directory. When the cache grows beyond max_bytes, the least recently used
+files are removed.
+
+    cache = PlanCache()
+    sl = cache.plan(joints, moves)
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from .gsolver import Joint
+from .planner import PLANNER_VERSION, SegmentList
+from . import serialize
+
+default_dir = Path(os.environ.get('TRJ_PLAN_CACHE', Path.home().joinpath('.cache', 'trajectory', 'plans')))
+
+
+class PlanCache(object):
+    """Content addressed store of planned SegmentLists. plan_budget and
+    oscillation_limit are passed to the SegmentLists it plans"""
+
+    settings = ('plan_budget', 'oscillation_limit')  # SegmentList settings that change the plans
+
+    def __init__(self, directory=None, max_bytes: int = 256 * 1024 * 1024, chunk: int = 64,
+                 plan_budget: int = None, oscillation_limit: int = None):
+        self.directory = Path(directory or default_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.chunk = chunk
+
+        self.plan_budget = SegmentList.plan_budget if plan_budget is None else plan_budget
+        self.oscillation_limit = SegmentList.oscillation_limit if oscillation_limit is None else oscillation_limit
+
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _moves(joints: List[Joint], moves):
+        return np.ascontiguousarray(moves, dtype=np.int32).reshape(len(moves), len(joints))
+
+    def _joint_hash(self, joints: List[Joint]):
+        h = hashlib.sha256(f'trj-plan-{PLANNER_VERSION}'.encode('ascii'))
+        h.update(np.array([getattr(self, k) for k in self.settings], dtype=np.float64).tobytes())
+        h.update(np.array([(j.v_max, j.a_max) for j in joints], dtype=np.float64).tobytes())
+        return h
+
+    def _segment_list(self, joints: List[Joint]):
+        return SegmentList(joints, plan_budget=self.plan_budget, oscillation_limit=self.oscillation_limit)
+
+    def checkpoints(self, n_moves):
+        """Prefix lengths that are stored as checkpoints"""
+        n = self.chunk
+        while n < n_moves:
+            yield n
+            n *= 2
+
+    def keys(self, joints: List[Joint], moves):
+        """Map of prefix length to key, for the checkpoints and the whole program"""
+        moves = self._moves(joints, moves)
+        h = self._joint_hash(joints)
+
+        keys = {}
+        last = 0
+        for n in list(self.checkpoints(len(moves))) + [len(moves)]:
+            h.update(moves[last:n].tobytes())
+            keys[n] = h.hexdigest()
+            last = n
+
+        return keys
+
+    def key(self, joints: List[Joint], moves):
+        return self.keys(joints, moves)[len(moves)]
+
+    def path(self, key):
+        return self.directory.joinpath(key[:2], key + '.trj')
+
+    def _read(self, key, joints):
+        p = self.path(key)
+        try:
+            data = p.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        try:
+            os.utime(p)  # Mark as recently used
+        except OSError:
+            pass
+
+        sl = serialize.loads(data, joints)
+        sl.plan_budget, sl.oscillation_limit = self.plan_budget, self.oscillation_limit
+
+        return sl
+
+    def _write(self, key, sl: SegmentList):
+        p = self.path(key)
+        if p.exists():
+            return
+
+        p.parent.mkdir(exist_ok=True)
+        tmp = p.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_bytes(serialize.dumps(sl))
+        os.replace(tmp, p)
+
+    def get(self, joints: List[Joint], moves):
+        """The cached plan for exactly these moves, or None"""
+        sl = self._read(self.key(joints, moves), joints)
+        if sl is not None:
+            self.hits += 1
+        return sl
+
+    def put(self, joints: List[Joint], moves, sl: SegmentList):
+        self._write(self.key(joints, moves), sl)
+        self.evict()
+
+    def plan(self, joints: List[Joint], moves):
+        """Return a SegmentList with moves planned, loading as much as possible from the cache"""
+        moves = self._moves(joints, moves)
+        keys = self.keys(joints, moves)
+
+        # Longest cached prefix, which may be the whole program
+        sl, start = None, 0
+        for n in sorted(keys, reverse=True):
+            sl = self._read(keys[n], joints)
+            if sl is not None:
+                start = n
+                break
+
+        if start == len(moves) and sl is not None:
+            self.hits += 1
+            return sl
+
+        if sl is None:
+            self.misses += 1
+            sl = self._segment_list(joints)
+        else:
+            self.prefix_hits += 1
+
+        for i in range(start, len(moves)):
+            sl.move(moves[i].tolist())
+
+            n = i + 1
+            if n in keys:
+                self._write(keys[n], sl)
+
+        self.evict()
+
+        return sl
+
+    def files(self):
+        return list(self.directory.glob('??/*.trj'))
+
+    @property
+    def size(self):
+        return sum(p.stat().st_size for p in self.files())
+
+    def evict(self):
+        """Remove the least recently used files until the cache is under max_bytes"""
+        entries = []
+        for p in self.files():
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except FileNotFoundError:  # Removed by another process
+                pass
+
+        total = sum(e[1] for e in entries)
+
+        for mtime, size, p in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for p in self.files():
+            p.unlink()
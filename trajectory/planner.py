@@ -31,13 +31,30 @@ Joint segment shapes
 
 """
 import math
-from collections import deque
+import threading
+from collections import deque, namedtuple, Counter
+from time import perf_counter
 from typing import List
+from warnings import warn
 
 import numpy as np
 import pandas as pd
 
+from . import gsolver
+from .exceptions import ConvergenceError, ConvergenceWarning
 from .gsolver import Joint, Block, bent, mean_bv
+from .ring import RingBuffer
+from .table import BlockTable
+
+# Version of the planner's output. Bump it with any change that changes the
+# plans for the same moves, so PlanCache doesn't return plans from an older planner
+PLANNER_VERSION = 4
+
+# One record per pass of SegmentList.plan, for convergence diagnostics
+PlanPass = namedtuple('PlanPass', 'seg_idx boundary_error times_rms bends')
+
+# Block attributes that planning changes, saved so a time budgeted move can back out
+_plan_fields = ('t', 't_a', 't_c', 't_d', 'x_a', 'x_c', 'x_d', 'v_0', 'v_c', 'v_1')
 
 
 def index_clip(n, l):
@@ -61,6 +78,9 @@ class Segment(object):
     move: "List[int]" = None
 
     replans: int = 0
+    queued_t: float = 0  # Time counted for this segment in SegmentList.queue_time
+    frozen: bool = False  # Handed to a consumer, so it must not be replanned
+    rms_history: List[float] = None  # times_e_rms after each iteration of the last plan()
 
     def __init__(self, n, joints: List[Joint], move: List[int] = None, prior: "Segment" = None):
 
@@ -85,21 +105,20 @@ class Segment(object):
 
     def plan(self, v_0=None, v_1=None, prior=None, next_=None, t=None, iter=10):
 
+        if self.frozen:
+            return self
+
         # Planning can change the time for a block, so planning multiple
         # will ( should ) converge on a singe segment time.
 
         largest_at = max([j.max_at for j in self.joints])
         lower_bound_time = largest_at * 2
 
+        self.rms_history = []
+        reduced = []
+
         for p_iter in range(iter):  # Rarely more than 1 iteration
-            if t is not None:
-                mt = t
-            elif p_iter < 2:
-                mt = self.min_time
-            elif p_iter < 4:
-                mt = max(lower_bound_time, self.min_time)
-            else:
-                mt = max(lower_bound_time, self.time)
+            mt = self._plan_time(p_iter, t, lower_bound_time)
 
             for i, b in enumerate(self.blocks):
                 pb = prior.blocks[i] if prior is not None else None
@@ -107,16 +126,45 @@ class Segment(object):
 
                 b.plan(mt, v_0, v_1, pb, nb, iter=p_iter)
 
-            if self.times_e_rms < .001:
+            rms = self.times_e_rms
+            self.rms_history.append(rms)
+
+            if rms < .001:
                 break
-            else:
-                for b in self.blocks:
-                    if b.t < mt:
-                        b.limit_bv()
+
+            reduced = []
+            for i, b in enumerate(self.blocks):
+                if b.t < mt:
+                    b.limit_bv()
+                    reduced.append(i)
+
+            # Stalled: nothing was reduced, and the next pass would use the same
+            # time, so it would produce exactly the same blocks again.
+            if not reduced and self._plan_time(p_iter + 1, t, lower_bound_time) == mt:
+                break
+        else:
+            # The last iteration reduced boundary velocities, so plan the
+            # blocks for them, or their phases would be for the old ones
+            for i in reduced:
+                pb = prior.blocks[i] if prior is not None else None
+                nb = next_.blocks[i] if next_ is not None else None
+
+                self.blocks[i].plan(mt, None, None, pb, nb, iter=p_iter)
 
         self.t = self.time
         return self
 
+    def _plan_time(self, p_iter, t, lower_bound_time):
+        """Segment time to try on planning iteration p_iter"""
+        if t is not None:
+            return t
+        elif p_iter < 2:
+            return self.min_time
+        elif p_iter < 4:
+            return max(lower_bound_time, self.min_time)
+        else:
+            return max(lower_bound_time, self.time)
+
     def zero(self):
         for b in self.blocks:
             b.zero();
@@ -210,13 +258,33 @@ class Segment(object):
 
 
 class SegmentList(object):
-    segments: List[Segment]
+    """The queue of planned segments.
+
+    When plan() gives up, on a deadline, a stall, an oscillation or the end of
+    plan_budget, it falls back to a continuous, slower plan and issues a
+    ConvergenceWarning with the PlanPass history in its diagnostics, which is
+    also kept in plan_passes, and counted in plan_exits. strict=True raises
+    ConvergenceError instead, except for deadlines. strict is False by default,
+    which deliberately departs from raising whenever the budget is exceeded: a
+    motion queue that stops on a plan it can make safe does more harm than a
+    slower move.
+    """
+
+    segments: RingBuffer
     replans: List[int] = None
     seg_num: int = 0
     planner_position: List[int] = None
     step_position: List[int] = None
 
-    def __init__(self, joints: List[Joint]):
+    plan_budget: int = 15  # Max number of passes for one call to plan()
+    oscillation_limit: int = 3  # Give up when a planning state repeats this many times
+    strict: bool = False  # Raise ConvergenceError when planning gives up
+    budget_plan_iter: int = 3  # Max iterations of Segment.plan() in a time budgeted move
+    budget_margin: float = .1  # Fraction of a time budget kept for bookkeeping and timer jitter
+    warmup_moves: int = 1  # Moves kept out of move_latency, because they include compiling
+
+    def __init__(self, joints: List[Joint], plan_budget: int = None, strict: bool = None,
+                 oscillation_limit: int = None):
 
         self.joints = [Joint(j.v_max, j.a_max, i) for i, j in enumerate(joints)]
 
@@ -225,7 +293,7 @@ class SegmentList(object):
         for i, j in enumerate(self.joints):
             j.n = i
 
-        self.segments = deque()
+        self.segments = RingBuffer()
 
         self.planner_position = [0] * len(joints)
         self.distance = [0] * len(joints)
@@ -233,45 +301,99 @@ class SegmentList(object):
         self.seg_num = 0;
         self.replans = []
 
+        if plan_budget is not None:
+            self.plan_budget = plan_budget
+        if strict is not None:
+            self.strict = strict
+        if oscillation_limit is not None:
+            self.oscillation_limit = oscillation_limit
+
+        self.plan_passes = []  # Convergence trajectory of the last call to plan()
+        self.plan_exits = Counter()  # How each call to plan() finished
+        self.move_latency = deque(maxlen=1000)  # Seconds spent in recent calls to move()
+        self.warmup_latency = []  # Seconds spent in the first warmup_moves calls to move()
+        self.plan_times = deque(maxlen=100)  # Seconds for recent Segment.plan() calls in budgeted moves
+        self._plan_time = 0  # 95th percentile of plan_times, at the start of a budgeted move
+
         self.queue_length = 0
         self.queue_time = 0
 
+        self.table = BlockTable(len(self.joints))
+
+        # The planner and a consumer ( stepper or sender ) can run on different
+        # threads. The first `committed` segments have been handed to the consumer
+        # with take(), and are frozen.
+        self.lock = threading.RLock()
+        self.committed = 0
+
     def set_position(self, pos):
         assert len(pos) == len(self.joints)
 
         self.planner_position = pos
 
-    def move(self, x: List[int], v_max: List[int] = None):
+    def move(self, x: List[int], v_max: List[int] = None, time_budget: float = None):
         """Add a new segment, with joints expressing joint distance
+
+        If time_budget is given, planning stops refining when the next step might
+        not finish in that many seconds. The segments it changed go back to their
+        plans from before the move, which ended at rest, and the new segment is
+        planned to start and end at rest.
+
         :type x: object
         """
+        with self.lock:
+            start = perf_counter()
+            deadline = start + time_budget * (1 - self.budget_margin) if time_budget is not None else None
 
-        for i, x_ in enumerate(x):
-            self.planner_position[i] += x_
-            self.distance[i] += abs(x_)
+            if deadline is not None:
+                self._set_plan_time()
 
-        assert len(x) == len(self.joints)
+            for i, x_ in enumerate(x):
+                self.planner_position[i] += x_
+                self.distance[i] += abs(x_)
 
-        prior = self.segments[-1] if len(self.segments) > 0 else None
+            assert len(x) == len(self.joints)
 
-        s = Segment(self.seg_num, self.joints, x, prior)
-        self.seg_num += 1;
+            prior = self.segments[-1] if len(self.segments) > 0 else None
 
-        if v_max is not None:
-            for b, vm in zip(s.blocks, v_max):
-                b.v_c_max = vm
+            s = Segment(self.seg_num, self.joints, x, prior)
+            self.seg_num += 1;
 
-        self.segments.append(s)
+            if v_max is not None:
+                for b, vm in zip(s.blocks, v_max):
+                    b.v_c_max = vm
 
-        if prior is None:
-            s.plan(v_0=0, v_1=0)
-        else:
-            prior.plan(v_1='v_max', prior=prior.prior)
-            s.plan(v_0='prior', v_1=0, prior=prior)
-            self.plan(len(self.segments) - 1)
+            self.segments.append(s)
+            self.table.append(s)
+
+            if prior is None:
+                s.plan(v_0=0, v_1=0)
+            elif self._out_of_time(deadline, 3):
+                # No time to plan prior and s, and then fall back, so just add s
+                # from the end of prior, which is at rest
+                self._fallback({})
+                self.plan_exits['deadline'] += 1
+                warn(ConvergenceWarning(f"Planning did not converge (deadline) before segment {s.n}", []),
+                     stacklevel=2)
+            else:
+                saved = {} if deadline is not None else None
+                self._save(prior, saved)
 
-        self.queue_length +=1
-        self.queue_time = sum(s.t for s in self.segments) # Because times will change with replanning
+                self._plan_segment(prior, deadline, v_1='v_max', prior=prior.prior)  # Does nothing if prior is frozen
+                self._plan_segment(s, deadline, v_0='prior', v_1=0, prior=prior)
+
+                self.plan(len(self.segments) - 1, deadline=deadline, saved=saved)
+
+            self.queue_length +=1
+            # Times will change with replanning
+            self._replanned(s)
+            if prior is not None:
+                self._replanned(prior)
+
+            if len(self.warmup_latency) < self.warmup_moves:
+                self.warmup_latency.append(perf_counter() - start)
+            else:
+                self.move_latency.append(perf_counter() - start)
 
 
     def amove(self, x: List[int]):
@@ -281,72 +403,310 @@ class SegmentList(object):
 
         return self.move(rmove)
 
-    def vmove(self, t, v: List[int]):
+    def vmove(self, t, v: List[int], time_budget: float = None):
         """Move by running at a target velocity for a given time"""
 
-        v_max = max(v)
+        v_max = max(abs(v_) for v_ in v)
         x_max = v_max * t
 
-        move = [x_max * (v_ / v_max) for v_ in v]
+        move = [round(x_max * (v_ / v_max)) if v_max else 0 for v_ in v]
+
+        return self.move(move, v_max=[abs(v_) for v_ in v], time_budget=time_budget)
+
+    def jmove(self, t, v: List[int], time_budget: float = None, keep: int = 1):
+        """Like a vmove, but first drops the queued segments that haven't started,
+        so the new move replaces them. The first `keep` segments are retained,
+        because the consumer may already be running them.
+
+        For live jogging, pass a time_budget, in seconds, to bound the planning
+        time for the move. """
+
+        with self.lock:
+            start = perf_counter()
+
+            if time_budget is None:
+                self.drop_pending(keep)
+            else:
+                self._set_plan_time()
+                self._drop_pending(keep, start + time_budget * (1 - self.budget_margin))
+                time_budget -= perf_counter() - start
+
+            return self.vmove(t, v, time_budget=time_budget)
+
+    def drop_pending(self, keep: int = 1):
+        """Remove all but the first `keep` segments from the end of the queue, backing
+        out their moves from the planner position, and replan the new last segment
+        to end at rest. Constant time for each dropped segment. Returns the dropped
+        segments, oldest first. """
+
+        return self._drop_pending(keep)
+
+    def _drop_pending(self, keep: int = 1, deadline: float = None):
+
+        with self.lock:
+            # A frozen segment that doesn't end at rest needs the segment after it,
+            # which was planned to continue from its v_1, so that one has to stay too.
+            keep = max(keep, self.committed)
+            if 0 < self.committed < len(self.segments) and any(self.segments[self.committed - 1].v_1):
+                keep = max(keep, self.committed + 1)
+
+            dropped = []
+            while len(self.segments) > keep:
+                s = self.segments.pop()
+                self.table.pop()
 
-        return self.move(move, v_max=v)
+                for i, x_ in enumerate(s.move):
+                    self.planner_position[i] -= x_
+                    self.distance[i] -= abs(x_)
 
-    def jmove(self, t, v: List[int]):
-        """Like a vmove, but also removes all but the last two segments"""
+                self.queue_time -= s.queued_t
+                self.queue_length -= 1
+                s.prior = None  # The next move will link to the new end of the queue
 
-        self.segments = deque(list(self.segments)[:2])
-        self.queue_length = len(self.segments)
+                dropped.append(s)
 
-        return self.vmove(t, v)
+            # The new last segment was planned to run on into the dropped ones
+            if dropped and len(self.segments) and any(self.segments[-1].v_1):
+                tail = self.segments[-1]
+                self._plan_segment(tail, deadline, v_1=0, prior=tail.prior)  # Does nothing if tail is frozen
+                self._replanned(tail)
 
-    def plan(self, seg_idx: int = None):
+                # A short block may not be able to keep its v_0 and still stop
+                if tail.prior is not None and self.boundary_error(tail.prior, tail):
+                    self.plan_safe(len(self.segments) - 1)
+
+            return dropped[::-1]
+
+    def _replanned(self, s: Segment):
+        """Record that segment s has been (re)planned: update queue_time for
+        the change in its time, and mark its row in the block table"""
+        self.queue_time += s.t - s.queued_t
+        s.queued_t = s.t
+        self.table.touch(s)
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        """Percentiles of the planning time of recent moves, in seconds. The first
+        warmup_moves moves, which include compiling, are reported separately, as
+        'warmup'"""
+
+        d = {}
+
+        if len(self.move_latency):
+            lat = np.array(self.move_latency)
+            d = {f"p{p}": v for p, v in zip(percentiles, np.percentile(lat, percentiles))}
+            d['max'] = lat.max()
+
+        if self.warmup_latency:
+            d['warmup'] = max(self.warmup_latency)
+
+        return d
+
+    def _set_plan_time(self):
+        if self.plan_times:
+            self._plan_time = np.percentile(self.plan_times, 95)
+
+    def _out_of_time(self, deadline, n_plans):
+        """True if n_plans calls to Segment.plan() might not finish by the deadline"""
+        return deadline is not None and perf_counter() + n_plans * self._plan_time > deadline
+
+    def _plan_segment(self, s: Segment, deadline=None, **kwargs):
+        """Plan a segment. With a deadline, limit the iterations to budget_plan_iter,
+        and record how long it took in plan_times, after the warmup moves"""
+        if deadline is None:
+            s.plan(**kwargs)
+            return
+
+        t = perf_counter()
+        s.plan(iter=self.budget_plan_iter, **kwargs)
+        if len(self.warmup_latency) >= self.warmup_moves:
+            self.plan_times.append(perf_counter() - t)
+
+    def _save(self, s: Segment, saved: dict):
+        """Save the plan of segment s, the first time it changes during a move"""
+        if saved is not None and s is not None and not s.frozen and id(s) not in saved:
+            saved[id(s)] = (s, s.t, [tuple(getattr(b, f) for f in _plan_fields) for b in s.blocks])
+
+    def _fallback(self, saved: dict):
+        """Put the segments changed during a move back as they were, and plan the new
+        segment at the end of the queue to start and end at rest. The work is one
+        Segment.plan(), however many segments were changed"""
+
+        for s, t, blocks in saved.values():
+            for b, values in zip(s.blocks, blocks):
+                for f, v in zip(_plan_fields, values):
+                    setattr(b, f, v)
+            s.t = t
+            self._replanned(s)
+
+        tail = self.segments[-1]
+        tail.plan(v_0='prior', v_1=0, prior=tail.prior, iter=self.budget_plan_iter)
+        self._replanned(tail)
+
+        # Every move leaves the queue ending at rest, so the restored prior segment
+        # should too, but pin the boundary if it doesn't
+        if tail.prior is not None and self.boundary_error(tail.prior, tail):
+            self.plan_safe(len(self.segments) - 1)
+
+    def plan(self, seg_idx: int = None, deadline: float = None, saved: dict = None):
+        """Replan the boundaries from seg_idx to the end of the queue.
+
+        With a deadline, from perf_counter(), planning stops before any
+        Segment.plan() that might not finish in time, leaving time for one more
+        for the fallback, from the 95th percentile of the recent plan_times. If saved has
+        the plans of the segments from before the move, from _save(), they are
+        restored, and otherwise plan_safe() pins the boundaries that are left
+        inconsistent."""
 
         if seg_idx is None:
             seg_idx = len(self.segments) - 1
 
-        for p_idx in range(15):
+        if self.oscillation_limit < 1:
+            raise ValueError(f'oscillation_limit must be at least 1, not {self.oscillation_limit}')
+
+        self.plan_passes = passes = []
+        states = Counter()
+        exit_ = 'budget'
+
+        # Smooth out boundary bumps between segments.
+        def v_limit(p_idx, v_max):
+            if p_idx < 2:
+                return v_max
+            elif p_idx < 4:
+                return v_max / 2
+            else:
+                return 0;
+
+        def out_of_time(n_plans):
+            return self._out_of_time(deadline, n_plans + 1)  # + 1 for the fallback
+
+        first_idx = seg_idx
+        smoothed = None  # Segments whose boundary velocities were set after they were planned
+
+        for p_idx in range(self.plan_budget):
+
+            if out_of_time(2):
+                exit_ = 'deadline'
+                break
 
             current = self.segments[seg_idx]
             prior = self.segments[seg_idx - 1]
             pre_prior = self.segments[seg_idx - 2] if seg_idx >= 2 else None
 
-            assert prior == current.prior, (seg_idx, prior.n, current.prior.n)
+            if gsolver.CHECKS:
+                assert prior == current.prior, (seg_idx, prior.n, current.prior.n)
 
-            prior.plan(v_1='next', prior=pre_prior, next_=current)  # Plan a first
-            current.plan(v_0='prior', prior=prior)  # Plan b with maybe changed velocities from a
+            self._save(prior, saved)
+            self._save(current, saved)
 
-            # Smooth out boundary bumps between segments.
-            def v_limit(p_idx, v_max):
-                if p_idx < 2:
-                    return v_max
-                elif p_idx < 4:
-                    return v_max / 2
-                else:
-                    return 0;
+            self._plan_segment(prior, deadline, v_1='next', prior=pre_prior, next_=current)  # Plan a first, unless frozen
+
+            if out_of_time(1):
+                exit_ = 'deadline'
+                break
+
+            self._plan_segment(current, deadline, v_0='prior', prior=prior)  # Plan b with maybe changed velocities from a
 
             bends = 0
             for pb, cb in zip(prior.blocks, current.blocks):
-                if bent(pb, cb):
+                if bent(pb, cb) and not prior.frozen:
                     diff = abs(pb.v_1 - mean_bv(pb, cb))
                     if diff < v_limit(p_idx, pb.joint.v_max):
                         pb.v_1 = cb.v_0 = mean_bv(pb, cb)
                         bends += 1
 
-            if bends or (pre_prior is not None and self.boundary_error(pre_prior, prior)):
+            self._replanned(prior)
+            self._replanned(current)
+
+            smoothed = (pre_prior, prior, current) if bends else None
+
+            be = self.boundary_error(prior, current)
+            pbe = self.boundary_error(pre_prior, prior) if pre_prior is not None else 0
+
+            passes.append(PlanPass(seg_idx, be, max(prior.times_e_rms, current.times_e_rms), bends))
+
+            if (bends or pbe) and not prior.frozen:
                 seg_idx += -1  # Run it again one segment earlier
-            elif self.boundary_error(prior, current):
+            elif be and not prior.frozen:
                 # This means that the current could not handle the commanded v_0,
                 # so prior will have to yield.
                 seg_idx += 0  # Re-run planning on this boundary
             else:
                 seg_idx += 1  # Advance to the next segment
 
-            seg_idx = max(1, seg_idx)
+            seg_idx = max(1, self.committed, seg_idx)
 
             if seg_idx >= len(self.segments):
+                exit_ = 'converged'
+                break
+
+            # If we have been in this state before, with the same errors, we are
+            # either stalled on one boundary or bouncing between two of them,
+            # and more passes won't help.
+            # The v_limit regime is part of the state, because later passes
+            # can smooth bends that earlier ones couldn't.
+            state = (seg_idx, v_limit(p_idx, 1), bends, round(be), round(pbe))
+            states[state] += 1
+            if states[state] >= self.oscillation_limit:
+                if len(passes) < 2 or passes[-2].seg_idx == passes[-1].seg_idx:
+                    exit_ = 'stall'
+                else:
+                    exit_ = 'oscillation'
                 break
 
         self.replans.append(p_idx)
+        self.plan_exits[exit_] += 1
+
+        # Giving up can leave a boundary inconsistent, so make it continuous
+        if exit_ == 'deadline' and saved is not None:
+            self._fallback(saved)
+        elif exit_ != 'converged':
+            if smoothed is not None:
+                # The last pass smoothed a bend, which the next pass would have
+                # planned, so plan the blocks for their new boundary velocities
+                pre_prior, prior, current = smoothed
+                prior.plan(prior=pre_prior)
+                current.plan(prior=prior)
+                self._replanned(prior)
+                self._replanned(current)
+
+            self.plan_safe(min([p.seg_idx for p in passes], default=first_idx))
+
+        if exit_ != 'converged':
+            msg = f"Planning did not converge ({exit_}) after {len(passes)} passes at segment {seg_idx}"
+            if self.strict and exit_ != 'deadline':
+                raise ConvergenceError(msg, passes)
+            warn(ConvergenceWarning(msg, passes), stacklevel=2)
+
+    def plan_safe(self, seg_idx: int = 1):
+        """Conservative fallback for plan(). Pin every inconsistent boundary at
+        or after seg_idx to zero velocity. Any block can start and end at rest,
+        so the result is always continuous, if slower. """
+
+        def pin(i):
+            pre_prior = self.segments[i - 2] if i >= 2 else None
+            prior, current = self.segments[i - 1], self.segments[i]
+            prior.plan(v_1=0, prior=pre_prior)
+            current.plan(v_0=0, prior=prior)
+            self._replanned(prior)
+            self._replanned(current)
+
+        lo = max(seg_idx, self.committed, 1)
+        pinned = True
+
+        # Pinning only ever lowers boundary velocities, but replanning a segment
+        # can disturb its other boundary, so sweep until nothing changes.
+        while pinned:
+            pinned = False
+            for i in range(len(self.segments) - 1, lo - 1, -1):
+                if self.boundary_error(self.segments[i - 1], self.segments[i]) and not self.segments[i - 1].frozen:
+                    pin(i)
+                    pinned = True
+
+            # A short prior block can't keep its v_0 after being pinned, so
+            # extend the region downwards if that broke the boundary below.
+            while lo > max(self.committed, 1) and self.boundary_error(self.segments[lo - 2], self.segments[lo - 1]):
+                lo -= 1
+                pinned = True
 
     @property
     def edist(self):
@@ -359,13 +719,11 @@ class SegmentList(object):
     @property
     def pairs(self):
 
-        for c, n in zip(self.segments, list(self.segments)[1:]):
-            yield c, n
+        yield from self.segments.pairs()
 
     @property
     def triplets(self):
-        for p, c, n in zip(self.segments, list(self.segments)[1:], list(self.segments)[2:]):
-            yield p, c, n
+        yield from self.segments.triplets()
 
     @property
     def blocks(self):
@@ -382,10 +740,10 @@ class SegmentList(object):
     def discontinuities(self, index=0):
         """Yield segment pairs with velocity discontinuities"""
 
-        index = index_clip(index, list(self.segments))
+        index = index_clip(index, self.segments)
 
         o = []
-        for c, n in list(self.pairs)[index:]:
+        for c, n in self.segments.pairs(index):
             for cb, nb in zip(c.blocks, n.blocks):
                 if abs(cb.v_1 - nb.v_0) > 2:
                     o.append((cb, nb))
@@ -393,30 +751,78 @@ class SegmentList(object):
 
     @property
     def dataframe(self):
+        """Phase rows for all blocks. The frame is cached until a segment is
+        added, removed or replanned, so don't modify it."""
+        with self.lock:
+            return self._dataframe()
 
-        frames = []
-        for s_i, s in enumerate(self.segments):
-            for a_i, b in enumerate(s.blocks):
-                frames.append(b.dataframe.assign(axis=a_i, seg=s_i))
+    def _dataframe(self):
+        return self._synced_table().dataframe
 
-        df = pd.concat(frames)
+    def _synced_table(self):
+        t = self.table
 
-        df['t'] = df.groupby('axis').del_t.cumsum()
-        df['calc_x'] = (df.v_i + df.v_f) / 2 * df.del_t
-        df['err'] = df.x - df.calc_x
+        # Segments can be added to the queue directly, bypassing move()
+        if len(t) != len(self.segments) or (len(t) and t.segments[t.head] is not self.segments[0]):
+            t.clear()
+            for s in self.segments:
+                t.append(s)
 
-        return df
+        return t
+
+    @property
+    def block_params(self):
+        """Array of block parameters shaped (segment, axis, field), with the fields
+        in the order of table.block_fields"""
+        with self.lock:
+            return self._synced_table().blocks.copy()
 
     @property
     def front(self):
         """Reference to the front of the segments"""
         return self.segments[0]
 
+    def take(self, block: bool = True):
+        """Hand the next segment to a consumer. The segment is frozen, so the planner
+        won't change it again. Returns None if every queued segment has already
+        been taken, or if block is False and the planner is busy.
+
+        The consumer should pop() each taken segment when it is done with it. """
+
+        if not self.lock.acquire(blocking=block):
+            return None
+
+        try:
+            if self.committed >= len(self.segments):
+                return None
+
+            s = self.segments[self.committed]
+            s.frozen = True
+            self.committed += 1
+
+            return s
+        finally:
+            self.lock.release()
+
     def pop(self):
         """Remove the front of the segments"""
-        s = self.segments.popleft()
-        self.queue_time -= s.t
-        self.queue_length -= 1
+        with self.lock:
+            s = self.segments.popleft()
+            self.table.popleft()
+            self.queue_length -= 1
+
+            if self.committed:
+                self.committed -= 1
+
+            if len(self.segments) == 0:
+                self.queue_time = 0  # Don't let rounding errors accumulate
+            else:
+                self.queue_time -= s.queued_t
+                # The new front keeps the v_0 it was planned with, but there is
+                # no longer a prior to replan against.
+                self.segments[0].prior = None
+
+            return s
 
     def __getitem__(self, item):
         """Return a joint segment by the id"""
@@ -1,6 +1,7 @@
 """Routines for plotting segments"""
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from warnings import warn
 
@@ -18,47 +19,82 @@ def sel_axis(df, axis):
     return t
 
 
-def plot_axis(df, axis, ax=None):
-    df_ = df[df.axis == axis].copy()
+def _decimate(t, v, n):
+    """Reduce a polyline to at most n points, keeping the first and last points and
+    the min and max of each bucket of points so peaks are still visible"""
 
-    discontinuities = [0]
-    def _f():
-        t = 0
+    if n is None or len(t) <= n:
+        return t, v
 
-        for i, (idx, r) in enumerate(df_.iterrows()):
-            if i == 0:
-                yield {'t': t, 'v': r.v_i}
-            elif abs(last_row.v_f-r.v_i)>1: # Discontinuity limit
-                # If there is no discontinuity, we don't need to yield this part,
-                # because both v_0 and v_1 go through the same point, so the line
-                # segment would be zero length
-                a = f"{last_row.seg}/{last_row.axis}"
-                b = f"{r.seg}/{r.axis}"
-                # warn(f"Discontinuty {a}@{last_row.v_f} -> {b}@{r.v_i}")
-                discontinuities[0] =discontinuities[0] +1
+    n_b = max((n - 2) // 2, 1)  # Buckets, leaving room for the end points
+    k = int(np.ceil(len(t) / n_b))  # Points per bucket
+    n_b = int(np.ceil(len(t) / k))
 
-                yield {'t': t, 'v': r.v_i}
+    # Pad the last bucket, so every bucket has k points
+    vb = np.full(n_b * k, np.nan)
+    vb[:len(v)] = v
+    vb = vb.reshape(n_b, k)
 
-            t = t + r.del_t
-            yield {'t': t, 'v': r.v_f}
-            last_row = r
+    base = np.arange(n_b) * k
+    idx = np.unique(np.concatenate([[0, len(t) - 1], base + np.nanargmin(vb, axis=1),
+                                    base + np.nanargmax(vb, axis=1)]))
 
-    t = pd.DataFrame(list(_f())).set_index('t')
+    return t[idx], v[idx]
 
-    ax = t[['v']].plot(ax=ax)
 
+def _thin(ts, n):
+    """Keep at most one of the times ts in each of n equal bins"""
+    if n is None or len(ts) <= n:
+        return ts
 
-    # Draw dotted lines for phase boundaries
-    for t, row in t.iterrows():
-        # rectangle = plt.Rectangle((idx,0), row.del_t, row.v_f, fc=cm[row.ss], alpha=0.05)
-        # plt.gca().add_patch(rectangle)
-        ax.axvline(x=t, color='k', alpha=.5, lw=.5, linestyle='dotted')
+    span = (ts.max() - ts.min()) or 1
+    _, idx = np.unique(np.floor((ts - ts.min()) / span * n), return_index=True)
+    return ts[idx]
 
-    for idx, t in df.groupby('seg').t.min().iteritems():
-        ax.axvline(x=t, color='r', lw=1, linestyle='dashed')
 
-    if discontinuities[0]:
-        warn(f"Found {discontinuities[0]} discontinuities in axis {axis}")
+def plot_axis(df, axis, ax=None, max_points=None):
+    """Plot the velocity profile of one axis. Very long trajectories are decimated
+    to max_points points, which defaults to twice the width of the axes in pixels"""
+
+    df_ = df[df.axis == axis]
+
+    if ax is None:
+        fig, ax = plt.subplots(1, 1, figsize=(18, 3))
+
+    if max_points is None:
+        max_points = int(ax.bbox.width * 2)
+
+    del_t = df_.del_t.to_numpy(dtype=float)
+    v_i = df_.v_i.to_numpy(dtype=float)
+    v_f = df_.v_f.to_numpy(dtype=float)
+
+    t_f = np.cumsum(del_t)
+    t_i = t_f - del_t
+
+    # Every phase contributes its end point. The start point is only needed for the
+    # first phase, or when there is a discontinuity, because otherwise it is the
+    # same as the end point of the previous phase.
+    disc = np.abs(v_f[:-1] - v_i[1:]) > 1  # Discontinuity limit
+    has_start = np.concatenate([[True], disc]) if len(del_t) else np.array([], dtype=bool)
+
+    mask = np.column_stack([has_start, np.ones_like(has_start)]).ravel()
+    t = np.column_stack([t_i, t_f]).ravel()[mask]
+    v = np.column_stack([v_i, v_f]).ravel()[mask]
+
+    ax.plot(*_decimate(t, v, max_points), label='v')
+    ax.set_xlabel('t')
+
+    # Dotted lines for phase boundaries, and dashed for segment boundaries, each
+    # as a single collection
+    trans = ax.get_xaxis_transform()
+    ax.vlines(_thin(t, max_points), 0, 1, transform=trans, color='k', alpha=.5, lw=.5, linestyle='dotted')
+
+    seg_t = (df.t - df.del_t).groupby(df.seg).min().to_numpy(dtype=float)
+    ax.vlines(_thin(seg_t, max_points), 0, 1, transform=trans, color='r', lw=1, linestyle='dashed')
+
+    n_disc = int(disc.sum())
+    if n_disc:
+        warn(f"Found {n_disc} discontinuities in axis {axis}")
 
     return ax
 
@@ -127,10 +163,16 @@ def plot_params(*args, ax=None):
 
     return ax
 
-def seg_step(sl, details=None):
-    """Produce a dataset by stepping through a segment list"""
+def seg_step(sl, details=None, trace=None, mode='dense'):
+    """Produce a dataset by stepping through a segment list. If trace is a path,
+    stream the steps into a trace file there, and return a trace.TraceReader
+    instead of a DataFrame"""
     from trajectory.stepper import DEFAULT_PERIOD, TIMEBASE
 
+    if trace is not None:
+        from trajectory.trace import record
+        return record(sl, trace, mode=mode)
+
     if details:
         return pd.DataFrame(list(sl.step(details=details))).set_index('t')
     else:
@@ -3,6 +3,7 @@ import selectors
 import time
 from time import time
 from collections import deque
+import numpy as np
 import serial
 from typing import Union, Tuple, List, Any, Dict
 
@@ -58,6 +59,103 @@ class AxisState():
         return f"<AS {d} {self.spos}/{self.epos} hl{self.hl_limit} lh{self.lh_limit}"
 
 
+class QueueModel(object):
+    """Host side prediction of the device's segment queue.
+
+    Each sent move adds an entry with its expected time. While the device is
+    running, entries drain from the front at wall clock rate, and a DONE for a
+    sequence number completes every entry up to it. Each CurrentState from the
+    device corrects the prediction to the reported queue, and the difference
+    between the two is recorded as drift.
+    """
+
+    def __init__(self, clock=time, window: int = 1000):
+        self.clock = clock
+        self.entries = deque()  # [seq, remaining time in seconds]
+        self.running = False
+        self.last_advance = clock()
+
+        self.drift = deque(maxlen=window)  # predicted - reported queue time, seconds
+        self.corrections = 0
+
+    def advance(self, now=None):
+        now = self.clock() if now is None else now
+        dt, self.last_advance = now - self.last_advance, now
+
+        if self.running:
+            self._drain(dt)
+
+    def _drain(self, dt):
+        """Remove dt seconds from the front of the queue"""
+        while dt > 0 and self.entries:
+            e = self.entries[0]
+            d = min(dt, e[1])
+            e[1] -= d
+            dt -= d
+            if e[1] <= 0:
+                self.entries.popleft()
+
+    def set_running(self, running: bool):
+        self.advance()
+        self.running = running
+
+    def on_send(self, seq: int, t: float):
+        self.advance()
+        self.entries.append([seq, t])
+
+    def on_done(self, seq: int):
+        self.advance()
+        while self.entries and self.entries[0][0] is not None and self.entries[0][0] <= seq:
+            self.entries.popleft()
+
+    def on_state(self, queue_length: int, queue_time: float):
+        """Correct the model with the device's report; queue_time is in seconds"""
+        self.advance()
+
+        self.drift.append(self.queue_time - queue_time)
+        self.corrections += 1
+
+        while len(self.entries) > max(queue_length, 0):
+            self.entries.popleft()
+
+        # The front entry is the one that is running, so it takes the error
+        err = queue_time - self.queue_time
+        if err < 0:
+            self._drain(-err)
+        elif self.entries:
+            self.entries[0][1] += err
+        elif queue_time > 0:
+            self.entries.append([None, queue_time])
+
+    def clear(self):
+        self.advance()
+        self.entries.clear()
+
+    @property
+    def queue_time(self):
+        """Predicted seconds of motion left in the device queue"""
+        return sum(e[1] for e in self.entries)
+
+    @property
+    def queue_length(self):
+        return len(self.entries)
+
+    def estimate(self):
+        """Bring the model up to now and return the predicted queue time"""
+        self.advance()
+        return self.queue_time
+
+    @property
+    def stats(self):
+        d = np.array(self.drift) if self.drift else np.zeros(1)
+        return {
+            'corrections': self.corrections,
+            'drift_mean': float(d.mean()),
+            'drift_rms': float(np.sqrt(np.mean(d ** 2))),
+            'drift_max': float(np.abs(d).max()),
+        }
+
+
 class SyncProto(object):
 
     def __init__(self,
@@ -97,6 +195,8 @@ class SyncProto(object):
 
         self.queue = deque(maxlen=100)
 
+        self.queue_model = QueueModel()
+
     def _reset_states(self):
 
         self.axis_state = [AxisState() for _ in range(N_AXES)]
@@ -111,14 +211,6 @@ class SyncProto(object):
         if self.enc_ser:
             self.enc_ser.close()
 
-    @property
-    def queue_length(self):
-        return float(self.current_state.queue_length)
-
-    @property
-    def queue_time(self):
-        return float(self.current_state.queue_time) / 1e6
-
     def read_stepper_message(self, ser):
         data = ser.read_until(TERMINATOR)
 
@@ -158,8 +250,12 @@ class SyncProto(object):
 
             if m.code == CommandCode.EMPTY:
                 self.empty = True;
+                self.queue_model.clear()
             elif m.code == CommandCode.DONE:
                 self.last_done = m.seq
+                self.queue_model.on_done(m.seq)
+
+            self.queue_model.on_state(self.current_state.queue_length, self.current_state.queue_time / 1e6)
 
     def read_encoder_message(self, ser):
         data = ser.read_until(TERMINATOR)
@@ -250,7 +346,8 @@ class SyncProto(object):
         if not self.running:
             self.run()
 
-        while self.queue_length> l:
+        while self.queue_length > l:
+            self.update(timeout)
             for m in self:
                 if cb:
                     cb(self, m)
@@ -263,6 +360,16 @@ class SyncProto(object):
     def queue_time(self):
         return self.current_state.queue_time
 
+    @property
+    def est_queue_time(self):
+        """Predicted seconds left in the device queue, from the queue model"""
+        return self.queue_model.estimate()
+
+    @property
+    def est_queue_length(self):
+        self.queue_model.advance()
+        return self.queue_model.queue_length
+
     # Sending messages to the stepper controller
     #
 
@@ -276,6 +383,9 @@ class SyncProto(object):
 
         self.step_ser.write(b)
 
+        if isinstance(m, MoveCommand):
+            self.queue_model.on_send(m.seq, m.t / TIMEBASE or getattr(m, 'expected_time', None) or 0)
+
         # Read until we get the ack
         while True:
             self.update();
@@ -302,7 +412,7 @@ class SyncProto(object):
         for ac in axes:
             self.send(ac)
 
-    def _move(self, code: int, x: Union[List[Any], Tuple[Any], Dict], t=0):
+    def _move(self, code: int, x: Union[List[Any], Tuple[Any], Dict], t=0, expected_time: float = None):
 
         # Convert a dict-based move into an array move.
         if isinstance(x, dict):
@@ -315,19 +425,18 @@ class SyncProto(object):
         m = MoveCommand(code, x, t=t)
 
         m.done = False
-
-        self.current_state.queue_length += 3;
+        m.expected_time = expected_time  # Segment time the host planned, for the queue model
 
         self.send(m)
         self.empty = False;
 
-    def amove(self, x: Union[List[Any], Tuple[Any], Dict]):
+    def amove(self, x: Union[List[Any], Tuple[Any], Dict], expected_time: float = None):
         """Absolute position move"""
-        self._move(CommandCode.AMOVE, x, t=0)
+        self._move(CommandCode.AMOVE, x, t=0, expected_time=expected_time)
 
-    def rmove(self, x: Union[List[Any], Tuple[Any], Dict]):
+    def rmove(self, x: Union[List[Any], Tuple[Any], Dict], expected_time: float = None):
         "Relative position move"
-        self._move(CommandCode.RMOVE, x, t=0)
+        self._move(CommandCode.RMOVE, x, t=0, expected_time=expected_time)
 
     def hmove(self, x: Union[List[Any], Tuple[Any], Dict]):
         "A homing move, which will stop when it gets to a limit. "
@@ -340,10 +449,12 @@ class SyncProto(object):
 
     def run(self):
         self.running = True
+        self.queue_model.set_running(True)
         self.send_command(CommandCode.RUN)
 
     def stop(self):
         self.running = False
+        self.queue_model.set_running(False)
         self.send_command(CommandCode.STOP)
 
     def info(self):
@@ -0,0 +1,94 @@
+"""Ring buffer for the segment queue"""
+
+
+class RingBuffer(object):
+    """A growable circular buffer with constant time indexed access anywhere,
+    and constant time append, pop and popleft. It has the parts of the deque
+    interface that the planner uses. """
+
+    def __init__(self, items=None, capacity: int = 64):
+        self._items = [None] * capacity
+        self._head = 0
+        self._size = 0
+
+        for e in items or []:
+            self.append(e)
+
+    def __len__(self):
+        return self._size
+
+    def _index(self, i):
+        """Position in _items of logical index i, which may be negative"""
+        if i < 0:
+            i += self._size
+
+        if not 0 <= i < self._size:
+            raise IndexError('RingBuffer index out of range')
+
+        return (self._head + i) % len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._size))]
+
+        return self._items[self._index(i)]
+
+    def __setitem__(self, i, v):
+        self._items[self._index(i)] = v
+
+    def __iter__(self):
+        items, cap, head = self._items, len(self._items), self._head
+        for i in range(self._size):
+            yield items[(head + i) % cap]
+
+    def __reversed__(self):
+        for i in range(self._size - 1, -1, -1):
+            yield self[i]
+
+    def _grow(self):
+        self._items = list(self) + [None] * len(self._items)
+        self._head = 0
+
+    def append(self, v):
+        if self._size == len(self._items):
+            self._grow()
+
+        self._items[(self._head + self._size) % len(self._items)] = v
+        self._size += 1
+
+    def pop(self):
+        """Remove and return the last item"""
+        if self._size == 0:
+            raise IndexError('pop from an empty RingBuffer')
+
+        i = self._index(-1)
+        v, self._items[i] = self._items[i], None
+        self._size -= 1
+        return v
+
+    def popleft(self):
+        """Remove and return the first item"""
+        if self._size == 0:
+            raise IndexError('pop from an empty RingBuffer')
+
+        v, self._items[self._head] = self._items[self._head], None
+        self._head = (self._head + 1) % len(self._items)
+        self._size -= 1
+        return v
+
+    def clear(self):
+        self._items = [None] * len(self._items)
+        self._head = self._size = 0
+
+    def pairs(self, start: int = 0):
+        """Adjacent pairs of items, from index start, without copying"""
+        for i in range(max(start, 0), self._size - 1):
+            yield self[i], self[i + 1]
+
+    def triplets(self, start: int = 0):
+        """Adjacent triplets of items, from index start, without copying"""
+        for i in range(max(start, 0), self._size - 2):
+            yield self[i], self[i + 1], self[i + 2]
+
+    def __repr__(self):
+        return f"RingBuffer({list(self)!r})"
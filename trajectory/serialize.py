@@ -0,0 +1,235 @@
+"""Flat serialization of planned trajectories.
+
+Block.asdict() recurses into the block's joint and segment, and from the
+segment into every other block, so it is slow and the output is enormous.
+The functions here store each block as one flat record of the fields in
+table.block_fields, plus its segment number, axis and cruise velocity limit,
+and store the joints and queue state once.
+
+There are three forms:
+
+* records: a NumPy structured array, one record per block, in segment then axis order
+* JSON: the same layout as the C++ Planner::dump(), with '_type' keys, plus a 'state' object
+* binary: a small header followed by the raw records, for save() and load()
+
+Each form loads back into a SegmentList with its segment numbers, planner
+position and queue time restored.
+"""
+
+import json
+import struct
+from pathlib import Path
+from time import perf_counter
+from typing import List
+
+import numpy as np
+
+from .gsolver import Block, Joint
+from .planner import Segment, SegmentList
+from .table import block_fields
+
+record_fields = tuple(block_fields) + ('v_c_max',)
+
+block_dtype = np.dtype([('seg', np.int64), ('axis', np.int32)] + [(f, np.float64) for f in record_fields])
+
+MAGIC = b'TRJP'
+VERSION = 2
+
+
+def joint_records(joints: List[Joint]):
+    return [{'_type': 'Joint', 'n': i, 'v_max': j.v_max, 'a_max': j.a_max} for i, j in enumerate(joints)]
+
+
+def state(sl: SegmentList):
+    """Queue state that isn't in the blocks"""
+    return {
+        'seg_num': sl.seg_num,
+        'planner_position': [int(e) for e in sl.planner_position],
+        'distance': [int(e) for e in sl.distance],
+        'queue_time': sl.queue_time,
+    }
+
+
+def to_records(sl: SegmentList):
+    """Structured array with one record per block"""
+    with sl.lock:
+        b = sl.block_params
+        seg_n = [s.n for s in sl.segments]
+        v_c_max = [[bl.v_c_max for bl in s.blocks] for s in sl.segments]
+
+    return blocks_to_records(b, seg_n, v_c_max)
+
+
+def blocks_to_records(b, seg_n, v_c_max=None):
+    """Records from an array of block parameters shaped (segment, axis, field),
+    and the blocks' v_c_max, shaped (segment, axis). Without v_c_max, the
+    blocks are limited only by their joints' v_max, which is recorded as NaN"""
+    n_seg, n_axes = b.shape[:2]
+
+    r = np.zeros(n_seg * n_axes, dtype=block_dtype)
+    r['seg'] = np.repeat(np.asarray(seg_n, dtype=np.int64), n_axes)
+    r['axis'] = np.tile(np.arange(n_axes, dtype=np.int32), n_seg)
+
+    flat = b.reshape(-1, len(block_fields))
+    for i, f in enumerate(block_fields):
+        r[f] = flat[:, i]
+
+    r['v_c_max'] = np.nan if v_c_max is None else np.asarray(v_c_max, dtype=np.float64).reshape(-1)
+
+    return r
+
+
+def records_to_blocks(r, n_axes):
+    """Array of block parameters shaped (segment, axis, field) from records"""
+    return np.stack([r[f] for f in block_fields], axis=-1).reshape(-1, n_axes, len(block_fields))
+
+
+def from_records(r, joints: List[Joint], st: dict = None):
+    """Build a SegmentList from block records, joints and queue state"""
+
+    sl = SegmentList(joints)
+    joints = sl.joints
+    n_axes = len(joints)
+
+    params = records_to_blocks(r, n_axes)
+    seg_n = r['seg'][::n_axes]
+    v_c_max = r['v_c_max'].reshape(-1, n_axes)
+
+    prior = None
+    for i, (n, p) in enumerate(zip(seg_n.tolist(), params)):
+        blocks = [Block(**dict(zip(block_fields, bp)), joint=j) for j, bp in zip(joints, p.tolist())]
+        for b, vm in zip(blocks, v_c_max[i].tolist()):
+            if not np.isnan(vm):
+                b.v_c_max = vm
+        s = Segment(n, joints, blocks)
+        s.move = [int(round(b.d * b.x)) for b in blocks]
+        s.prior = prior
+        s.t = s.time
+        s.queued_t = s.t
+
+        for b in blocks:
+            b.segment = s
+
+        sl.segments.append(s)
+        sl.table.append(s)
+        sl.queue_length += 1
+        sl.queue_time += s.t
+        prior = s
+
+    if len(seg_n):
+        sl.seg_num = int(seg_n[-1]) + 1
+
+    pos = np.round(params[:, :, block_fields.index('x')] * params[:, :, block_fields.index('d')]).sum(axis=0)
+    sl.planner_position = [int(e) for e in pos]
+    sl.distance = [int(e) for e in np.abs(params[:, :, block_fields.index('x')]).sum(axis=0)]
+
+    if st:
+        for k in ('seg_num', 'planner_position', 'distance', 'queue_time'):
+            if k in st:
+                setattr(sl, k, st[k])
+
+    return sl
+
+
+def to_json(sl: SegmentList):
+    """Dict in the layout of the C++ Planner::dump(), plus the queue state"""
+    r = to_records(sl)
+    n_axes = len(sl.joints)
+    params = records_to_blocks(r, n_axes).tolist()
+    v_c_max = r['v_c_max'].reshape(-1, n_axes).tolist()
+
+    return {
+        '_type': 'Planner',
+        'joints': joint_records(sl.joints),
+        'segments': [{'_type': 'Segment', 'n': int(n), 'move': s_move,
+                      'blocks': [dict(zip(block_fields, bp), v_c_max=vm, _type='Block') for bp, vm in zip(p, vms)]}
+                     for n, p, vms, s_move in zip(r['seg'][::n_axes], params, v_c_max, (s.move for s in sl.segments))],
+        'state': state(sl),
+    }
+
+
+def json_blocks(d):
+    """Array of block parameters shaped (segment, axis, field) from a JSON dump,
+    either ours or the C++ planner's"""
+    return np.array([[[bd[f] for f in block_fields] for bd in sd['blocks']] for sd in d['segments']],
+                    dtype=float).reshape(len(d['segments']), len(d['joints']), len(block_fields))
+
+
+def json_records(d):
+    """Block records from a JSON dump. The C++ planner's dump has no v_c_max"""
+    v_c_max = [[bd.get('v_c_max', np.nan) for bd in sd['blocks']] for sd in d['segments']]
+    return blocks_to_records(json_blocks(d), [sd.get('n', i) for i, sd in enumerate(d['segments'])],
+                             np.array(v_c_max, dtype=float))
+
+
+def from_json(d, joints: List[Joint] = None):
+    """Build a SegmentList from a JSON dump. joints defaults to the joints in the dump"""
+    if joints is None:
+        joints = [Joint(j['v_max'], j['a_max'], i) for i, j in enumerate(d['joints'])]
+
+    return from_records(json_records(d), joints, d.get('state'))
+
+
+def dumps(sl: SegmentList) -> bytes:
+    """Binary form: magic, version, header length, JSON header, then the records"""
+    r = to_records(sl)
+
+    header = json.dumps({
+        'joints': joint_records(sl.joints),
+        'state': state(sl),
+        'n_records': len(r),
+        'dtype': block_dtype.descr,
+    }).encode('utf8')
+
+    return MAGIC + struct.pack('<HI', VERSION, len(header)) + header + r.tobytes()
+
+
+def loads(data: bytes, joints: List[Joint] = None) -> SegmentList:
+    if data[:4] != MAGIC:
+        raise ValueError('Not a serialized SegmentList')
+
+    version, hlen = struct.unpack_from('<HI', data, 4)
+    if version != VERSION:
+        raise ValueError(f'Unsupported serialization version {version}')
+
+    start = 4 + struct.calcsize('<HI')
+    header = json.loads(data[start:start + hlen])
+
+    r = np.frombuffer(data, dtype=block_dtype, count=header['n_records'], offset=start + hlen)
+
+    if joints is None:
+        joints = [Joint(j['v_max'], j['a_max'], i) for i, j in enumerate(header['joints'])]
+
+    return from_records(r, joints, header['state'])
+
+
+def save(sl: SegmentList, path):
+    Path(path).write_bytes(dumps(sl))
+
+
+def load(path, joints: List[Joint] = None) -> SegmentList:
+    return loads(Path(path).read_bytes(), joints)
+
+
+def benchmark(sl: SegmentList, n: int = 10):
+    """Blocks per second for each form, saving and loading"""
+
+    n_blocks = len(sl.segments) * len(sl.joints)
+
+    def rate(f):
+        t = perf_counter()
+        for _ in range(n):
+            o = f()
+        return n * n_blocks / (perf_counter() - t), o
+
+    o = {}
+    o['records'], r = rate(lambda: to_records(sl))
+    o['from_records'], _ = rate(lambda: from_records(r, sl.joints))
+    o['json'], d = rate(lambda: json.dumps(to_json(sl)))
+    o['from_json'], _ = rate(lambda: from_json(json.loads(d)))
+    o['binary'], b = rate(lambda: dumps(sl))
+    o['from_binary'], _ = rate(lambda: loads(b))
+    o['asdict'], _ = rate(lambda: [b.asdict() for s in sl.segments[:5] for b in s.blocks])
+    o['asdict'] *= len(sl.segments[:5]) / max(len(sl.segments), 1)  # Only ran the first 5 segments
+
+    return o
@@ -0,0 +1,92 @@
+"""Joint setpoints at a fixed sample rate.
+
+Servo drives and visualizations want a position for each axis every
+millisecond, not step pulses. resample() evaluates a planned SegmentList at
+a fixed rate with a TrajectoryIndex, for all of the samples of a chunk and
+all of the axes at once, so a job never has to be stepped at the timer rate
+and down-sampled.
+
+With timing='stepper', the default, segments last as long as they do in
+SegmentList.step(), which times each segment by the Stepper for axis 0, and
+the other axes follow their stepper_blocks() phases, carrying unfinished
+blocks into the next segment as the Steppers do. The last segment lasts
+until every axis has finished, so the last setpoint is the end of the job,
+where SegmentList.step() drops the steps that are left. The positions are
+those the Steppers aim for; the Steppers themselves are late or early by their timing
+error, and drop a step now and then when a phase runs out of periods. With
+timing='plan', segments take their planned times and no stepping is done.
+
+    for sp in resample(sl, 1000):
+        send(sp.t, sp.position)
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .accel import stepper_steps
+from .emulator import stepper_phases
+from .planner import SegmentList
+from .stepper import DEFAULT_PERIOD, TIMEBASE
+from .timeindex import TrajectoryIndex
+
+Setpoints = namedtuple('Setpoints', 'first t position velocity')
+
+
+def segment_times(sl: SegmentList, period: int = DEFAULT_PERIOD):
+    """Time of each segment in SegmentList.step(): the ticks the Stepper for
+    axis 0 takes for its block, and the tick that finds it done"""
+
+    ph = stepper_phases(sl).astype(np.float64)
+    if not len(ph):
+        return np.zeros(0)
+
+    block_ticks = stepper_steps(np.ascontiguousarray(ph[:, 0].reshape(-1, 3)), period, True, 0.0)[4]
+
+    return (block_ticks + 1) * (period / TIMEBASE)
+
+
+def trajectory_index(sl: SegmentList, timing: str = 'stepper', period: int = DEFAULT_PERIOD):
+    """TrajectoryIndex for the timing of resample()"""
+
+    if timing == 'stepper':
+        return TrajectoryIndex.from_stepper_blocks(sl, segment_times(sl, period))
+    elif timing == 'plan':
+        return TrajectoryIndex.from_segment_list(sl)
+    else:
+        raise ValueError(f"Unknown timing '{timing}'")
+
+
+def resample(sl: SegmentList, rate: float = 1000, chunk: int = 1 << 16, timing: str = 'stepper',
+             period: int = DEFAULT_PERIOD, steps: bool = False):
+    """Yield Setpoints of up to chunk samples, at rate samples per second, from
+    time 0 to the first sample at or after the end of the job. position and
+    velocity are shaped (sample, axis). With steps, positions are rounded to
+    whole steps."""
+
+    ti = trajectory_index(sl, timing, period)
+
+    n = int(np.ceil(ti.duration * rate - 1e-9)) + 1
+
+    for first in range(0, n, chunk):
+        t = np.arange(first, min(first + chunk, n)) / rate
+
+        p = ti.position(t)
+        if steps:
+            p = np.rint(p)
+
+        yield Setpoints(first, t, p, ti.velocity(t))
+
+
+def setpoints(sl: SegmentList, rate: float = 1000, **kwargs) -> pd.DataFrame:
+    """All of the positions of resample(), as a DataFrame indexed by time, with
+    a column per axis"""
+
+    chunks = [sp.position for sp in resample(sl, rate, **kwargs)]
+    p = np.concatenate(chunks) if chunks else np.zeros((0, len(sl.joints)))
+
+    df = pd.DataFrame(p, columns=list('xyzabc')[:p.shape[1]])
+    df.insert(0, 't', np.arange(len(df)) / rate)
+
+    return df.set_index('t')
@@ -71,7 +71,6 @@ class SimSegment(object):
             self.tn = t0  # Total transit time for step n
             self.vn = abs(v0) * self.dir  # running velocity
             self.xn = 0  # running position. Done when xn = x
-            self.a = (v0 - v1) / self.t
 
         self.timebase = timebase if timebase is not None else TIMEBASE
 
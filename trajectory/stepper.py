@@ -155,6 +155,7 @@ class Stepper(object):
 class SegmentStepper:
 
     def __init__(self, sl: "SegmentList", step_if: list[object] = None, details: bool = False):
+        import numpy as np
         from .stepper import DEFAULT_PERIOD, TIMEBASE, Stepper
 
         self.sl = sl
@@ -164,27 +165,35 @@ class SegmentStepper:
 
         self.steppers = [Stepper(details=self.details) for _ in self.sl.joints]
 
-        self.step_position = [0] * len(self.sl.joints)
+        self.step_position = np.array([0] * len(self.sl.joints))
 
         period = DEFAULT_PERIOD
         self.dt = period / TIMEBASE
 
         self.seg = None
+        self.next_seg = None
 
     def step(self):
         import numpy as np
 
-        if len(self.sl.segments) == 0:
-            return None
-
-        # Load the next segment
+        # Load the next segment. Segments are taken from the SegmentList, which
+        # freezes them, so the planner can't change them while they are stepped.
         if self.seg is None:
 
-            self.seg = self.sl.front
+            self.seg = self.next_seg or self.sl.take()
+            self.next_seg = None
+
+            if self.seg is None:
+                return None
 
             for b, stp in zip(self.seg.blocks, self.steppers):
                 stp.load_phases(b.stepper_blocks())
 
+        elif self.next_seg is None and self.steppers[0].phase == 3:
+            # In the last phase, claim the next segment, but don't wait if the
+            # planner is busy; we'll try again on the next step.
+            self.next_seg = self.sl.take(block=False)
+
         # Get the next set of steps
         if self.details:
             r = self.steppers[0].next_details()
@@ -203,7 +212,7 @@ class SegmentStepper:
             done = self.steppers[0].done and all([stp.done for stp in self.steppers])
 
 
-        # When done, invalidate the segment and remove it.
+        # When done, remove the segment.
         if done:
             self.sl.pop()
             self.seg = None
@@ -0,0 +1,162 @@
+"""Columnar storage of planned blocks.
+
+A BlockTable holds the parameters of every block of the segments in a
+SegmentList, one row per segment and one column per axis, in preallocated
+NumPy arrays. The SegmentList appends and removes rows as segments are queued
+and consumed, and marks rows dirty when it replans a segment, so building the
+phase DataFrame only has to copy the rows that actually changed.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Block attributes stored in the table, in the order of the last array dimension
+block_fields = ('x', 'd', 't', 't_a', 't_c', 't_d', 'x_a', 'x_c', 'x_d', 'v_0', 'v_c', 'v_1')
+
+_fi = {f: i for i, f in enumerate(block_fields)}
+
+
+class BlockTable(object):
+    """Rows of block parameters for a queue of segments"""
+
+    def __init__(self, n_axes: int, capacity: int = 256):
+        self.n_axes = n_axes
+        self.data = np.zeros((capacity, n_axes, len(block_fields)))
+        self.segments = [None] * capacity  # Segment that owns each row
+
+        self.head = 0  # First live row
+        self.tail = 0  # One past the last live row
+
+        self.dirty = set()  # Rows that need to be copied from their segment
+        self.version = 0  # Changes every time the table changes
+
+        self._frame = None
+        self._frame_version = None
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def append(self, s: "Segment"):
+        if self.tail == len(self.segments):
+            self._make_room()
+
+        self.segments[self.tail] = s
+        self.dirty.add(self.tail)
+        self.tail += 1
+        self.version += 1
+
+    def popleft(self):
+        self.segments[self.head] = None
+        self.dirty.discard(self.head)
+        self.head += 1
+        self.version += 1
+
+    def pop(self):
+        self.tail -= 1
+        self.segments[self.tail] = None
+        self.dirty.discard(self.tail)
+        self.version += 1
+
+    def touch(self, s: "Segment"):
+        """Mark the row for segment s as needing an update. Segments are
+        usually replanned near the end of the queue, so search from there. """
+        for i in range(self.tail - 1, self.head - 1, -1):
+            if self.segments[i] is s:
+                self.dirty.add(i)
+                self.version += 1
+                return
+
+    def clear(self):
+        self.segments = [None] * len(self.segments)
+        self.head = self.tail = 0
+        self.dirty = set()
+        self.version += 1
+
+    def _make_room(self):
+        """Move the live rows to the start of the arrays, growing them if
+        they are more than half full"""
+        n = len(self)
+        capacity = len(self.segments)
+
+        if n > capacity // 2:
+            capacity *= 2
+
+        data = np.zeros((capacity, self.n_axes, len(block_fields)))
+        data[:n] = self.data[self.head:self.tail]
+        segments = self.segments[self.head:self.tail] + [None] * (capacity - n)
+
+        self.dirty = {i - self.head for i in self.dirty}
+        self.data, self.segments = data, segments
+        self.head, self.tail = 0, n
+
+    def sync(self):
+        """Copy the parameters of dirty rows from their blocks"""
+        for i in self.dirty:
+            self.data[i] = [[getattr(b, f) for f in block_fields] for b in self.segments[i].blocks]
+
+        self.dirty.clear()
+
+    @property
+    def blocks(self):
+        """Array of block parameters for the live rows, shaped (segment, axis, field)"""
+        self.sync()
+        return self.data[self.head:self.tail]
+
+    def column(self, field):
+        """One block parameter for all live rows, shaped (segment, axis)"""
+        return self.blocks[:, :, _fi[field]]
+
+    @property
+    def dataframe(self):
+        """Phase rows, the same as concatenating Block.dataframe for all blocks, plus the
+        cumulative time and position check columns of SegmentList.dataframe """
+
+        if self._frame is not None and self._frame_version == self.version:
+            return self._frame
+
+        df = blocks_dataframe(self.blocks)
+
+        self._frame = df
+        self._frame_version = self.version
+
+        return df
+
+
+def blocks_dataframe(b):
+    """Phase rows for an array of block parameters shaped (segment, axis, field),
+    with the columns of SegmentList.dataframe"""
+
+    n_seg, n_axes = b.shape[:2]
+
+    def f(name):
+        return b[:, :, _fi[name]]
+
+    d = f('d')
+
+    # Shape is (segment, axis, phase)
+    x = np.stack([d * f('x_a'), d * f('x_c'), d * f('x_d')], axis=-1)
+    v_i = np.stack([d * f('v_0'), d * f('v_c'), d * f('v_c')], axis=-1)
+    v_f = np.stack([d * f('v_c'), d * f('v_c'), d * f('v_1')], axis=-1)
+    del_t = np.stack([f('t_a'), f('t_c'), f('t_d')], axis=-1)
+
+    # Cumulative time for each axis, running over segments and phases
+    t = np.cumsum(del_t.transpose(1, 0, 2).reshape(n_axes, -1), axis=1)
+    t = t.reshape(n_axes, n_seg, 3).transpose(1, 0, 2)
+
+    seg = np.broadcast_to(np.arange(n_seg)[:, None, None], x.shape)
+    axis = np.broadcast_to(np.arange(n_axes)[None, :, None], x.shape)
+
+    df = pd.DataFrame({
+        't': t.ravel(),
+        'seg': seg.ravel(),
+        'axis': axis.ravel(),
+        'x': x.ravel(),
+        'v_i': v_i.ravel(),
+        'v_f': v_f.ravel(),
+        'del_t': del_t.ravel(),
+    })
+
+    df['calc_x'] = (df.v_i + df.v_f) / 2 * df.del_t
+    df['err'] = df.x - df.calc_x
+
+    return df
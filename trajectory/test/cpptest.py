@@ -3,8 +3,12 @@
 from trajectory import Joint, Block, Segment, SegmentList
 from collections import deque
 import subprocess
+import json
 import os
+import select
+import struct
 from pathlib import Path
+from time import monotonic
 
 precision_map = {
     'v': 0,
@@ -41,6 +45,17 @@ def compare_planner(sl1, sl2):
 
     return diffs
 
+def planner_from_json(d, joints=None):
+    """Build a SegmentList from the JSON dump of a C++ Planner"""
+    from trajectory.serialize import from_json
+    return from_json(d, joints)
+
+
+def make(test_dir):
+    """Run make in the build directory, raising if the build fails"""
+    subprocess.run(['make'], cwd=str(test_dir), check=True)
+
+
 def compare_seg(s1, s2):
     sdiffs = []
     for i, b1 in enumerate(s1.blocks):
@@ -60,14 +75,7 @@ class TestPlanner:
         self.exe_path = self.test_dir.joinpath('test_planner')
 
     def make(self):
-
-        try:
-            pwd = os.getcwd()
-            os.chdir(self.test_dir)
-            os.system('make')
-
-        finally:
-            os.chdir(pwd)
+        make(self.test_dir)
 
     def run(self):
 
@@ -118,14 +126,7 @@ class CPPPlanner:
         self.exe_path = self.test_dir.joinpath('planner')
 
     def make(self):
-
-        try:
-            pwd = os.getcwd()
-            os.chdir(self.test_dir)
-            os.system('make')
-
-        finally:
-            os.chdir(pwd)
+        make(self.test_dir)
 
     def make_input(self, joints, moves):
         inpt = f"{len(joints)}\n"
@@ -180,16 +181,7 @@ class CPPPlanner:
 
         d = self.run_planner(joints, moves)
 
-        sl = SegmentList(joints)
-
-        joints = [Joint(n=i, v_max=j['v_max'],a_max=j['a_max']) for i,j in enumerate(d['joints'])]
-        for seg_n, sd in  enumerate(d['segments']):
-            blocks = []
-            for joint, bd in zip(joints, sd['blocks']):
-                del bd['_type']
-                b = Block(**bd, joint=joint)
-                blocks.append(b)
-            sl.segments.append(Segment(seg_n, joints, blocks))
+        sl = planner_from_json(d, joints)
 
         if "_time" in d:
             print("CPP Time: ", round(d["_time"]), "μs",
@@ -197,7 +189,7 @@ class CPPPlanner:
 
         return sl
 
-    def compare_planner(self, joints, moves, report=True):
+    def compare_planner(self, joints, moves, report=True, build=False):
         import time
 
         sl_p = SegmentList(joints)
@@ -208,7 +200,9 @@ class CPPPlanner:
         print("Pyp Time: ", round(t_diff*1_000_000) , "μs",
               round(t_diff*1_000_000/(len(sl_p.segments)*len(joints))), "μs per block")
 
-        self.make()
+        if build:
+            self.make()
+
         sl_c = self.planner(joints, moves)
 
         if report:
@@ -217,6 +211,120 @@ class CPPPlanner:
         return sl_p, sl_c
 
 
+class CPPPlannerServer:
+    """Keep one planner process running in server mode ( planner -S ) and send it
+    plan requests. Requests and responses are framed with a 4 byte little-endian
+    length followed by that many bytes of JSON, so there is no per call process
+    startup, no input file and no line parsing.
+
+        with CPPPlannerServer(build_dir) as srv:
+            sl = srv.planner(joints, moves)
+
+    A response that doesn't arrive within timeout seconds raises TimeoutError,
+    and the planner process is killed, so the next request starts a new one.
+    """
+
+    def __init__(self, test_dir, timeout=10):
+        self.test_dir = Path(test_dir)
+        self.exe_path = self.test_dir.joinpath('planner')
+        self.timeout = timeout
+        self.proc = None
+        self.req_id = 0
+
+    def make(self):
+        make(self.test_dir)
+
+    def start(self):
+        if self.proc is None or self.proc.poll() is not None:
+            # Unbuffered, so select() on stdout sees everything that hasn't been read
+            self.proc = subprocess.Popen([str(self.exe_path), '-S'], bufsize=0,
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return self
+
+    def close(self):
+        if self.proc is None:
+            return
+
+        try:
+            if self.proc.poll() is None:
+                self._send({'op': 'quit'})
+                self.proc.stdin.close()
+                self.proc.wait(timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+            self.proc.wait()
+        finally:
+            self.proc.stdout.close()
+            self.proc = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _send(self, req):
+        payload = json.dumps(req).encode('utf8')
+        self.proc.stdin.write(struct.pack('<I', len(payload)) + payload)
+        self.proc.stdin.flush()
+
+    def _kill(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        self.proc = None
+
+    def _read_exact(self, n, deadline):
+        fd = self.proc.stdout.fileno()
+        buf = b''
+
+        while len(buf) < n:
+            ready, _, _ = select.select([fd], [], [], max(deadline - monotonic(), 0))
+            if not ready:
+                self._kill()
+                raise TimeoutError(f"Planner server did not respond in {self.timeout} seconds")
+
+            chunk = os.read(fd, n - len(buf))
+            if not chunk:
+                raise IOError(f"Planner server exited with code {self.proc.poll()}")
+            buf += chunk
+
+        return buf
+
+    def request(self, req):
+        """Send one request and return the decoded response"""
+        self.start()
+
+        self.req_id += 1
+        req = dict(req, id=self.req_id)
+        self._send(req)
+
+        deadline = monotonic() + self.timeout
+        n, = struct.unpack('<I', self._read_exact(4, deadline))
+        resp = json.loads(self._read_exact(n, deadline))
+
+        if not resp.get('ok'):
+            raise IOError(f"Planner server error: {resp.get('error')}")
+
+        return resp
+
+    def ping(self):
+        return self.request({'op': 'ping'})
+
+    def run_planner(self, joints, moves):
+        """Return the planner JSON dump, with the planning time in _time"""
+        resp = self.request({'op': 'plan',
+                             'joints': [[j.v_max, j.a_max] for j in joints],
+                             'moves': [[int(e) for e in m] for m in moves]})
+        d = resp['planner']
+        d['_time'] = resp['_time']
+        return d
+
+    def planner(self, joints, moves):
+        return planner_from_json(self.run_planner(joints, moves), joints)
+
+
 class TestStepper:
     """Run the test programm that generates steps"""
 
@@ -225,14 +333,7 @@ class TestStepper:
         self.exe_path = self.test_dir.joinpath('stepper')
 
     def make(self):
-
-        try:
-            pwd = os.getcwd()
-            os.chdir(self.test_dir)
-            os.system('make')
-
-        finally:
-            os.chdir(pwd)
+        make(self.test_dir)
 
     def make_input(self, sl):
         from itertools import chain
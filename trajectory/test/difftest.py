@@ -0,0 +1,253 @@
+""" Differential testing of the Python planner against the C++ planner
+
+Runs many move programs, random or recorded, through both planners across a
+process pool, and compares the planned blocks as flat arrays, one row per
+block and one column per field of table.block_fields. A field differs when
+the two values differ after rounding to the precision in cpptest.precision_map,
+the same test as compare_blocks, but without building dicts for every block.
+
+    python -m trajectory.test.difftest -n 1000 --moves 20
+
+The C++ side is the in-process native planner when libtrjplanner is built,
+otherwise a CPPPlannerServer for the planner binary in --build-dir.
+"""
+
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from trajectory import Joint, SegmentList
+from trajectory.serialize import json_blocks
+from trajectory.table import block_fields
+from trajectory.test.cpptest import precision_map
+
+data_dir = Path(__file__).parent.joinpath('data')
+
+# Decimal places to round each field to before comparing
+field_precision = np.array([precision_map.get(f[0], 0) for f in block_fields])
+
+
+def random_program(n_moves, n_joints, rng, max_x=5000, p_zero=.2):
+    """Random integer moves, with some axes not moving"""
+    x = rng.integers(-max_x, max_x, size=(n_moves, n_joints))
+    x[rng.random(size=x.shape) < p_zero] = 0
+    return x
+
+
+def recorded_programs(n_joints):
+    """Move programs from the CSV files in the test data directory. Files with
+    axis columns are moves; the others are rows of time and velocities, which
+    become moves of t*v steps. """
+
+    for p in sorted(data_dir.glob('*.csv')):
+        with p.open() as f:
+            rows = [[e for e in r if e.strip()] for r in csv.reader(f)]
+
+        if rows and not rows[0][0].replace('.', '', 1).replace('-', '', 1).isdigit():
+            header, rows = rows[0], rows[1:]
+            cols = [i for i, h in enumerate(header) if h.startswith('axis')]
+            moves = [[int(float(r[i])) for i in cols] for r in rows]
+        else:
+            moves = [[round(float(r[0]) * float(v)) for v in r[1:]] for r in rows]
+
+        moves = [(m + [0] * n_joints)[:n_joints] for m in moves]
+        moves = [m for m in moves if any(m)]
+
+        if moves:
+            yield p.stem, np.array(moves)
+
+
+def python_blocks(joints, moves):
+    """Plan with the Python planner, returning blocks shaped (segment, axis, field)"""
+    sl = SegmentList(joints)
+    for m in moves:
+        sl.move([int(e) for e in m])
+
+    return sl.block_params
+
+
+class CPPBackend:
+    """Plan with the C++ planner, natively if possible"""
+
+    def __init__(self, build_dir=None):
+        from trajectory import native
+
+        self.server = None
+
+        if not native.available():
+            from trajectory.test.cpptest import CPPPlannerServer
+
+            if build_dir is None:
+                raise OSError("No native planner library, and no build_dir for the planner server")
+            self.server = CPPPlannerServer(build_dir).start()
+
+    def blocks(self, joints, moves):
+        if self.server is not None:
+            return json_blocks(self.server.run_planner(joints, moves))
+
+        from trajectory.native import NativeSegmentList
+
+        with NativeSegmentList(joints) as nl:
+            nl.moves(moves)
+            return nl.block_params()
+
+
+def compare_arrays(a, b):
+    """Compare two block arrays shaped (segment, axis, field). Returns a boolean
+    mismatch array with the same shape, and the absolute differences"""
+
+    n = min(len(a), len(b))
+    a, b = a[:n], b[:n]
+
+    scale = 10.0 ** field_precision
+    mismatch = np.round(a * scale) != np.round(b * scale)
+
+    return mismatch, np.abs(a - b)
+
+
+_backend = None
+
+
+def _init_worker(build_dir):
+    global _backend
+    _backend = CPPBackend(build_dir)
+
+
+def run_program(job):
+    """Plan one program with both planners and compare. Runs in a worker process"""
+    name, joint_params, moves = job
+
+    joints = [Joint(v_max, a_max) for v_max, a_max in joint_params]
+
+    t0 = perf_counter()
+    pb = python_blocks(joints, moves)
+    t1 = perf_counter()
+    cb = _backend.blocks(joints, moves)
+    t2 = perf_counter()
+
+    mismatch, diff = compare_arrays(pb, cb)
+
+    return {
+        'name': name,
+        'n_segments': len(moves),
+        'segment_count_diff': len(pb) - len(cb),
+        'n_blocks': mismatch.shape[0] * mismatch.shape[1],
+        'field_mismatches': mismatch.sum(axis=(0, 1)),
+        'field_max_diff': diff.max(axis=(0, 1)) if diff.size else np.zeros(len(block_fields)),
+        'block_mismatches': int(mismatch.any(axis=2).sum()),
+        'first_segment': int(np.argmax(mismatch.any(axis=(1, 2)))) if mismatch.any() else None,
+        'py_time': t1 - t0,
+        'cpp_time': t2 - t1,
+    }
+
+
+class DiffStats:
+    """Aggregated results of many program comparisons"""
+
+    def __init__(self):
+        self.results = []
+        self.n_blocks = 0
+        self.field_mismatches = np.zeros(len(block_fields), dtype=int)
+        self.field_max_diff = np.zeros(len(block_fields))
+
+    def add(self, r):
+        self.results.append(r)
+        self.n_blocks += r['n_blocks']
+        self.field_mismatches += r['field_mismatches']
+        self.field_max_diff = np.maximum(self.field_max_diff, r['field_max_diff'])
+
+    @property
+    def programs(self):
+        """One row per program"""
+        cols = ['name', 'n_segments', 'segment_count_diff', 'n_blocks', 'block_mismatches',
+                'first_segment', 'py_time', 'cpp_time']
+        return pd.DataFrame([{k: r[k] for k in cols} for r in self.results], columns=cols)
+
+    @property
+    def fields(self):
+        """One row per block field"""
+        return pd.DataFrame({
+            'precision': field_precision,
+            'mismatches': self.field_mismatches,
+            'rate': self.field_mismatches / max(self.n_blocks, 1),
+            'max_diff': self.field_max_diff,
+        }, index=list(block_fields))
+
+    def worst(self, n=10):
+        return self.programs.sort_values('block_mismatches', ascending=False).head(n)
+
+    def summary(self):
+        p = self.programs
+        n_bad = int((p.block_mismatches > 0).sum() + (p.segment_count_diff != 0).sum()) if len(p) else 0
+        return (f"{len(p)} programs, {self.n_blocks} blocks, "
+                f"{int(p.block_mismatches.sum()) if len(p) else 0} mismatched blocks in {n_bad} programs; "
+                f"py {p.py_time.sum():.2f}s cpp {p.cpp_time.sum():.2f}s")
+
+
+class DiffRunner:
+    """Run programs through both planners in a process pool"""
+
+    def __init__(self, joints, build_dir=None, workers=None):
+        self.joint_params = [(j.v_max, j.a_max) for j in joints]
+        self.build_dir = build_dir
+        self.workers = workers
+
+    def jobs(self, programs):
+        for name, moves in programs:
+            yield name, self.joint_params, np.asarray(moves)
+
+    def run(self, programs, chunksize=4):
+        """Compare each (name, moves) program, returning a DiffStats"""
+        stats = DiffStats()
+
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.build_dir,)) as ex:
+            for r in ex.map(run_program, self.jobs(programs), chunksize=chunksize):
+                stats.add(r)
+
+        return stats
+
+    def random_programs(self, n, n_moves, seed=0, max_x=5000):
+        rng = np.random.default_rng(seed)
+        for i in range(n):
+            yield f'random-{seed}-{i}', random_program(n_moves, len(self.joint_params), rng, max_x)
+
+    def recorded_programs(self):
+        return recorded_programs(len(self.joint_params))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare the Python and C++ planners')
+    parser.add_argument('-n', type=int, default=100, help='Number of random programs')
+    parser.add_argument('--moves', type=int, default=10, help='Moves per random program')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--joints', default='5000:50000,5000:50000,3000:20000',
+                        help='v_max:a_max for each joint, comma separated')
+    parser.add_argument('--build-dir', help='Directory with the planner binary, if there is no native library')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-recorded', action='store_true', help="Don't run the recorded programs")
+    args = parser.parse_args()
+
+    joints = [Joint(*map(float, e.split(':'))) for e in args.joints.split(',')]
+    runner = DiffRunner(joints, args.build_dir, args.workers)
+
+    def programs():
+        if not args.no_recorded:
+            yield from runner.recorded_programs()
+        yield from runner.random_programs(args.n, args.moves, args.seed)
+
+    stats = runner.run(programs())
+
+    print(stats.summary())
+    print(stats.fields)
+    print(stats.worst())
+
+
+if __name__ == '__main__':
+    main()
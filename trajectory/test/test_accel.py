@@ -0,0 +1,163 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory import accel
+from trajectory.accel import (HAVE_NUMBA, python, clocked_steps, period_ticks, search_v_c, stepper_run,
+                              stepper_state, stepper_steps)
+from trajectory.emulator import phase_params, stepper_phases
+from trajectory.gsolver import accel_acd, binary_search
+from trajectory.sim import SimSegment
+from trajectory.stepper import Stepper
+
+
+def kernels(k):
+    """The Python version of a kernel, and the compiled one if there is numba"""
+    return [python(k)] + ([k] if HAVE_NUMBA else [])
+
+
+def plan(moves):
+    sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+    for m in moves:
+        sl.move(m)
+    return sl
+
+
+def reference_steps(phases):
+    """Steps from stepper.Stepper, a new one for each block"""
+    pid, t = [], []
+    for bi, block in enumerate(phases.reshape(-1, 3, 3).tolist()):
+        stp = Stepper()
+        stp.load_phases(block)
+        while True:
+            s = stp.next()
+            if stp.done:
+                break
+            if s:
+                pid.append(bi * 3 + stp.phase - 1)
+                t.append(stp.phase_t)
+    return pid, t
+
+
+class TestAccel(unittest.TestCase):
+
+    def setUp(self):
+        self.moves = np.random.default_rng(3).integers(-3000, 3000, size=(12, 3)).tolist()
+
+    def test_search_v_c(self):
+        rng = np.random.default_rng(0)
+
+        for _ in range(200):
+            x = float(rng.integers(1, 5000))
+            t = float(rng.uniform(.05, 2))
+            v_0, v_1 = (float(e) for e in rng.integers(0, 5000, 2))
+            a_max = 50000.
+
+            def err(v_c):
+                x_ad, t_ad = accel_acd(v_0, v_c, v_1, a_max)
+                t_c = max(t - t_ad, 0)
+                return x - (x_ad + max(v_c, 0) * t_c)
+
+            expected = binary_search(err, 0, x / t, 5000.)
+
+            for k in kernels(search_v_c):
+                v_c = k(x, t, v_0, v_1, 5000., a_max)
+                if expected is None:
+                    self.assertTrue(np.isnan(v_c))
+                else:
+                    self.assertEqual(v_c, expected)
+
+    def test_plan_parity(self):
+        sl = plan(self.moves)
+
+        old = accel.search_v_c
+        try:
+            accel.search_v_c = python(search_v_c)
+            sl_py = plan(self.moves)
+        finally:
+            accel.search_v_c = old
+
+        np.testing.assert_array_equal(sl.block_params, sl_py.block_params)
+
+    def test_stepper_steps(self):
+        phases = stepper_phases(plan(self.moves)).reshape(-1, 3)
+        pid, t = reference_steps(phases)
+
+        for k in kernels(stepper_steps):
+            k_pid, k_tick, k_t, k_dir, _, _ = k(phases.astype(np.float64), 4, False)
+            self.assertEqual(k_pid.tolist(), pid)
+            self.assertEqual(k_t.tolist(), t)
+            self.assertEqual(k_dir.tolist(), np.sign(phases[pid, 0]).tolist())
+
+    def test_stepper_run(self):
+        """One tick at a time, stepper_run() is Stepper.next()"""
+        block = stepper_phases(plan(self.moves[:2]))[1, 0]
+
+        stp = Stepper()
+        stp.load_phases(block.tolist())
+
+        st = np.zeros(len(stepper_state))
+        phase = 0
+        while True:
+            s = stp.next()
+            r, phase, n = stepper_run(block.astype(np.float64), phase, st, 4e-6, 1)
+            if stp.done:
+                self.assertEqual(n, 0)
+                break
+
+            self.assertEqual((r, phase, n), (s, stp.phase, 1))
+            self.assertEqual(st.tolist(), [float(getattr(stp, f)) for f in stepper_state])
+
+    def test_stepper_carry(self):
+        """With carry, one Stepper runs all of the blocks"""
+        phases = stepper_phases(plan(self.moves[:4]))[:, 0].reshape(-1, 3)
+
+        stp = Stepper()
+        ticks = []
+        tick = 0
+        for block in phases.reshape(-1, 3, 3).tolist():
+            stp.load_phases(block)
+            while True:
+                s = stp.next()
+                if stp.done:
+                    break
+                tick += 1
+                if s:
+                    ticks.append(tick)
+
+        for k in kernels(stepper_steps):
+            self.assertEqual(k(phases.astype(np.float64), 4, True)[1].tolist(), ticks)
+
+    def test_clocked_steps(self):
+        """Clocked to the stepper's own block lengths, the steps are the same as with carry"""
+        phases = stepper_phases(plan(self.moves[:4]))[:, 1].reshape(-1, 3).astype(np.float64)
+        _, ticks, _, _, block_ticks, dc = stepper_steps(phases, 4, True)
+
+        for k in kernels(clocked_steps):
+            seg, call, phase, direction, state = k(phases, 4, block_ticks + 1, np.zeros(9))
+            starts = np.cumsum(block_ticks) - block_ticks
+            self.assertEqual((starts[seg] + call + 1).tolist(), ticks.tolist())
+            self.assertEqual(state[0], dc)
+
+    def test_period_ticks(self):
+        cases = [(100, 0, 1000), (100, 1000, 0), (500, 1000, 1000), (0, 0, 0), (300, 200, 3000),
+                 (-300, -200, -3000), (1, 0, 50), (5, 7000, 5000)]
+        x, v0, v1 = (np.array(e) for e in zip(*cases))
+
+        steps, n, ca, const_v = phase_params(x, v0, v1)
+        offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+        np.cumsum(steps, out=offsets[1:])
+
+        for k in kernels(period_ticks):
+            ticks = k(steps, n, ca, const_v, 4, SimSegment.fp_bits, offsets,
+                      np.zeros(offsets[-1], dtype=np.int64))
+
+            for i, c in enumerate(cases):
+                items = list(SimSegment(*c).iter_period(4))
+                expected = [j + 1 for j, (_, d) in enumerate(items[:-1]) if d]
+                self.assertEqual(ticks[offsets[i]:offsets[i + 1]].tolist(), expected, c)
+
+
+if __name__ == '__main__':
+    unittest.main()
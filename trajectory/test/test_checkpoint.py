@@ -0,0 +1,134 @@
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.checkpoint import Checkpoint, restore
+from trajectory.messages import CurrentState
+
+
+def current_state(queue_length, positions, planner_positions):
+    return CurrentState(struct.pack(CurrentState.msg_fmt, queue_length, 0,
+                                    *(list(positions) + [0] * 6)[:6],
+                                    *(list(planner_positions) + [0] * 6)[:6]))
+
+
+class FakeProto:
+    def __init__(self):
+        self.seq, self.last_ack, self.last_done = 0, -1, -1
+        self.current_state = CurrentState()
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        self.moves = np.random.default_rng(4).integers(-3000, 3000, size=(12, 3)).tolist()
+
+        self.sl = SegmentList(self.joints)
+        for m in self.moves:
+            self.sl.move(m)
+
+        for i in range(4):  # Send four segments to the device
+            self.sl.take()
+
+        self.proto = FakeProto()
+        self.proto.seq, self.proto.last_ack, self.proto.last_done = 40, 40, 37
+
+        self.td = tempfile.TemporaryDirectory()
+        self.path = Path(self.td.name).joinpath('state.ckpt')
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_snapshot_load(self):
+        with Checkpoint(self.path, slot_size=64 * 1024) as ck:
+            self.assertEqual(ck.snapshot(self.sl, self.proto), 1)
+            self.assertIsNone(ck.maybe_snapshot(self.sl, self.proto, interval=0))  # Nothing changed
+            self.sl.move([10, 20, 30])
+            self.assertEqual(ck.maybe_snapshot(self.sl, self.proto, interval=0), 2)
+
+        # Reopen, as after a crash
+        with Checkpoint(self.path) as ck:
+            snap = ck.load()
+
+        self.assertEqual(snap.generation, 2)
+        self.assertEqual(snap.committed, 4)
+        self.assertEqual(snap.proto['seq'], 40)
+        self.assertEqual(len(snap.segment_list), 13)
+        self.assertEqual(snap.segment_list.planner_position, self.sl.planner_position)
+
+    def test_torn_write(self):
+        with Checkpoint(self.path, slot_size=64 * 1024) as ck:
+            ck.snapshot(self.sl)
+            self.sl.move([10, 20, 30])
+            ck.snapshot(self.sl)
+
+            # Damage the current slot; load falls back to the previous snapshot
+            off = ck._slot_offset(ck.slot) + 100
+            ck._mm[off:off + 8] = b'\xff' * 8
+            self.assertEqual(len(ck.load().segment_list), 12)
+
+    def test_restore(self):
+        with Checkpoint(self.path, slot_size=64 * 1024) as ck:
+            ck.snapshot(self.sl, self.proto)
+            snap = ck.load()
+
+        sent = np.sum(self.moves[:4], axis=0).tolist()
+
+        proto = FakeProto()
+        proto.current_state = current_state(0, [1, 2, 3], sent)
+        r = restore(snap, proto)
+
+        self.assertTrue(r.consistent)
+        self.assertEqual(r.dropped, 4)
+        self.assertEqual(len(r.segment_list), 8)
+        self.assertEqual(r.segment_list.segments[0].move, self.moves[4])
+        self.assertEqual([b.v_0 for b in r.segment_list.segments[0].blocks], [0, 0, 0])
+        self.assertEqual(r.segment_list.step_position.tolist(), [1, 2, 3])
+        self.assertEqual(proto.seq, 40)
+
+    def test_restore_unsent(self):
+        """The host crashed after taking four segments, but only sent two"""
+        with Checkpoint(self.path, slot_size=64 * 1024) as ck:
+            ck.snapshot(self.sl, self.proto)
+            snap = ck.load()
+
+        sent = np.sum(self.moves[:2], axis=0).tolist()
+
+        r = restore(snap, device_state=current_state(0, [1, 2, 3], sent))
+
+        self.assertTrue(r.consistent)
+        self.assertEqual(r.dropped, 2)
+        self.assertEqual(r.requeued, 2)
+        self.assertEqual(r.offset, (-np.sum(self.moves[2:4], axis=0)).tolist())
+
+        sl = r.segment_list
+        self.assertEqual(len(sl), 10)
+        self.assertEqual(sl.committed, 0)
+        self.assertEqual([s.move for s in sl.segments], self.moves[2:])
+        self.assertEqual(sl.planner_position, self.sl.planner_position)
+        self.assertEqual([b.v_0 for b in sl.segments[0].blocks], [0, 0, 0])
+
+        self.assertIs(sl.take(), sl.segments[0])  # The unsent segments go out again
+
+    def test_restore_inconsistent(self):
+        with Checkpoint(self.path, slot_size=64 * 1024) as ck:
+            ck.snapshot(self.sl, self.proto)
+            snap = ck.load()
+
+        r = restore(snap, device_state=current_state(0, [5, 5, 5], [5, 5, 5]))
+
+        self.assertFalse(r.consistent)
+        self.assertEqual(len(r.segment_list), 0)
+        self.assertEqual(r.segment_list.planner_position, [5, 5, 5])
+
+        r.segment_list.move([100, 100, 100])
+        self.assertEqual(r.segment_list.planner_position, [105, 105, 105])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.classify import JSClass, classify, classify_segments, shape_histogram
+
+
+class TestClassify(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        cls.moves = np.random.default_rng(1).integers(-3000, 3000, size=(40, 3))
+        cls.moves[::7, 1] = 0
+
+        cls.sl = SegmentList(cls.joints)
+        for m in cls.moves.tolist():
+            cls.sl.move(m)
+
+    def test_same_as_classify(self):
+        codes = classify_segments(self.sl)
+
+        self.assertEqual(codes.shape, (len(self.sl.segments), 3))
+        self.assertEqual(codes.tolist(), [[classify(b).value for b in s.blocks] for s in self.sl.segments])
+        self.assertTrue((codes[::7, 1] == JSClass.ZERO.value).all())
+
+    def test_histogram(self):
+        programs = [('a', self.moves[:15]), ('b', self.moves[15:])]
+        df = shape_histogram(self.joints, programs)
+
+        self.assertEqual(df.index.tolist(), ['a', 'b'])
+        self.assertEqual(df.moves.tolist(), [15, 25])
+        self.assertEqual(df.blocks.tolist(), [45, 75])
+        self.assertEqual(df[[k.name for k in JSClass]].sum(axis=1).tolist(), [45, 75])
+        self.assertTrue((df.time > 0).all())
+
+        df = shape_histogram(self.joints, programs, normalize=True)
+        np.testing.assert_allclose(df[[k.name for k in JSClass]].sum(axis=1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
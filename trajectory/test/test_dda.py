@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.accel import HAVE_NUMBA, python
+from trajectory.dda import compare, dda_steps, simulate
+from trajectory.emulator import stepper_phases
+
+
+class TestDDA(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(5).integers(-2000, 2000, size=(10, 3)).tolist():
+            cls.sl.move(m)
+
+        cls.phases = stepper_phases(cls.sl)
+
+    def test_positions(self):
+        st = simulate(self.sl)
+
+        # Every axis reaches the end of every segment
+        x = self.phases[..., 0].sum(axis=2)
+        for s in range(len(x)):
+            m = st.seg == s
+            self.assertEqual(np.bincount(st.axis[m], weights=st.direction[m], minlength=3).tolist(),
+                             x[s].tolist())
+
+        # In time order, at most one step per axis per tick, and the dominant axis
+        # of each segment has the most steps
+        self.assertTrue((np.diff(st.tick) >= 0).all())
+        self.assertEqual(len(np.unique(st.tick * 3 + st.axis)), len(st))
+        np.testing.assert_array_equal(st.stats['dominant'], np.abs(x).argmax(axis=1))
+
+        self.assertEqual(np.abs(st.dense()).sum(), len(st))
+
+    @unittest.skipUnless(HAVE_NUMBA, "numba is not installed")
+    def test_python(self):
+        ph = self.phases[:3].astype(np.float64)
+        for a, b in zip(dda_steps(ph, 4, 0.0), python(dda_steps)(ph, 4, 0.0)):
+            np.testing.assert_array_equal(a, b)
+
+    def test_compare(self):
+        s = compare(self.sl).summary
+
+        self.assertEqual(list(s.index), ['stepper', 'dda'])
+        self.assertLess(s.loc['dda', 'timer_updates'], s.loc['stepper', 'timer_updates'])
+        self.assertTrue((s.err_max > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
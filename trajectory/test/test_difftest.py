@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint
+from trajectory.native import available
+from trajectory.table import block_fields
+from trajectory.test import difftest
+from trajectory.test.difftest import CPPBackend, DiffRunner, DiffStats, compare_arrays, python_blocks, run_program
+
+fi = block_fields.index
+
+
+class ShiftedBackend:
+    """The Python planner, with some blocks changed by a known amount"""
+
+    def __init__(self, shifts):
+        self.shifts = shifts  # (segment, axis, field, delta)
+
+    def blocks(self, joints, moves):
+        b = python_blocks(joints, moves).copy()
+        for s, a, f, delta in self.shifts:
+            if s < len(b):
+                b[s, a, fi(f)] += delta
+        return b
+
+
+class TestDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        self.moves = np.random.default_rng(4).integers(-3000, 3000, size=(6, 3))
+
+    def test_compare_arrays(self):
+        a = np.zeros((3, 2, len(block_fields)))
+        a[:, :, fi('x')] = 100
+        a[:, :, fi('t')] = 1
+        a[:, :, fi('v_c')] = 10
+
+        b = np.concatenate([a, a[:1]])  # An extra segment is ignored
+        b[0, 0, fi('x')] += .3  # Rounds to the same x, precision 0
+        b[0, 1, fi('x')] += 1
+        b[1, 0, fi('t')] += .0004  # Rounds to the same t, precision 3
+        b[1, 1, fi('t')] += .002
+        b[2, 0, fi('v_c')] += 2
+
+        mismatch, diff = compare_arrays(a, b)
+
+        self.assertEqual(mismatch.shape, a.shape)
+        self.assertEqual(sorted(map(tuple, np.argwhere(mismatch))),
+                         [(0, 1, fi('x')), (1, 1, fi('t')), (2, 0, fi('v_c'))])
+        self.assertAlmostEqual(diff[0, 0, fi('x')], .3)
+        self.assertAlmostEqual(diff.max(), 2)
+
+    def test_stats(self):
+        backend, difftest._backend = difftest._backend, ShiftedBackend([(1, 0, 'x', 1), (1, 2, 't', .01),
+                                                                         (4, 1, 't', .01)])
+        try:
+            joint_params = [(j.v_max, j.a_max) for j in self.joints]
+            same = run_program(('same', joint_params, self.moves[:1]))
+            shifted = run_program(('shifted', joint_params, self.moves))
+        finally:
+            difftest._backend = backend
+
+        self.assertEqual(same['block_mismatches'], 0)
+        self.assertEqual(shifted['block_mismatches'], 3)
+        self.assertEqual(shifted['first_segment'], 1)
+
+        stats = DiffStats()
+        stats.add(same)
+        stats.add(shifted)
+
+        self.assertEqual(stats.n_blocks, 3 + 18)
+        self.assertEqual(stats.fields.loc['x', 'mismatches'], 1)
+        self.assertEqual(stats.fields.loc['t', 'mismatches'], 2)
+        self.assertEqual(stats.fields.loc['t', 'precision'], 3)
+        self.assertAlmostEqual(stats.fields.loc['t', 'rate'], 2 / 21)
+        self.assertAlmostEqual(stats.fields.loc['t', 'max_diff'], .01)
+        self.assertEqual(stats.fields.mismatches.sum(), 3)
+        self.assertEqual(stats.worst(1).name.tolist(), ['shifted'])
+        self.assertTrue(stats.summary().startswith('2 programs, 21 blocks, 3 mismatched blocks in 1 programs'))
+
+    @unittest.skipUnless(available(), "libtrjplanner is not built")
+    def test_runner(self):
+        runner = DiffRunner(self.joints, workers=1)
+        stats = runner.run(runner.random_programs(3, 5, seed=4), chunksize=1)
+
+        p = stats.programs
+        self.assertEqual(p.name.tolist(), ['random-4-0', 'random-4-1', 'random-4-2'])
+        self.assertEqual(p.segment_count_diff.tolist(), [0, 0, 0])
+        self.assertEqual(stats.n_blocks, 3 * 5 * 3)
+
+        # The pool gets the same results as planning in this process
+        backend, difftest._backend = difftest._backend, CPPBackend()
+        try:
+            direct = [run_program(job) for job in runner.jobs(runner.random_programs(3, 5, seed=4))]
+        finally:
+            difftest._backend = backend
+
+        self.assertEqual(p.block_mismatches.tolist(), [r['block_mismatches'] for r in direct])
+        np.testing.assert_array_equal(stats.field_mismatches, sum(r['field_mismatches'] for r in direct))
+
+
+if __name__ == '__main__':
+    unittest.main()
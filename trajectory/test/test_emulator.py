@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.emulator import emulate_phases, emulate
+from trajectory.sim import SimSegment
+
+
+def reference(x, v0, v1, period=4):
+    """Step ticks and total ticks from SimSegment.iter_period"""
+    items = list(SimSegment(x, v0, v1).iter_period(period))
+    if len(items) == 1:
+        return [], 0
+
+    ticks = [i + 1 for i, (t, d) in enumerate(items[:-1]) if d]
+    return ticks, len(items) - 1
+
+
+class TestEmulator(unittest.TestCase):
+
+    def test_parity(self):
+        rng = np.random.default_rng(0)
+
+        cases = [(100, 0, 1000), (100, 1000, 0), (500, 1000, 1000), (0, 0, 0), (300, 200, 3000),
+                 (300, 3000, 200), (-300, -200, -3000), (1, 0, 50), (5, 7000, 5000)]
+
+        for _ in range(30):
+            v0, v1 = (int(e) for e in rng.integers(0, 6000, 2))
+            cases.append((int(rng.integers(1, 400)), v0, v0 if rng.random() < .2 else v1))
+
+        x, v0, v1 = (np.array(e) for e in zip(*cases))
+
+        for period in (4, 10):
+            offsets, ticks, phase_ticks = emulate_phases(x, v0, v1, period)
+
+            for i, c in enumerate(cases):
+                rt, rk = reference(*c, period=period)
+                self.assertEqual(ticks[offsets[i]:offsets[i + 1]].tolist(), rt, c)
+                self.assertEqual(phase_ticks[i], rk, c)
+
+    def test_job(self):
+        sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(1).integers(-2000, 2000, size=(10, 3)).tolist():
+            sl.move(m)
+
+        st = emulate(sl)
+        df = st.dataframe
+
+        # Every step of every phase is there, in order on each axis
+        phases = np.array([[b.stepper_blocks() for b in s.blocks] for s in sl.segments])
+        self.assertEqual(len(st), np.abs(phases[..., 0]).sum())
+        self.assertEqual(df.groupby('axis').x.last().tolist(), phases[..., 0].sum(axis=(0, 2)).tolist())
+        self.assertTrue(all((np.diff(st.axis_steps(a)[0]) > 0).all() for a in range(3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from collections import deque
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.flow import FlowController
+
+
+class FakeState:
+    def __init__(self, queue_length, queue_time):
+        self.queue_length, self.queue_time = queue_length, queue_time
+
+
+class FakeDevice:
+    """Runs queued segment times against a simulated clock, and reports its
+    queue in a new state on every update"""
+
+    def __init__(self, dt=.01):
+        self.now = 0
+        self.dt = dt
+        self.queue = deque()
+        self.current_state = FakeState(0, 0)
+        self.ran_dry = 0
+
+    def clock(self):
+        return self.now
+
+    def rmove(self, t):
+        self.queue.append(t)
+
+    def update(self, timeout=0):
+        left = self.dt
+        while left > 0 and self.queue:
+            d = min(left, self.queue[0])
+            self.queue[0] -= d
+            left -= d
+            if self.queue[0] <= 1e-12:
+                self.queue.popleft()
+                if not self.queue:
+                    self.ran_dry += 1
+        self.now += self.dt
+        self.current_state = FakeState(len(self.queue), int(sum(self.queue) * 1e6))
+
+
+class TestFlowController(unittest.TestCase):
+
+    def setUp(self):
+        self.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(5).integers(-1500, 1500, size=(30, 3)).tolist():
+            self.sl.move(m)
+
+    def test_watermarks(self):
+        dev = FakeDevice()
+        fc = FlowController(self.sl, dev, low_water=.2, high_water=.5,
+                            send=lambda s: dev.rmove(s.t), clock=dev.clock)
+
+        total = self.sl.queue_time
+        longest = max(s.t for s in self.sl.segments)
+        max_queue = 0
+
+        while len(self.sl):
+            fc.service()
+            max_queue = max(max_queue, sum(dev.queue))
+
+            # Segments beyond the device's needs are still in the planner, unfrozen
+            self.assertEqual(self.sl.committed, 0)
+
+        self.assertEqual(fc.sent_segments, 30)
+        self.assertAlmostEqual(fc.sent_time, total)
+        self.assertEqual(fc.underruns, 0)
+        self.assertEqual(dev.ran_dry, 0)  # Never ran out while the program was running
+        self.assertLessEqual(max_queue, .5 + longest)
+
+    def test_underrun(self):
+        dev = FakeDevice(dt=.5)  # Serviced too slowly for the watermarks
+        fc = FlowController(self.sl, dev, low_water=.01, high_water=.02,
+                            send=lambda s: dev.rmove(s.t), clock=dev.clock)
+
+        while len(self.sl):
+            fc.service()
+
+        self.assertGreater(fc.underruns, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
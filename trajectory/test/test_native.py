@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint
+from trajectory.native import available, NativeSegmentList
+from trajectory.table import block_fields
+
+
+@unittest.skipUnless(available(), "libtrjplanner is not built")
+class TestNativePlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        self.moves = np.array([[1000, 0, 500], [-2000, 3000, 0], [0, -1500, 1500], [3000, 3000, -3000]])
+
+    def test_moves(self):
+        with NativeSegmentList(self.joints) as nl:
+            nl.moves(self.moves)
+
+            self.assertEqual(len(nl), len(self.moves))
+            self.assertEqual(nl.planner_position, self.moves.sum(axis=0).tolist())
+
+            p = nl.block_params()
+            self.assertEqual(p.shape, (len(self.moves), len(self.joints), len(block_fields)))
+            np.testing.assert_array_equal(p[:, :, block_fields.index('x')] * p[:, :, block_fields.index('d')],
+                                          self.moves)
+
+            self.assertAlmostEqual(nl.queue_time, sum(s.blocks[0].t for s in nl.segments))
+            self.assertLess(nl.dataframe.err.abs().max(), 1e-6)
+
+            s = nl.pop()
+            self.assertEqual(s.n, 0)
+            self.assertEqual([round(b.x * b.d) for b in s.blocks], self.moves[0].tolist())
+            self.assertEqual(len(nl), len(self.moves) - 1)
+
+    def test_stepper(self):
+        with NativeSegmentList(self.joints) as nl:
+            nl.moves(self.moves)
+
+            for i in range(1_000_000):
+                if nl.step(0.0001) == 0 and len(nl) == 0:
+                    break
+
+            self.assertEqual(len(nl), 0)
+            self.assertEqual(nl.popped, len(self.moves))
+
+
+if __name__ == '__main__':
+    unittest.main()
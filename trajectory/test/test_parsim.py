@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.parsim import simulate
+
+
+class TestParsim(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(2).integers(-1000, 1000, size=(6, 3)).tolist():
+            cls.sl.move(m)
+
+        cls.rows = np.array(list(cls.sl.step()))[:, 1:].astype(np.int8)
+
+    def test_exact(self):
+        for kw in (dict(workers=1), dict(workers=2), dict(workers=1, shards=3)):
+            st = simulate(self.sl, **kw)
+
+            np.testing.assert_array_equal(st.dense(), self.rows, str(kw))
+            self.assertEqual(st.position.tolist(), self.rows.sum(axis=0).tolist())
+            self.assertTrue((np.diff(st.tick) >= 0).all())
+
+    def test_speculative(self):
+        st = simulate(self.sl, workers=1, shards=3, tol=1e-6)
+
+        self.assertEqual(len(st), np.abs(self.rows).sum())
+        self.assertEqual(st.position.tolist(), self.rows.sum(axis=0).tolist())
+        self.assertLessEqual(st.stats['rounds'], 2 * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import hashlib
+import tempfile
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory import plancache
+from trajectory.plancache import PlanCache
+from trajectory.planner import PLANNER_VERSION
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        self.moves = np.random.default_rng(2).integers(-3000, 3000, size=(40, 3))
+        self.td = tempfile.TemporaryDirectory()
+        self.cache = PlanCache(self.td.name, chunk=4)
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_hits(self):
+        a = self.cache.plan(self.joints, self.moves[:20])
+        self.assertEqual(self.cache.misses, 1)
+
+        b = self.cache.plan(self.joints, self.moves[:20])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertTrue(np.array_equal(a.block_params, b.block_params))
+        self.assertEqual(a.planner_position, b.planner_position)
+
+        # Different joints are a different key
+        self.assertIsNone(self.cache.get([Joint(4000, 50000)] + self.joints[1:], self.moves[:20]))
+
+    def test_prefix(self):
+        self.cache.plan(self.joints, self.moves[:20])
+        sl = self.cache.plan(self.joints, self.moves)
+        self.assertEqual(self.cache.prefix_hits, 1)
+
+        ref = SegmentList(self.joints)
+        for m in self.moves:
+            ref.move(m.tolist())
+
+        self.assertTrue(np.array_equal(sl.block_params, ref.block_params))
+        self.assertEqual(sl.seg_num, ref.seg_num)
+
+    def test_empty(self):
+        self.assertIsNone(self.cache.get(self.joints, []))
+
+        sl = self.cache.plan(self.joints, [])
+        self.assertEqual(len(sl.segments), 0)
+
+        self.cache.put(self.joints, [], sl)
+        sl = self.cache.get(self.joints, [])
+        self.assertEqual(len(sl.segments), 0)
+        self.assertEqual(sl.planner_position, [0, 0, 0])
+
+    def test_key(self):
+        key = self.cache.key(self.joints, self.moves)
+
+        # Settings that change the plans are part of the key
+        self.assertNotEqual(PlanCache(self.td.name, oscillation_limit=2).key(self.joints, self.moves), key)
+        self.assertNotEqual(PlanCache(self.td.name, plan_budget=5).key(self.joints, self.moves), key)
+
+        version = plancache.PLANNER_VERSION
+        try:
+            plancache.PLANNER_VERSION += 1
+            self.assertNotEqual(self.cache.key(self.joints, self.moves), key)
+        finally:
+            plancache.PLANNER_VERSION = version
+
+        sl = PlanCache(self.td.name, plan_budget=5).plan(self.joints, self.moves[:10])
+        self.assertEqual(sl.plan_budget, 5)
+
+    def test_planner_version(self):
+        # If this fails, the planner's output has changed: bump PLANNER_VERSION,
+        # so existing caches don't return old plans, and update the version and digest here
+        sl = SegmentList(self.joints)
+        for m in np.random.default_rng(4).integers(-3000, 3000, size=(30, 3)).tolist():
+            sl.move(m)
+
+        p = np.round(np.asarray(sl.block_params, dtype=np.float64), 2)
+        self.assertEqual((PLANNER_VERSION, hashlib.sha256(p.tobytes()).hexdigest()[:16]),
+                         (4, '9e50ead2c74d3da2'))
+
+    def test_evict(self):
+        self.cache.plan(self.joints, self.moves)
+        n = len(self.cache.files())
+        self.cache.max_bytes = self.cache.size // 2
+        self.cache.evict()
+
+        self.assertLess(len(self.cache.files()), n)
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
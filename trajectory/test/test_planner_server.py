@@ -0,0 +1,75 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic
+
+from trajectory import Joint
+from trajectory.test.cpptest import CPPPlannerServer
+
+_src_dir = Path(__file__).parent.parent.parent.joinpath('src')
+
+
+def server_dir():
+    """Directory with a planner binary that has the server mode, from
+    TRJ_PLANNER_BUILD or the usual build directories, or None"""
+
+    dirs = [Path(os.environ['TRJ_PLANNER_BUILD'])] if os.environ.get('TRJ_PLANNER_BUILD') else []
+    dirs += [_src_dir.joinpath('build', 'cli'), _src_dir.joinpath('cmake-build-debug', 'cli'),
+             _src_dir.joinpath('cmake-cli-test', 'cli')]
+
+    for d in dirs:
+        exe = d.joinpath('planner')
+        if exe.exists():
+            try:
+                out = subprocess.run([str(exe), '-h'], capture_output=True, timeout=5).stdout
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            if b'--server' in out:
+                return d
+
+    return None
+
+
+class TestServerTimeout(unittest.TestCase):
+
+    def test_hung_planner(self):
+        with tempfile.TemporaryDirectory() as d:
+            exe = Path(d).joinpath('planner')
+            exe.write_text('#!/bin/sh\nexec sleep 30\n')
+            exe.chmod(0o755)
+
+            srv = CPPPlannerServer(d, timeout=.5).start()
+            t = monotonic()
+
+            with self.assertRaises(TimeoutError):
+                srv.ping()
+
+            self.assertLess(monotonic() - t, 5)
+            self.assertIsNone(srv.proc)  # Killed, so the next request starts a new process
+
+
+@unittest.skipUnless(server_dir(), "planner binary with server mode is not built")
+class TestPlannerServer(unittest.TestCase):
+
+    def test_requests(self):
+        joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+        moves = [[1000, 0, 500], [-2000, 3000, 0], [0, -1500, 1500]]
+
+        with CPPPlannerServer(server_dir()) as srv:
+            self.assertTrue(srv.ping()['ok'])
+
+            for i in range(3):
+                sl = srv.planner(joints, moves)
+                self.assertEqual(len(sl.segments), len(moves))
+                self.assertEqual([[round(b.x * b.d) for b in s.blocks] for s in sl.segments], moves)
+
+            with self.assertRaises(IOError):
+                srv.request({'op': 'nonsense'})
+
+            self.assertTrue(srv.ping()['ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.plot import _decimate, _thin, plot_axis, plot_trajectory
+
+
+class TestPlot(unittest.TestCase):
+
+    def test_decimate(self):
+        rng = np.random.default_rng(0)
+
+        for size, n in ((10_000, 100), (10_001, 37), (999, 4), (50, 100)):
+            t = np.arange(size, dtype=float)
+            v = rng.normal(size=size)
+
+            td, vd = _decimate(t, v, n)
+
+            self.assertLessEqual(len(td), max(n, 4) if size > n else size)
+            self.assertEqual((td[0], td[-1]), (t[0], t[-1]))
+            self.assertEqual(vd.max(), v.max())
+            self.assertEqual(vd.min(), v.min())
+            self.assertTrue((np.diff(td) > 0).all())
+            np.testing.assert_array_equal(vd, v[td.astype(int)])
+
+    def test_thin(self):
+        ts = np.sort(np.random.default_rng(1).uniform(0, 10, 5000))
+
+        thinned = _thin(ts, 50)
+        self.assertLessEqual(len(thinned), 51)
+        self.assertEqual(thinned[0], ts[0])
+        self.assertTrue(np.isin(thinned, ts).all())
+
+    def test_plot_axis(self):
+        sl = SegmentList([Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(2).integers(-2000, 2000, size=(20, 2)).tolist():
+            sl.move(m)
+
+        df = sl.dataframe
+
+        fig, ax = plt.subplots()
+        try:
+            plot_axis(df, 0, ax=ax, max_points=30)
+            x, y = ax.lines[0].get_data()
+            self.assertLessEqual(len(x), 30)
+            self.assertAlmostEqual(x[-1], df[df.axis == 0].del_t.sum())
+
+            plot_trajectory(df, ax=ax)
+            self.assertEqual(len(ax.lines), 3)
+        finally:
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
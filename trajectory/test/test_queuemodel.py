@@ -0,0 +1,56 @@
+import unittest
+
+from trajectory.proto import QueueModel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueueModel(unittest.TestCase):
+
+    def test_predict_and_correct(self):
+        clock = Clock()
+        qm = QueueModel(clock=clock)
+
+        for seq in range(1, 5):
+            qm.on_send(seq, .5)
+
+        self.assertAlmostEqual(qm.estimate(), 2.0)
+
+        clock.now = 1  # Not running, so nothing drains
+        self.assertAlmostEqual(qm.estimate(), 2.0)
+
+        qm.set_running(True)
+        clock.now = 1.7
+        self.assertAlmostEqual(qm.estimate(), 1.3)
+        self.assertEqual(qm.queue_length, 3)
+
+        # The device finished segment 2 early
+        qm.on_done(2)
+        self.assertAlmostEqual(qm.queue_time, 1.0)
+
+        # and reports a little less than predicted
+        qm.on_state(2, .9)
+        self.assertAlmostEqual(qm.queue_time, .9)
+        self.assertEqual(qm.queue_length, 2)
+        self.assertAlmostEqual(qm.stats['drift_mean'], .1)
+
+        # A report with more time than predicted lengthens the running segment
+        qm.on_state(2, 1.2)
+        self.assertAlmostEqual(qm.entries[0][1], .7)
+        self.assertEqual(qm.stats['corrections'], 2)
+
+        clock.now = 10
+        self.assertEqual(qm.estimate(), 0)
+
+        qm.on_state(0, .25)  # Moves the model didn't see
+        self.assertAlmostEqual(qm.queue_time, .25)
+
+
+if __name__ == '__main__':
+    unittest.main()
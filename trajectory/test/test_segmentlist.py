@@ -0,0 +1,326 @@
+import unittest
+from random import randint, seed, choice
+from time import sleep
+
+import numpy as np
+import pandas as pd
+
+from trajectory import SegmentList, Joint
+from trajectory.exceptions import ConvergenceError, ConvergenceWarning
+from trajectory.planner import PlanPass
+from trajectory.ring import RingBuffer
+
+
+class TestSegmentList(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.joints = [Joint(5_000, 50_000), Joint(5_000, 50_000), Joint(3_000, 20_000)]
+
+    def check_queue(self, sl, moved):
+        """The queue accounting should match what is actually in the queue"""
+
+        self.assertEqual(sl.queue_length, len(sl.segments))
+        self.assertAlmostEqual(sl.queue_time, sum(s.t for s in sl.segments), places=6)
+        for p, m in zip(sl.planner_position, moved):
+            self.assertAlmostEqual(p, m, places=6)
+
+        for p, c in sl.pairs:
+            self.assertIs(c.prior, p)
+
+    def test_jog_sequence(self):
+        seed(10)
+        sl = SegmentList(self.joints)
+
+        moved = [0] * len(self.joints)
+
+        for i in range(100):
+            v = [randint(-3000, 3000) for _ in self.joints]
+            sl.jmove(.1, v)
+            self.assertLessEqual(len(sl), 2)
+
+            # Popped segments have been executed, so only they and the
+            # retained segments count toward the planner position
+            if i % 3 == 0:
+                s = sl.front
+                moved = [m + x for m, x in zip(moved, s.move)]
+                sl.pop()
+
+            pos = [m + sum(s.move[j] for s in sl.segments) for j, m in enumerate(moved)]
+            self.check_queue(sl, pos)
+
+        self.assertEqual(len(sl.discontinuities()), 0)
+
+    def test_drop_pending(self):
+        sl = SegmentList(self.joints)
+
+        for i in range(5):
+            sl.move([1000 * (i + 1), 500, 0])
+
+        self.assertTrue(any(sl[1].v_1))
+
+        dropped = sl.drop_pending(2)
+
+        self.assertEqual([s.n for s in dropped], [2, 3, 4])
+        self.assertEqual(len(sl), 2)
+        self.check_queue(sl, [3000, 1000, 0])
+
+        # The queue ends at rest, and is still continuous
+        self.assertEqual(sl[1].v_1, [0, 0, 0])
+        self.assertEqual(len(sl.discontinuities()), 0)
+
+        sl.move([1000, 1000, 1000])
+        self.assertIs(sl[2].prior, sl[1])
+        self.check_queue(sl, [4000, 2000, 1000])
+
+    def test_dataframe(self):
+        """The cached columnar frame should match one built from the blocks"""
+        seed(3)
+        sl = SegmentList(self.joints)
+
+        for i in range(60):
+            sl.move([choice([0, randint(-500, 500), randint(-5000, 5000)]) for _ in self.joints])
+
+            if i % 7 == 0:
+                sl.pop()
+            if i % 10 == 0:
+                sl.dataframe  # Cache the frame while the queue changes
+            if i % 13 == 0:
+                sl.drop_pending(max(1, len(sl) - 1))
+
+        frames = []
+        for s_i, s in enumerate(sl.segments):
+            for a_i, b in enumerate(s.blocks):
+                frames.append(b.dataframe.assign(axis=a_i, seg=s_i))
+
+        expected = pd.concat(frames, ignore_index=True)
+        expected['t'] = expected.groupby('axis').del_t.cumsum()
+
+        df = sl.dataframe
+        self.assertIs(df, sl.dataframe)
+
+        cols = ['t', 'seg', 'axis', 'x', 'v_i', 'v_f', 'del_t']
+        pd.testing.assert_frame_equal(df[cols].astype(float), expected[cols].astype(float))
+
+    def test_threaded_consumer(self):
+        """Plan on one thread while a SegmentStepper consumes on another"""
+        import threading
+        from trajectory.stepper import SegmentStepper
+
+        snapshots = {}
+        popped = []
+
+        class CheckedList(SegmentList):
+            def take(self, block=True):
+                s = super().take(block)
+                if s is not None:
+                    snapshots[s.n] = s.stepper_blocks
+                return s
+
+            def pop(self):
+                s = super().pop()
+                # A segment must not change between being taken and being popped
+                assert snapshots[s.n] == s.stepper_blocks, s.n
+                popped.append(s.n)
+                return s
+
+        sl = CheckedList(self.joints)
+        errors = []
+        producing = threading.Event()
+        producing.set()
+
+        def produce():
+            seed(4)
+            try:
+                for i in range(40):
+                    if i % 4 == 3:
+                        sl.jmove(.02, [randint(-2000, 2000) for _ in self.joints])
+                    else:
+                        sl.move([randint(-150, 150) for _ in self.joints])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                producing.clear()
+
+        ss = SegmentStepper(sl)
+
+        def consume():
+            try:
+                while producing.is_set() or len(sl):
+                    if ss.step() is None:
+                        sleep(.0001)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=120)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sl), 0)
+        self.assertEqual(sl.committed, 0)
+
+        # Every segment that was taken was stepped, in order
+        self.assertEqual(popped, sorted(snapshots))
+        self.assertTrue(any(ss.step_position))
+
+
+class TestPlanConvergence(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.joints = [Joint(5_000, 50_000), Joint(5_000, 50_000), Joint(3_000, 20_000)]
+        self.moves = np.random.default_rng(4).integers(-5000, 5000, size=(30, 3)).tolist()
+
+    def plan(self, moves, **kw):
+        sl = SegmentList(self.joints, **kw)
+        for m in moves:
+            sl.move(m)
+        return sl
+
+    def test_exits(self):
+        with self.assertWarns(ConvergenceWarning) as cm:
+            sl = self.plan(self.moves)
+
+        self.assertEqual(sum(sl.plan_exits.values()), len(self.moves) - 1)
+        self.assertGreater(sl.plan_exits['oscillation'], 0)
+
+        # Every exit that gave up is reported, with its passes
+        self.assertEqual(sum(issubclass(w.category, ConvergenceWarning) for w in cm.warnings),
+                         len(self.moves) - 1 - sl.plan_exits['converged'])
+        self.assertIn('oscillation', str(cm.warning))
+        self.assertTrue(len(cm.warning.diagnostics) > 0)
+        self.assertTrue(all(isinstance(p, PlanPass) for p in cm.warning.diagnostics))
+
+        # Giving up falls back to plan_safe(), so the queue is still continuous
+        self.assertEqual(sl.discontinuities(), [])
+
+        self.assertTrue(all(isinstance(p, PlanPass) for p in sl.plan_passes))
+        self.assertLessEqual(len(sl.plan_passes), sl.plan_budget)
+
+    def test_consistent(self):
+        # Every block is planned for its final boundary velocities, including
+        # those a segment reduces on its last iteration
+        for seed in range(3):
+            sl = self.plan(np.random.default_rng(seed).integers(-2000, 2000, size=(30, 3)).tolist())
+            for b in sl.blocks:
+                area = (b.v_0 + b.v_c) / 2 * b.t_a + b.v_c * b.t_c + (b.v_c + b.v_1) / 2 * b.t_d
+                self.assertLess(abs(area - b.x), 2, b)
+
+    def test_stall(self):
+        with self.assertWarnsRegex(ConvergenceWarning, 'stall'):
+            sl = self.plan(self.moves[:10], oscillation_limit=1)
+
+        self.assertGreater(sl.plan_exits['stall'], 0)
+        self.assertEqual(sl.discontinuities(), [])
+
+        with self.assertRaises(ValueError):
+            self.plan(self.moves[:3], oscillation_limit=0)
+
+    def test_strict(self):
+        sl = SegmentList(self.joints, strict=True)
+
+        with self.assertRaises(ConvergenceError) as cm:
+            for m in self.moves:
+                sl.move(m)
+
+        e = cm.exception
+        self.assertIn('oscillation', str(e))
+        self.assertEqual(sl.plan_exits['oscillation'], 1)
+        self.assertIs(e.diagnostics, sl.plan_passes)
+        self.assertTrue(len(e.diagnostics) > 0)
+        self.assertEqual(sl.discontinuities(), [])
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.joints = [Joint(5_000, 50_000), Joint(5_000, 50_000), Joint(3_000, 20_000)]
+
+    def jog(self, sl, n, **kw):
+        seed(1)
+        for i in range(n):
+            sl.jmove(.1, [randint(-3000, 3000) for _ in self.joints], **kw)
+            if i % 3 == 0 and len(sl) > 1:
+                sl.pop()
+
+    def test_budget(self):
+        sl = SegmentList(self.joints)
+        self.jog(sl, 60, time_budget=.002)
+
+        self.assertEqual(sl.discontinuities(), [])
+        self.assertEqual(sum(sl.plan_exits.values()), 59)  # The first move has nothing to plan
+
+        lat = sl.latency_percentiles()
+        self.assertEqual(set(lat), {'p50', 'p90', 'p99', 'max', 'warmup'})
+        self.assertEqual(len(sl.move_latency), 59)
+        self.assertEqual(len(sl.warmup_latency), 1)
+
+    def test_fallback_work(self):
+        """Out of time, a move plans only the new segment, from rest"""
+        from unittest.mock import patch
+        from trajectory.planner import Segment
+
+        sl = SegmentList(self.joints)
+        self.jog(sl, 10)
+
+        calls = []
+        plan = Segment.plan
+
+        def counted(s, *args, **kwargs):
+            calls.append(s)
+            return plan(s, *args, **kwargs)
+
+        with patch.object(Segment, 'plan', counted), self.assertWarnsRegex(ConvergenceWarning, 'deadline'):
+            for i in range(20):
+                calls.clear()
+                sl.plan_times.append(1)  # Every plan looks slow, so there is never time
+                sl.jmove(.1, [randint(-3000, 3000) for _ in self.joints], time_budget=.002)
+
+                self.assertLessEqual(len(calls), 2)  # Stopping the kept tail, and the new segment
+                self.assertEqual(sl[-2].v_1, [0, 0, 0])
+                self.assertEqual(sl.discontinuities(), [])
+
+        self.assertGreaterEqual(sl.plan_exits['deadline'], 20)
+
+    def test_plan_safe(self):
+        sl = SegmentList(self.joints)
+        for i in range(6):
+            sl.move([1000 * (i + 1), -500, 300])
+
+        b = sl[3].blocks[0]
+        b.v_0 = b.v_0 / 2
+        self.assertEqual(len(sl.discontinuities()), 1)
+
+        sl.plan_safe(1)
+        self.assertEqual(sl.discontinuities(), [])
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def test_wraparound(self):
+        from collections import deque
+
+        r = RingBuffer(capacity=4)
+        d = deque()
+
+        for i in range(50):
+            r.append(i)
+            d.append(i)
+            if i % 3 == 1:
+                self.assertEqual(r.popleft(), d.popleft())
+            if i % 7 == 2:
+                self.assertEqual(r.pop(), d.pop())
+
+            self.assertEqual(list(r), list(d))
+            self.assertEqual(r[-1], d[-1])
+            self.assertEqual(r[len(d) // 2], d[len(d) // 2])
+
+        l = list(d)
+        self.assertEqual(list(r.pairs()), list(zip(l, l[1:])))
+        self.assertEqual(list(r.triplets(2)), list(zip(l, l[1:], l[2:]))[2:])
+        self.assertEqual(r[1:4], l[1:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
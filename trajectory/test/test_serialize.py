@@ -0,0 +1,61 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory import serialize as ser
+
+
+class TestSerialize(unittest.TestCase):
+
+    def setUp(self):
+        self.joints = [Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)]
+
+        rng = np.random.default_rng(1)
+        self.sl = SegmentList(self.joints)
+        for i, m in enumerate(rng.integers(-3000, 3000, size=(30, 3))):
+            self.sl.move(m.tolist(), v_max=[2000, 1500, 1000] if i % 4 == 0 else None)
+
+        for i in range(5):
+            self.sl.pop()
+
+    def check_same(self, sl):
+        self.assertTrue(np.array_equal(sl.block_params, self.sl.block_params))
+        self.assertEqual([s.n for s in sl.segments], [s.n for s in self.sl.segments])
+        self.assertEqual([s.move for s in sl.segments], [s.move for s in self.sl.segments])
+        self.assertEqual([[b.v_c_max for b in s.blocks] for s in sl.segments],
+                         [[b.v_c_max for b in s.blocks] for s in self.sl.segments])
+        self.assertIn(1000, [b.v_c_max for s in sl.segments for b in s.blocks])
+        self.assertEqual(sl.seg_num, self.sl.seg_num)
+        self.assertEqual(sl.planner_position, self.sl.planner_position)
+        self.assertAlmostEqual(sl.queue_time, self.sl.queue_time)
+
+        # The restored list keeps planning
+        sl.move([100, -200, 300])
+        self.assertEqual(sl.segments[-1].n, self.sl.seg_num)
+
+    def test_records(self):
+        r = ser.to_records(self.sl)
+        self.assertEqual(len(r), 25 * 3)
+        self.check_same(ser.from_records(r, self.joints, ser.state(self.sl)))
+
+    def test_json(self):
+        d = json.loads(json.dumps(ser.to_json(self.sl)))
+        self.assertEqual(d['segments'][0]['blocks'][0]['_type'], 'Block')
+        self.check_same(ser.from_json(d))
+
+    def test_binary(self):
+        with tempfile.TemporaryDirectory() as td:
+            p = Path(td).joinpath('plan.trj')
+            ser.save(self.sl, p)
+            self.check_same(ser.load(p))
+
+        with self.assertRaises(ValueError):
+            ser.loads(b'nope' + ser.dumps(self.sl)[4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
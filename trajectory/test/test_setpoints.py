@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.parsim import simulate
+from trajectory.emulator import stepper_phases
+from trajectory.setpoints import resample, segment_times, setpoints, trajectory_index
+
+
+class TestSetpoints(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(3).integers(-2000, 2000, size=(10, 3)).tolist():
+            cls.sl.move(m)
+
+        cls.st = simulate(cls.sl, workers=1)
+
+    def test_chunks(self):
+        df = setpoints(self.sl, 1000)
+        chunks = list(resample(self.sl, 1000, chunk=777))
+
+        self.assertEqual([c.first for c in chunks], list(range(0, len(df), 777)))
+        np.testing.assert_array_equal(np.concatenate([c.position for c in chunks]), df.values)
+
+        dt = self.st.period / 1e6
+        self.assertAlmostEqual(segment_times(self.sl).sum(), self.st.n_ticks * dt)
+        self.assertGreaterEqual(df.index[-1], self.st.n_ticks * dt)
+        self.assertLess(df.index[-1] - 1e-3, trajectory_index(self.sl).duration)
+
+        self.assertTrue((chunks[-1].velocity[-1] == 0).all())
+
+        steps = setpoints(self.sl, 1000, steps=True)
+        self.assertTrue((steps.values == np.rint(steps.values)).all())
+
+    def test_stepper_positions(self):
+        st = self.st
+        df = setpoints(self.sl, 1000)
+
+        tick = np.minimum(np.rint(df.index.values / (st.period / 1e6)).astype(int), st.n_ticks)
+        pos = np.stack([np.concatenate([[0], np.cumsum(st.direction[st.axis == a])])
+                        [np.searchsorted(st.tick[st.axis == a], tick)] for a in range(3)], axis=1)
+
+        # The Steppers are a little late or early, and drop a few steps
+        err = np.abs(df.values - pos)[df.index.values <= st.n_ticks * (st.period / 1e6)]
+        self.assertLess(np.median(err), 3)
+        self.assertLess(err.max(), 15)
+        np.testing.assert_allclose(df.values[-1], st.position, atol=5)
+
+        # Every axis finishes its last block
+        np.testing.assert_array_equal(df.values[-1], stepper_phases(self.sl)[..., 0].sum(axis=(0, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
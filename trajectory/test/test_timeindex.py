@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.emulator import stepper_phases
+from trajectory.timeindex import TrajectoryIndex
+
+
+class TestTimeIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        cls.moves = np.random.default_rng(1).integers(-3000, 3000, size=(20, 3))
+        for m in cls.moves.tolist():
+            cls.sl.move(m)
+
+        cls.ti = TrajectoryIndex.from_segment_list(cls.sl)
+
+    def test_segment_ends(self):
+        ti = self.ti
+
+        self.assertAlmostEqual(ti.duration, sum(s.time for s in self.sl.segments), places=4)
+
+        ends = ti.position(ti.seg_start[1:] - 1e-9)
+        np.testing.assert_allclose(ends, np.cumsum(self.moves, axis=0), atol=1e-3)
+
+        np.testing.assert_allclose(ti.position([-1, ti.duration + 1]),
+                                   [[0, 0, 0], self.moves.sum(axis=0)])
+
+        self.assertEqual(ti.segment(ti.seg_start[3] + 1e-6).tolist(), 3)
+
+    def test_derivatives(self):
+        ti = self.ti
+        t = np.linspace(0, ti.duration, 200001)
+
+        p, v, a = ti.state(t)
+        self.assertEqual(p.shape, (len(t), 3))
+
+        # Phase boundaries put a few kinks in the numerical derivative
+        np.testing.assert_allclose(np.median(np.abs(np.gradient(p, t, axis=0) - v), axis=0), 0, atol=1e-3)
+        self.assertTrue((np.abs(v) <= np.array([5000, 5000, 3000]) + 1e-6).all())
+        self.assertTrue((np.abs(a) <= np.array([50000, 50000, 20000]) + 1e-6).all())
+
+        np.testing.assert_array_equal(ti.position(t[::1000], axes=1), p[::1000, 1])
+
+    def test_stepper_blocks(self):
+        ti = TrajectoryIndex.from_stepper_blocks(self.sl)
+
+        # The rounded phases of a block don't always add up to its move
+        x = stepper_phases(self.sl)[..., 0].sum(axis=2)
+
+        ends = ti.position(ti.seg_start[1:] - 1e-9)
+        np.testing.assert_allclose(ends, np.cumsum(x, axis=0), atol=1e-3)
+
+        # Segments shorter than their blocks carry the blocks over, and the
+        # last segment runs until every axis has finished
+        seg_t = np.diff(ti.seg_start) / 2
+        tc = TrajectoryIndex.from_stepper_blocks(self.sl, seg_t)
+
+        self.assertGreater(tc.duration, seg_t.sum())
+        np.testing.assert_allclose(tc.duration, ti.duration, rtol=.2)
+        np.testing.assert_allclose(tc.end, x.sum(axis=0), atol=1e-6)
+        np.testing.assert_array_equal(tc.velocity(tc.duration), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
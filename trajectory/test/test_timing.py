@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.timing import analyze, ideal_times
+
+
+class TestTiming(unittest.TestCase):
+
+    def test_ideal_times(self):
+        # Constant velocity
+        np.testing.assert_allclose(ideal_times(100, 1000, 1000, [1, 50, 100]), [.001, .05, .1])
+        # From rest, x = a t^2 / 2 with a = 1000^2 / 200
+        np.testing.assert_allclose(ideal_times(100, 0, 1000, [100]), [.2])
+        # Decelerating to rest ends at the same time
+        np.testing.assert_allclose(ideal_times(-100, -1000, 0, [100]), [.2])
+
+    def test_analyze(self):
+        sl = SegmentList([Joint(5000, 50000), Joint(3000, 20000)])
+        for m in ([1000, 500], [-400, 800], [1500, 0]):
+            sl.move(m)
+
+        r = analyze(sl, generators=('iter_period', 'iter_time'))
+        s = r.summary
+
+        self.assertEqual(list(s.index), ['iter_period', 'iter_time'])
+        self.assertTrue((r.phase_counts('iter_period') == 0).all())
+        self.assertEqual(s.loc['iter_period', 'steps'], np.abs(r.phases[:, 0]).sum())
+
+        # The firmware algorithm stays within a few ticks of the ideal profile, on
+        # average, and never steps at more than twice the planned velocity
+        self.assertLess(s.loc['iter_period', 'err_mean'], 5e-4)
+        self.assertLess(s.loc['iter_period', 'v_ratio_max'], 2)
+        self.assertEqual(r.choose(1), 'iter_period')
+
+    def test_choose(self):
+        sl = SegmentList([Joint(5000, 50000), Joint(3000, 20000)])
+        for m in ([1000, 500], [-400, 800], [1500, 0]):
+            sl.move(m)
+
+        r = analyze(sl, generators=('iter_period', 'iter_steps', 'iter_time'))
+        s = r.summary
+
+        # One update per step, against one per tick
+        self.assertEqual(s.loc['iter_steps', 'updates'], s.loc['iter_steps', 'steps'])
+        self.assertLess(s.loc['iter_steps', 'updates'] * 10, s.loc['iter_period', 'updates'])
+        self.assertLess(abs(s.loc['iter_time', 'updates'] / s.loc['iter_period', 'updates'] - 1), .02)
+
+        # iter_steps is cheapest, but spikes
+        self.assertEqual(r.choose(1, spike_ratio=np.inf), 'iter_steps')
+        self.assertEqual(r.choose(1, spike_ratio=np.inf, max_pos_err=np.inf), 'iter_steps')
+        self.assertEqual(r.choose(1e-2, spike_ratio=np.inf), 'iter_period')
+
+        # Without spikes, iter_period is chosen, and nothing is within 1ms
+        self.assertEqual(r.choose(1), 'iter_period')
+        self.assertIsNone(r.choose(1e-3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from trajectory import Joint, SegmentList
+from trajectory.parsim import simulate
+from trajectory.trace import TraceReader, TraceWriter, record
+
+
+class TestTrace(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+        for m in np.random.default_rng(4).integers(-2000, 2000, size=(10, 3)).tolist():
+            cls.sl.move(m)
+
+        cls.st = simulate(cls.sl, workers=1)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name).joinpath('job.trace')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_record(self):
+        st = self.st
+
+        for mode in ('event', 'dense'):
+            tr = record(self.sl, self.path, mode=mode, batch=3, chunk_rows=5000)
+
+            self.assertEqual(tr.n_ticks, st.n_ticks)
+            self.assertEqual(tr.segments['tick'].tolist(), st.seg_start.tolist())
+            self.assertEqual(tr.final_position.tolist(), st.position.tolist())
+
+            np.testing.assert_array_equal(tr.dense(), st.dense())
+
+            lo, hi = tr.segment_ticks(4)
+            self.assertEqual((lo, hi), (st.seg_start[4], st.seg_start[5]))
+            np.testing.assert_array_equal(tr.dense(lo, hi), st.dense(lo, hi))
+            self.assertIsInstance(tr.segment(4), np.memmap)
+
+            # Positions streamed by chunk end at the same place as the cumulative sum
+            last = None
+            for tick, pos in tr.positions(rows=7777):
+                self.assertEqual(len(tick), len(pos))
+                last = pos[-1]
+            self.assertEqual(last.tolist(), st.position.tolist())
+
+    def test_write_rows(self):
+        rows = list(self.sl.step())[:20000]
+
+        with TraceWriter(self.path, 3, 'event', chunk_rows=1000) as w:
+            w.write_rows(rows)
+
+        tr = TraceReader(self.path)
+        self.assertEqual(tr.n_ticks, len(rows))
+        np.testing.assert_array_equal(tr.dense(), np.array(rows)[:, 1:].astype(np.int8))
+
+        df = tr.dataframe(100, 200)
+        self.assertEqual(len(df), 100)
+        self.assertAlmostEqual(df.index[0], rows[100][0])
+
+    def test_not_closed(self):
+        w = TraceWriter(self.path, 3)
+        w.write_dense(np.ones((10, 3)))
+        w.flush()
+
+        with self.assertRaises(ValueError):
+            TraceReader(self.path)
+
+        w.close()
+        self.assertEqual(len(TraceReader(self.path)), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from trajectory import Joint, SegmentList, gsolver
+from trajectory.exceptions import ValidationError
+from trajectory.validate import check, validate
+
+
+def make_sl(n, seed=1):
+    sl = SegmentList([Joint(5000, 50000), Joint(5000, 50000), Joint(3000, 20000)])
+    for m in np.random.default_rng(seed).integers(-2000, 2000, size=(n, 3)).tolist():
+        sl.move(m)
+    return sl
+
+
+class TestValidate(unittest.TestCase):
+
+    def test_clean(self):
+        errors = validate(make_sl(6))
+        self.assertEqual(list(errors.columns), ['segment', 'axis', 'check', 'value', 'limit'])
+
+        # Ordinary planner output passes with the defaults
+        for seed in range(5):
+            sl = make_sl(30, seed)
+            errors = validate(sl)
+            self.assertEqual(len(errors), 0, errors)
+            self.assertIs(check(sl), sl)
+
+        self.assertEqual(len(validate(SegmentList([Joint(5000, 50000)]))), 0)
+
+    def test_violations(self):
+        sl = make_sl(6)
+
+        b = sl.segments[2].blocks[1]
+        b.v_c = 6000  # Over v_max, so the area and accelerations are wrong too
+        b.v_1 += 100
+        sl.table.touch(sl.segments[2])
+
+        b = sl.segments[3].blocks[2]
+        b.x_c += 10
+        sl.table.touch(sl.segments[3])
+
+        b = sl.segments[4].blocks[0]
+        b.t_c = -b.t_c
+        sl.table.touch(sl.segments[4])
+
+        errors = validate(sl)
+
+        found = set(zip(errors.segment, errors.axis, errors.check))
+        for e in [(2, 1, 'v_max'), (2, 1, 'a_max'), (2, 1, 'area'), (2, 1, 'continuity'),
+                  (3, 2, 'phase_x'), (4, 0, 'negative'), (4, 0, 'phase_t')]:
+            self.assertIn(e, found)
+
+        self.assertEqual(set(errors.segment), {2, 3, 4})
+        self.assertEqual(set(errors[errors.segment == 3].check), {'phase_x'})
+
+        r = errors[errors.check == 'phase_x'].iloc[0]
+        self.assertAlmostEqual(r.value - r.limit, 10)
+
+        r = errors[errors.check == 'phase_t'].iloc[0]
+        self.assertAlmostEqual(r.limit - r.value, 2 * abs(b.t_c))
+
+        with self.assertRaises(ValidationError):
+            check(sl)
+
+    def test_no_inline_checks(self):
+        checks = gsolver.CHECKS
+        try:
+            gsolver.CHECKS = False
+            sl = make_sl(6)
+        finally:
+            gsolver.CHECKS = checks
+
+        np.testing.assert_array_equal(sl.block_params, make_sl(6).block_params)
+
+
+if __name__ == '__main__':
+    unittest.main()
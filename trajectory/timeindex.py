@@ -0,0 +1,213 @@
+"""Position, velocity and acceleration of a planned trajectory at any time.
+
+TrajectoryIndex lays the phases of every block of a planned SegmentList on
+one time line per axis. Segment start times are prefix sums of the segment
+times, and each phase is a quadratic in the time since its start:
+
+    x(tau) = x0 + v0 * tau + a * tau**2 / 2
+
+Queries take arrays of times, find the phase of each time by binary search,
+and evaluate the quadratics, so the cost is O(log n) per time, with no
+stepping and no DataFrame.
+
+    ti = TrajectoryIndex.from_segment_list(sl)
+    ti.position([0.5, 12.345])           # shape (2, n_axes)
+    ti.position(12.345, axes=3)
+
+from_stepper_blocks() builds the index from the rounded stepper_blocks()
+phases instead, with the phase times the Stepper uses, t_f = 2x / (vi + vf),
+which is the trajectory the steppers actually follow.
+"""
+
+import numpy as np
+
+from .planner import SegmentList
+from .table import block_fields
+
+_f = {f: i for i, f in enumerate(block_fields)}
+
+
+class TrajectoryIndex(object):
+    """Piecewise quadratic trajectory, with a binary search index over time"""
+
+    def __init__(self, seg_start, start, x0, v0, a):
+        """All but seg_start are shaped (n_axes, n_phases), with the phases of
+        each axis in time order.
+
+        :param seg_start: Start time of each segment, and the end time of the last
+        :param start: Start time of each phase
+        :param x0: Position at the start of each phase
+        :param v0: Velocity at the start of each phase
+        :param a: Acceleration in each phase
+        """
+        self.seg_start = seg_start
+        self.start = start
+        self.x0 = x0
+        self.v0 = v0
+        self.a = a
+
+    @property
+    def n_axes(self):
+        return self.start.shape[0]
+
+    @property
+    def duration(self):
+        return float(self.seg_start[-1])
+
+    @property
+    def end(self):
+        """Position of each axis at the end"""
+        return self.position(self.duration)
+
+    @classmethod
+    def from_phases(cls, seg_t, x, v_0, v_1, t, carry=False):
+        """Build from phases shaped (segment, axis, phase), with signed distances x
+        and signed velocities v_0 and v_1, phase times t, and seg_t, the time of
+        each segment. A segment's phases start together, and if they end before
+        the segment does, the axis stops until the segment ends.
+
+        With carry, an axis that hasn't finished its block when the segment ends
+        finishes it before starting the next, as the Stepper does, and the last
+        segment lasts until every axis has finished, so the trajectory ends at
+        the end of the phases. Without carry, the phases of an axis must fit in
+        the segment."""
+
+        n_seg, n_axes, n_ph = x.shape
+
+        seg_start = np.concatenate([[0.], np.cumsum(seg_t)])
+
+        T = t.sum(axis=2)
+        S = np.broadcast_to(seg_start[:-1, None], T.shape)
+
+        if carry and n_seg:
+            # A block starts at the later of the segment start and the end of the
+            # axis's previous block, max over j <= k of S_j + the times of blocks j to k-1
+            before = np.cumsum(T, axis=0) - T
+            begin = before + np.maximum.accumulate(S - before, axis=0)
+            seg_start[-1] = max(seg_start[-1], (begin[-1] + T[-1]).max())
+        else:
+            begin = S
+
+        # A fourth phase holds the axis still until its next block starts
+        nxt = np.concatenate([begin[1:], np.full((1, n_axes), seg_start[-1])])
+        tail = np.maximum(nxt - begin - T, 0)[..., None]
+        zero = np.zeros_like(tail)
+
+        x = np.concatenate([x, zero], axis=2)
+        v_0 = np.concatenate([v_0, zero], axis=2)
+        v_1 = np.concatenate([v_1, zero], axis=2)
+        t = np.concatenate([t, tail], axis=2)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(t > 0, (v_1 - v_0) / t, 0)
+
+        start = begin[..., None] + np.cumsum(t, axis=2) - t
+
+        # Positions from the phase distances, so block ends land on the planned positions
+        x0 = np.cumsum(x.transpose(1, 0, 2).reshape(n_axes, -1), axis=1)
+        x0 = np.concatenate([np.zeros((n_axes, 1)), x0[:, :-1]], axis=1)
+
+        def flat(e):
+            return np.ascontiguousarray(e.transpose(1, 0, 2).reshape(n_axes, -1))
+
+        return cls(seg_start, flat(start), x0, flat(v_0), flat(a))
+
+    @classmethod
+    def from_segment_list(cls, sl: SegmentList):
+        """Index of the planned profiles of the blocks"""
+        p = np.asarray(sl.block_params, dtype=np.float64)  # (segment, axis, field)
+
+        def f(*names):
+            return np.stack([p[:, :, _f[n]] for n in names], axis=2)
+
+        d = p[:, :, _f['d']][..., None]
+        v = f('v_0', 'v_c', 'v_1')
+
+        return cls.from_phases(p[:, :, _f['t']].max(axis=1) if len(p) else np.zeros(0),
+                               d * f('x_a', 'x_c', 'x_d'),
+                               d * v[..., [0, 1, 1]],
+                               d * v[..., [1, 1, 2]],
+                               f('t_a', 't_c', 't_d'))
+
+    @classmethod
+    def from_stepper_blocks(cls, sl: SegmentList, seg_t=None):
+        """Index of the rounded stepper_blocks() phases, timed as the Stepper times
+        them. seg_t is the time of each segment, by default the longest of the
+        axes' phase times in each segment. Blocks that run past the end of their
+        segment carry over into the next, as in SegmentList.step()"""
+        ph = np.array([[b.stepper_blocks() for b in s.blocks] for s in sl.segments],
+                      dtype=np.float64).reshape(-1, len(sl.joints), 3, 3)
+
+        x, vi, vf = ph[..., 0], ph[..., 1], ph[..., 2]
+        sv = np.abs(vi) + np.abs(vf)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(sv > 0, 2 * np.abs(x) / sv, 0)
+
+        if seg_t is None:
+            seg_t = t.sum(axis=2).max(axis=1) if len(t) else np.zeros(0)
+
+        # stepper_blocks velocities are unsigned magnitudes with the sign of d; use the sign of x
+        sgn = np.sign(x)
+        sgn = np.where(sgn == 0, np.sign(vi + vf), sgn)
+
+        return cls.from_phases(np.asarray(seg_t, dtype=np.float64), x, sgn * np.abs(vi), sgn * np.abs(vf), t,
+                               carry=True)
+
+    def segment(self, t):
+        """Index of the segment at each time, -1 before the start and n_segments after the end"""
+        t = np.asarray(t, dtype=np.float64)
+        i = np.searchsorted(self.seg_start, t, side='right') - 1
+        return np.where(t >= self.seg_start[-1], len(self.seg_start) - 1, i)
+
+    def _axes(self, axes):
+        if axes is None:
+            return list(range(self.n_axes)), False
+        if np.ndim(axes) == 0:
+            return [int(axes)], True
+        return list(axes), False
+
+    def _eval(self, t, axes, which):
+        t = np.asarray(t, dtype=np.float64)
+        axes_, scalar_axis = self._axes(axes)
+
+        out = np.empty(t.shape + (len(axes_),))
+        tc = np.clip(t, 0, self.duration)
+        outside = (t < 0) | (t >= self.duration)
+
+        for k, ax in enumerate(axes_):
+            st = self.start[ax]
+
+            if len(st) == 0:
+                out[..., k] = 0
+                continue
+
+            i = np.maximum(np.searchsorted(st, tc, side='right') - 1, 0)
+
+            tau = tc - st[i]
+            v0, a = self.v0[ax, i], self.a[ax, i]
+
+            if which == 'position':
+                r = self.x0[ax, i] + v0 * tau + a * tau ** 2 / 2
+            elif which == 'velocity':
+                r = np.where(outside, 0, v0 + a * tau)
+            else:
+                r = np.where(outside, 0, a)
+
+            out[..., k] = r
+
+        return out[..., 0] if scalar_axis else out
+
+    def position(self, t, axes=None):
+        """Position at times t, shaped t.shape + (axes,), or t.shape for a single axis"""
+        return self._eval(t, axes, 'position')
+
+    def velocity(self, t, axes=None):
+        return self._eval(t, axes, 'velocity')
+
+    def acceleration(self, t, axes=None):
+        return self._eval(t, axes, 'acceleration')
+
+    def state(self, t, axes=None):
+        """Position, velocity and acceleration at times t"""
+        return self.position(t, axes), self.velocity(t, axes), self.acceleration(t, axes)
@@ -0,0 +1,213 @@
+"""Accuracy of the step generators against the planned profile.
+
+Runs the stepper blocks of a planned SegmentList through each step
+generator, and compares the time of every step with the time the ideal,
+constant acceleration profile of its phase reaches that step:
+
+    t_j = (sqrt(v_i^2 + 2 a j) - v_i) / a        or j / v_i when a is 0
+
+Step times are measured from the start of the phase, so errors don't carry
+from one phase to the next. The generators are:
+
+* iter_period: the firmware's fixed point Austin algorithm, through emulator.py
+* iter_steps: SimSegment.iter_steps, the floating point Austin algorithm
+* iter_time: SimSegment.iter_time, delays from the velocity at each tick
+* stepper: stepper.Stepper, the Python stepper, with its phase 1 correction,
+  run through accel.stepper_steps
+
+    r = analyze(sl)
+    r.summary            # one row per generator
+    r.choose(bound=20e-6)  # cheapest generator within 20us
+
+The cost of a generator is the number of updates it needs on a controller,
+not its run time here, which depends mostly on whether it is compiled or a
+Python generator. Generators that run every timer period update once per
+tick, while iter_steps sets the delay to the next step, and updates once per
+step.
+"""
+
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from . import accel
+from .emulator import emulate_phases, stepper_phases
+from .sim import SimSegment, DEFAULT_PERIOD, TIMEBASE
+
+generators = ('iter_period', 'iter_steps', 'iter_time', 'stepper')
+per_step = ('iter_steps',)  # Generators that update once per step, rather than once per tick
+
+
+def ideal_times(x, vi, vf, j):
+    """Time from the start of a phase to step j, for phases given by x, vi and vf"""
+    x, vi, vf, j = (np.asarray(e, dtype=float) for e in (x, vi, vf, j))
+
+    vi, vf = np.abs(vi), np.abs(vf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_f = np.where(vi + vf > 0, 2 * np.abs(x) / (vi + vf), 0)
+        a = np.where(t_f > 0, (vf - vi) / t_f, 0)
+
+        accel = (np.sqrt(np.maximum(vi ** 2 + 2 * a * j, 0)) - vi) / a
+        const = j / vi
+
+    return np.where(a != 0, accel, const)
+
+
+def _steps_iter_period(phases, period):
+    offsets, ticks, _ = emulate_phases(phases[:, 0], phases[:, 1], phases[:, 2], period)
+    pid = np.repeat(np.arange(len(phases)), np.diff(offsets))
+    return pid, ticks * (period / TIMEBASE)
+
+
+def _steps_sim(phases, f):
+    pid, t = [], []
+    for i, (x, vi, vf) in enumerate(phases.tolist()):
+        if x == 0:
+            continue
+        ts = f(SimSegment(x, vi, vf))
+        pid.extend([i] * len(ts))
+        t.extend(ts)
+
+    return np.array(pid, dtype=np.int64), np.array(t, dtype=float)
+
+
+def _steps_iter_steps(phases, period):
+    return _steps_sim(phases, lambda ss: [p.tn for p in ss.iter_steps()])
+
+
+def _steps_iter_time(phases, period):
+    return _steps_sim(phases, lambda ss: [s.t for s in ss.iter_time(period)])
+
+
+def _steps_stepper(phases, period):
+    """Run a Stepper over the three phases of each block"""
+    pid, _, phase_t, *_ = accel.stepper_steps(phases.astype(np.float64), period, False)
+    return pid, phase_t - period / TIMEBASE
+
+
+_generators = {
+    'iter_period': _steps_iter_period,
+    'iter_steps': _steps_iter_steps,
+    'iter_time': _steps_iter_time,
+    'stepper': _steps_stepper,
+}
+
+
+class TimingReport(object):
+    """Per step timing errors and summaries for several generators"""
+
+    def __init__(self, phases, planned_x, period):
+        self.phases = phases  # (n_phases, 3) of x, vi, vf
+        self.planned_x = planned_x  # Planned distance of each block, unrounded
+        self.period = period
+        self.steps = {}  # generator -> DataFrame, one row per step
+        self.run_time = {}  # generator -> seconds to generate the steps
+        self.updates = {}  # generator -> updates on a controller
+
+    def add(self, name, pid, t, run_time):
+        ph = self.phases
+
+        # Number the steps within each phase, 1-based
+        order = np.lexsort((t, pid))
+        pid, t = pid[order], t[order]
+        first = np.searchsorted(pid, pid, side='left')
+        j = np.arange(len(pid)) - first + 1
+
+        x, vi, vf = np.abs(ph[pid, 0]), ph[pid, 1], ph[pid, 2]
+
+        t_ideal = ideal_times(x, vi, vf, j)
+
+        # Instantaneous velocity from the interval to the previous step in the phase
+        dt = np.diff(t, prepend=np.nan)
+        dt[j == 1] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v_inst = 1 / dt
+            t_f = np.where(np.abs(vi) + np.abs(vf) > 0, 2 * x / (np.abs(vi) + np.abs(vf)), 0)
+            a = np.where(t_f > 0, (np.abs(vf) - np.abs(vi)) / t_f, 0)
+            v_ideal = np.abs(vi) + a * (t - dt / 2)
+            v_ratio = v_inst / v_ideal
+
+        self.steps[name] = pd.DataFrame({
+            'phase': pid, 'j': j, 't': t, 't_ideal': t_ideal, 'err': t - t_ideal,
+            'v_inst': v_inst, 'v_ideal': v_ideal, 'v_ratio': v_ratio,
+        })
+        self.run_time[name] = run_time
+
+        if name in per_step:
+            self.updates[name] = len(t)
+        elif len(t):
+            # Ticks to the last step of each phase
+            last = np.zeros(len(ph))
+            np.maximum.at(last, pid, t)
+            self.updates[name] = int(np.ceil(last / (self.period / TIMEBASE) - 1e-6).sum())
+        else:
+            self.updates[name] = 0
+
+    def phase_counts(self, name):
+        """Steps generated for each phase, less the steps in the phase"""
+        n = np.bincount(self.steps[name].phase, minlength=len(self.phases))
+        return n - np.abs(self.phases[:, 0])
+
+    def position_error(self, name):
+        """Steps generated for each block, less the planned, unrounded, distance"""
+        n = np.bincount(self.steps[name].phase, minlength=len(self.phases)).reshape(-1, 3).sum(axis=1)
+        return n - self.planned_x
+
+    def summarize(self, spike_ratio: float = 1.5):
+        rows = []
+        for name, df in self.steps.items():
+            err = np.abs(df.err.to_numpy())
+            err = err[np.isfinite(err)] if len(err) else np.zeros(1)
+            vr = df.v_ratio.to_numpy()
+            vr = vr[np.isfinite(vr)]
+            pe = self.position_error(name)
+
+            rows.append({
+                'generator': name,
+                'steps': len(df),
+                'updates': self.updates[name],
+                'run_time': self.run_time[name],
+                'err_mean': err.mean() if len(err) else 0,
+                'err_p99': np.percentile(err, 99) if len(err) else 0,
+                'err_max': err.max() if len(err) else 0,
+                'spikes': int((vr > spike_ratio).sum()),
+                'v_ratio_max': vr.max() if len(vr) else np.nan,
+                'phase_count_errors': int((self.phase_counts(name) != 0).sum()),
+                'pos_err_max': np.abs(pe).max() if len(pe) else 0,
+                'pos_err_rms': np.sqrt(np.mean(pe ** 2)) if len(pe) else 0,
+            })
+
+        return pd.DataFrame(rows).set_index('generator')
+
+    @property
+    def summary(self):
+        return self.summarize()
+
+    def choose(self, bound: float, max_pos_err: float = 1, spike_ratio: float = 1.5):
+        """The generator with the fewest updates whose worst step timing error is
+        within bound seconds, with no velocity spikes and no block off by more
+        than max_pos_err steps. Of generators with the same number of updates,
+        the most accurate"""
+        s = self.summarize(spike_ratio)
+        ok = s[(s.err_max <= bound) & (s.spikes == 0) & (s.pos_err_max <= max_pos_err)]
+        return ok.sort_values(['updates', 'err_max'], kind='stable').index[0] if len(ok) else None
+
+
+def analyze(sl, generators=generators, period: int = DEFAULT_PERIOD) -> TimingReport:
+    """Run the stepper blocks of a SegmentList through each generator"""
+
+    ph = stepper_phases(sl)  # (segment, axis, phase, 3)
+    phases = ph.reshape(-1, 3)
+    planned_x = np.array([[b.d * b.x for b in s.blocks] for s in sl.segments], dtype=float).ravel()
+
+    r = TimingReport(phases, np.abs(planned_x), period)
+
+    for name in generators:
+        _generators[name](phases[:3], period)  # Warm up, so run_time doesn't include compiling
+
+        start = perf_counter()
+        pid, t = _generators[name](phases, period)
+        r.add(name, pid, t, perf_counter() - start)
+
+    return r
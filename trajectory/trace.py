@@ -0,0 +1,322 @@
+"""Step traces on disk, for simulations too long to hold in memory.
+
+A trace file holds the steps of a job in one of two forms:
+
+* event: one record per step, with the tick, segment, axis and direction
+* dense: one row per tick, with an int8 step, -1, 0 or 1, for each axis,
+  like the rows of SegmentList.step()
+
+Records are appended in chunks as they are produced, so the writer only
+holds one chunk in memory. On close, the writer appends an index, with the
+first tick and record of each segment and each chunk, and fills in the
+header. TraceReader memory-maps the file, and returns NumPy views of
+ranges of ticks or segments, so traces much larger than memory can be
+analysed a chunk at a time.
+
+    record(sl, 'job.trace', mode='dense')
+
+    tr = TraceReader('job.trace')
+    for tick, pos in tr.positions():
+        ...
+"""
+
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from .parsim import iter_batches
+from .stepper import DEFAULT_PERIOD, TIMEBASE
+
+MAGIC = b'TRJT'
+VERSION = 1
+
+EVENT, DENSE = 0, 1
+modes = {'event': EVENT, 'dense': DENSE}
+
+# magic, version, mode, n_axes, period, chunk_rows, n_rows, n_ticks, index offset, n_segments, n_chunks
+_header_fmt = '<4sHBBIIQQQQQ'
+_header_size = 64
+
+event_dtype = np.dtype([('tick', '<i8'), ('seg', '<i4'), ('axis', 'u1'), ('dir', 'i1')])
+seg_index_dtype = np.dtype([('seg', '<i8'), ('tick', '<i8'), ('row', '<i8')])
+chunk_index_dtype = np.dtype([('tick', '<i8'), ('row', '<i8')])
+
+
+def _dense_dtype(n_axes):
+    return np.dtype(('i1', (n_axes,)))
+
+
+class TraceWriter(object):
+    """Append steps to a trace file"""
+
+    def __init__(self, path, n_axes: int, mode: str = 'event', period: int = DEFAULT_PERIOD,
+                 chunk_rows: int = 1 << 16):
+        self.path = Path(path)
+        self.n_axes = n_axes
+        self.mode = modes[mode]
+        self.period = period
+        self.chunk_rows = chunk_rows
+
+        self.dtype = event_dtype if self.mode == EVENT else _dense_dtype(n_axes)
+
+        self._f = open(self.path, 'wb')
+        self._f.write(b'\0' * _header_size)
+
+        self._buf = np.zeros(chunk_rows, dtype=self.dtype)
+        self._n_buf = 0
+        self._buf_tick = 0  # First tick in the buffer
+
+        self.n_rows = 0  # Rows written to the file
+        self.n_ticks = 0
+
+        self._segs = []
+        self._chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def rows(self):
+        """Rows written, including the buffer"""
+        return self.n_rows + self._n_buf
+
+    def begin_segment(self, seg: int, tick: int):
+        """Mark the start of a segment at tick. For event traces, call it before
+        writing the segment's steps"""
+        if self.mode == DENSE:
+            row = tick
+        else:
+            row = self.rows
+        self._segs.append((seg, tick, row))
+
+    def _append(self, recs):
+        i = 0
+        while i < len(recs):
+            if self._n_buf == 0:
+                self._buf_tick = int(recs['tick'][i]) if self.mode == EVENT else self.rows
+
+            n = min(len(recs) - i, self.chunk_rows - self._n_buf)
+            self._buf[self._n_buf:self._n_buf + n] = recs[i:i + n]
+            self._n_buf += n
+            i += n
+
+            if self._n_buf == self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        if self._n_buf:
+            self._chunks.append((self._buf_tick, self.n_rows))
+            self._f.write(self._buf[:self._n_buf].tobytes())
+            self.n_rows += self._n_buf
+            self._n_buf = 0
+
+        self._f.flush()
+
+    def write_events(self, tick, axis, direction, seg=None, n_ticks=None):
+        """Write steps, in time order. n_ticks is the tick after the last one
+        these steps cover; the trace ends at the largest n_ticks written"""
+
+        tick = np.asarray(tick)
+
+        if self.mode == EVENT:
+            recs = np.zeros(len(tick), dtype=event_dtype)
+            recs['tick'] = tick
+            recs['seg'] = -1 if seg is None else seg
+            recs['axis'] = axis
+            recs['dir'] = direction
+            self._append(recs)
+        else:
+            end = n_ticks if n_ticks is not None else (int(tick[-1]) + 1 if len(tick) else self.rows)
+            rows = np.zeros((end - self.rows, self.n_axes), dtype=np.int8)
+            rows[tick - self.rows, axis] = direction
+            self._append(rows)
+
+        self.n_ticks = max(self.n_ticks, n_ticks if n_ticks is not None else
+                           (int(tick[-1]) + 1 if len(tick) else 0))
+
+    def write_dense(self, steps):
+        """Write rows of steps, one row per tick, with a column per axis"""
+        steps = np.asarray(steps, dtype=np.int8).reshape(-1, self.n_axes)
+
+        if self.mode == DENSE:
+            self._append(steps)
+            self.n_ticks = self.rows
+        else:
+            t, a = np.nonzero(steps)
+            self.write_events(t + self.n_ticks, a, steps[t, a], n_ticks=self.n_ticks + len(steps))
+
+    def write_rows(self, rows):
+        """Write rows of SegmentList.step(), [t] + steps, a chunk at a time"""
+        buf = []
+        for r in rows:
+            buf.append(r[1:])
+            if len(buf) == self.chunk_rows:
+                self.write_dense(buf)
+                buf = []
+        if buf:
+            self.write_dense(buf)
+
+    def close(self):
+        if self._f is None:
+            return
+
+        self.flush()
+
+        index_offset = self._f.tell()
+        self._f.write(np.array(self._segs, dtype=seg_index_dtype).tobytes())
+        self._f.write(np.array(self._chunks, dtype=chunk_index_dtype).tobytes())
+
+        self._f.seek(0)
+        self._f.write(struct.pack(_header_fmt, MAGIC, VERSION, self.mode, self.n_axes, self.period,
+                                  self.chunk_rows, self.n_rows, self.n_ticks, index_offset,
+                                  len(self._segs), len(self._chunks)))
+        self._f.close()
+        self._f = None
+
+
+class TraceReader(object):
+    """Memory-mapped access to a trace file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+        with open(self.path, 'rb') as f:
+            header = f.read(struct.calcsize(_header_fmt))
+
+        if len(header) < struct.calcsize(_header_fmt):
+            raise ValueError(f'{self.path} is not a trace file')
+
+        (magic, version, self.mode, self.n_axes, self.period, self.chunk_rows, self.n_rows,
+         self.n_ticks, index_offset, n_segs, n_chunks) = struct.unpack(_header_fmt, header)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{self.path} is not a trace file, or was not closed')
+
+        self.dtype = event_dtype if self.mode == EVENT else _dense_dtype(self.n_axes)
+
+        self.data = np.memmap(self.path, dtype=self.dtype, mode='r', offset=_header_size,
+                              shape=(self.n_rows,)) if self.n_rows else np.zeros(0, dtype=self.dtype)
+
+        self.segments = np.fromfile(self.path, dtype=seg_index_dtype, count=n_segs, offset=index_offset)
+        self.chunk_index = np.fromfile(self.path, dtype=chunk_index_dtype, count=n_chunks,
+                                       offset=index_offset + n_segs * seg_index_dtype.itemsize)
+
+    @property
+    def is_dense(self):
+        return self.mode == DENSE
+
+    @property
+    def dt(self):
+        return self.period / TIMEBASE
+
+    def __len__(self):
+        return self.n_rows
+
+    def _row(self, tick):
+        """First row at or after tick"""
+        if self.mode == DENSE:
+            return min(max(tick, 0), self.n_rows)
+        return int(np.searchsorted(self.data['tick'], tick))
+
+    def ticks(self, start: int = 0, stop: int = None):
+        """View of the rows for ticks start to stop"""
+        stop = self.n_ticks if stop is None else stop
+        return self.data[self._row(start):self._row(stop)]
+
+    def time(self, start: float, stop: float):
+        """View of the rows for times start to stop, in seconds"""
+        return self.ticks(int(round(start / self.dt)), int(round(stop / self.dt)))
+
+    def segment_ticks(self, seg: int):
+        """First and last+1 ticks of a segment"""
+        i = int(np.searchsorted(self.segments['seg'], seg))
+        if i == len(self.segments) or self.segments['seg'][i] != seg:
+            raise KeyError(seg)
+
+        stop = self.segments['tick'][i + 1] if i + 1 < len(self.segments) else self.n_ticks
+        return int(self.segments['tick'][i]), int(stop)
+
+    def segment(self, seg: int):
+        """View of the rows of a segment"""
+        return self.ticks(*self.segment_ticks(seg))
+
+    def chunks(self, rows: int = None):
+        """Yield (first row, view) for consecutive blocks of rows"""
+        rows = rows or self.chunk_rows
+        for i in range(0, self.n_rows, rows):
+            yield i, self.data[i:i + rows]
+
+    def dense(self, start: int = 0, stop: int = None):
+        """Steps for ticks start to stop as a (tick, axis) int8 array"""
+        stop = self.n_ticks if stop is None else stop
+
+        if self.mode == DENSE:
+            return np.asarray(self.ticks(start, stop))
+
+        ev = self.ticks(start, stop)
+        a = np.zeros((stop - start, self.n_axes), dtype=np.int8)
+        a[ev['tick'] - start, ev['axis']] = ev['dir']
+        return a
+
+    def positions(self, rows: int = None):
+        """Yield (tick, position) for each chunk of rows, with the step position of
+        every axis after each row's tick. For event traces, the ticks are those of
+        the steps; for dense traces, every tick."""
+
+        pos = np.zeros(self.n_axes, dtype=np.int64)
+
+        for first, c in self.chunks(rows):
+            if self.mode == DENSE:
+                p = np.cumsum(c, axis=0, dtype=np.int64) + pos
+                tick = np.arange(first, first + len(c))
+            else:
+                d = np.zeros((len(c), self.n_axes), dtype=np.int64)
+                d[np.arange(len(c)), c['axis']] = c['dir']
+                p = np.cumsum(d, axis=0) + pos
+                tick = np.asarray(c['tick'])
+
+            if len(p):
+                pos = p[-1]
+
+            yield tick, p
+
+    @property
+    def final_position(self):
+        pos = np.zeros(self.n_axes, dtype=np.int64)
+        for _, p in self.positions():
+            if len(p):
+                pos = p[-1]
+        return pos
+
+    def dataframe(self, start: int = 0, stop: int = None):
+        """DataFrame like plot.seg_step(), for ticks start to stop"""
+        import pandas as pd
+
+        d = self.dense(start, stop)
+        df = pd.DataFrame(d, columns=list('xyzabc')[:self.n_axes])
+        df.insert(0, 't', np.arange(start, start + len(d)) * self.dt)
+
+        return df.set_index('t')
+
+
+def record(sl, path, mode: str = 'event', batch: int = 64, period: int = DEFAULT_PERIOD,
+           chunk_rows: int = 1 << 16) -> TraceReader:
+    """Step a SegmentList into a trace file, with the same steps as
+    SegmentList.step(), a batch of segments at a time, and return a reader"""
+
+    with TraceWriter(path, len(sl.joints), mode, period, chunk_rows) as w:
+        for b in iter_batches(sl, batch, period):
+            seg_start = b.first_tick + np.cumsum(b.seg_ticks) - b.seg_ticks
+            bounds = np.searchsorted(b.tick, seg_start)
+            end = b.first_tick + int(b.seg_ticks.sum())
+
+            for i, (lo, hi) in enumerate(zip(bounds, list(bounds[1:]) + [len(b.tick)])):
+                w.begin_segment(b.first_seg + i, int(seg_start[i]))
+                seg_end = int(seg_start[i + 1]) if i + 1 < len(seg_start) else end
+                w.write_events(b.tick[lo:hi], b.axis[lo:hi], b.direction[lo:hi], b.seg[lo:hi], n_ticks=seg_end)
+
+    return TraceReader(path)
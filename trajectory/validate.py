@@ -0,0 +1,136 @@
+"""Checks of a whole planned SegmentList, a few array operations per check.
+
+Block.plan() asserts that every block it plans is consistent, and
+SegmentList.discontinuities() loops over pairs of segments. validate() runs
+the same kinds of checks over the block_params array of a whole plan at once,
+and returns a DataFrame with a row for each violation:
+
+* v_max: a boundary or cruise velocity over the joint's v_max
+* a_max: an accel or decel phase faster than the joint's a_max
+* continuity: the signed velocity at the end of a block differs from the start
+  of the next block of the same axis
+* area: the area under the velocity profile differs from the block's x
+* phase_t: the phase times don't add up to the block's t
+* phase_x: the phase distances don't add up to the block's x
+* segment_time: a moving axis takes much more or less time than the segment.
+  Segment.plan() gives up after a few iterations, so the blocks of a
+  segment often differ by a few percent, and now and then by more
+* negative: a negative time, distance or velocity
+
+    errors = validate(sl)
+    errors.groupby('check').size()
+
+With gsolver.CHECKS off, the asserts in the planner are skipped, and a plan
+can be checked with validate() when it's convenient, or with check(), which
+raises a ValidationError.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .exceptions import ValidationError
+from .planner import SegmentList
+from .table import block_fields
+
+_f = {f: i for i, f in enumerate(block_fields)}
+
+violation_columns = ['segment', 'axis', 'check', 'value', 'limit']
+
+
+def _rows(check, mask, value, limit):
+    """Violation rows for the (segment, axis) positions where mask is set"""
+    seg, axis = np.nonzero(mask)
+    return pd.DataFrame({
+        'segment': seg,
+        'axis': axis,
+        'check': check,
+        'value': np.asarray(value, dtype=np.float64)[seg, axis],
+        'limit': np.broadcast_to(np.asarray(limit, dtype=np.float64), mask.shape)[seg, axis],
+    })
+
+
+def validate(sl: SegmentList, v_tol: float = 1e-6, a_tol: float = 1e-6, dv: float = 2,
+             dx: float = 2, dt: float = 1e-3, seg_tol: float = .05) -> pd.DataFrame:
+    """Return a DataFrame of violations, one row per check per block, with the
+    segment and axis, the name of the check, the offending value and the limit.
+
+    :param v_tol: Fraction over v_max that is allowed, for rounding
+    :param a_tol: Fraction over a_max that is allowed
+    :param dv: Largest velocity change between blocks, as in SegmentList.discontinuities()
+    :param dx: Largest difference between a block's area, or the sum of its
+        phase distances, and its x, as in Block.plan()
+    :param dt: Largest difference between the sum of a block's phase times and its time
+    :param seg_tol: Largest difference between a moving block's time and its
+        segment's, as a fraction of the segment's time. In 17 of 20 random 30
+        move programs the blocks spread by at most 3.5%, and by 4.6% in another
+        two; one segment spread by 6.3%, where Segment.plan() stalled.
+    """
+
+    p = np.asarray(sl.block_params, dtype=np.float64)
+
+    if p.size == 0:
+        return pd.DataFrame(columns=violation_columns)
+
+    def f(name):
+        return p[:, :, _f[name]]
+
+    x, d, t = f('x'), f('d'), f('t')
+    t_a, t_c, t_d = f('t_a'), f('t_c'), f('t_d')
+    x_a, x_c, x_d = f('x_a'), f('x_c'), f('x_d')
+    v_0, v_c, v_1 = f('v_0'), f('v_c'), f('v_1')
+
+    v_max = np.array([j.v_max for j in sl.joints], dtype=np.float64)
+    a_max = np.array([j.a_max for j in sl.joints], dtype=np.float64)
+
+    frames = []
+
+    # Velocity limits
+    v = np.maximum(np.maximum(v_0, v_c), v_1)
+    frames.append(_rows('v_max', v > v_max * (1 + v_tol), v, v_max))
+
+    # Acceleration limits, for the accel and decel phases
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.maximum(np.where(t_a > 0, np.abs(v_c - v_0) / t_a, 0),
+                       np.where(t_d > 0, np.abs(v_c - v_1) / t_d, 0))
+    frames.append(_rows('a_max', a > a_max * (1 + a_tol), a, a_max))
+
+    # Continuity of the signed velocities from one segment to the next
+    if len(p) > 1:
+        gap = np.zeros_like(x)
+        gap[:-1] = np.abs(d[:-1] * v_1[:-1] - d[1:] * v_0[1:])
+        frames.append(_rows('continuity', gap > dv, gap, dv))
+
+    # Area under the velocity profile
+    area = (v_0 + v_c) / 2 * t_a + v_c * t_c + (v_c + v_1) / 2 * t_d
+    err = np.abs(area - x)
+    frames.append(_rows('area', err > dx, area, x))
+
+    # Phases add up to the block
+    pt = t_a + t_c + t_d
+    frames.append(_rows('phase_t', np.abs(pt - t) > dt, pt, t))
+
+    px = x_a + x_c + x_d
+    frames.append(_rows('phase_x', np.abs(px - x) > dx, px, x))
+
+    # Moving axes of a segment take about the segment's time
+    seg_t = np.broadcast_to(t.max(axis=1)[:, None], t.shape)
+    frames.append(_rows('segment_time', (x != 0) & (np.abs(seg_t - t) > seg_tol * seg_t), t, seg_t))
+
+    # Nothing negative
+    q = np.stack([t, t_a, t_c, t_d, x_a, x_c, x_d, v_0, v_c, v_1], axis=2)
+    frames.append(_rows('negative', (q < -1e-9).any(axis=2), q.min(axis=2), 0))
+
+    return pd.concat(frames, ignore_index=True).sort_values(['segment', 'axis'], kind='stable') \
+        .reset_index(drop=True)
+
+
+def check(sl: SegmentList, **kwargs):
+    """Raise a ValidationError if validate() finds any violations"""
+
+    errors = validate(sl, **kwargs)
+
+    if len(errors):
+        counts = ', '.join(f'{k}: {v}' for k, v in errors.groupby('check').size().items())
+        raise ValidationError(f'{len(errors)} violations ({counts})')
+
+    return sl